@@ -2,5 +2,18 @@ from .tasks import router as tasks_router
 from .config import router as config_router
 from .stream import router as stream_router
 from .status import router as status_router
+from .scheduler import router as scheduler_router
+from .cache import router as cache_router
+from .metrics import router as metrics_router
+from .workers import router as workers_router
 
-__all__ = ["tasks_router", "config_router", "stream_router", "status_router"]
+__all__ = [
+    "tasks_router",
+    "config_router",
+    "stream_router",
+    "status_router",
+    "scheduler_router",
+    "cache_router",
+    "metrics_router",
+    "workers_router",
+]
@@ -0,0 +1,14 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends
+
+from backend.core.task_manager import 任务管理器
+from .deps import 获取任务管理器
+
+
+router = APIRouter(prefix="/api/cache", tags=["cache"])
+
+
+@router.get("")
+async def 获取缓存统计(任务管理: 任务管理器 = Depends(获取任务管理器)):
+    return 任务管理.缓存统计()
@@ -0,0 +1,18 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from backend.core.metrics import 指标文本
+from backend.core.task_manager import 任务管理器
+from .deps import 获取任务管理器
+
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def 获取指标(任务管理: 任务管理器 = Depends(获取任务管理器)):
+    输出 = 指标文本()
+    任务管理.导出指标(输出)
+    return PlainTextResponse(输出.文本(), media_type=指标文本.内容类型)
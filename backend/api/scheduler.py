@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends, HTTPException
+
+from backend.core.task_manager import 任务管理器
+from backend.models.task import SchedulerUpdateRequest
+from .deps import 获取任务管理器
+
+
+router = APIRouter(prefix="/api/scheduler", tags=["scheduler"])
+
+
+@router.get("")
+async def 获取调度状态(任务管理: 任务管理器 = Depends(获取任务管理器)):
+    return 任务管理.调度器状态()
+
+
+@router.put("")
+async def 更新调度设置(
+    请求: SchedulerUpdateRequest,
+    任务管理: 任务管理器 = Depends(获取任务管理器),
+):
+    try:
+        return await 任务管理.更新调度设置(并发上限=请求.max_concurrency, 带宽上限=请求.bandwidth_limit)
+    except ValueError as 异常:
+        raise HTTPException(status_code=400, detail=str(异常))
+
+
+@router.get("/adaptive")
+async def 获取自适应决策(任务管理: 任务管理器 = Depends(获取任务管理器)):
+    return 任务管理.自适应状态()
@@ -12,6 +12,12 @@ router = APIRouter(prefix="/api", tags=["status"])
 
 @router.get("/status")
 async def 获取系统状态(任务管理: 任务管理器 = Depends(获取任务管理器)):
-    任务列表 = await 任务管理.列出任务()
-    运行中 = sum(1 for 任务 in 任务列表 if 任务.status == "running")
-    return {"ok": True, "version": __version__, "tasks": len(任务列表), "running": 运行中}
+    统计 = 任务管理.统计()
+    return {
+        "ok": True,
+        "version": __version__,
+        "tasks": 统计["tasks"],
+        "running": 统计["by_status"]["running"],
+        "by_status": 统计["by_status"],
+        "locks": 任务管理.锁统计(),
+    }
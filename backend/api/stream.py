@@ -1,10 +1,9 @@
 from __future__ import annotations
 
 import asyncio
-import json
-from typing import AsyncGenerator
+from typing import AsyncGenerator, List, Optional
 
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi.responses import StreamingResponse
 
 from backend.core.task_manager import 任务管理器
@@ -22,57 +21,88 @@ class 静默StreamingResponse(StreamingResponse):
 router = APIRouter(prefix="/api/stream", tags=["stream"])
 
 
-def _格式化SSE(event: str, data: dict) -> str:
-    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+_心跳 = b"event: ping\ndata: {}\n\n"
+
+
+def _解析事件类型(events: Optional[str]) -> Optional[List[str]]:
+    if not events:
+        return None
+    类型列表 = [类型.strip() for 类型 in events.split(",") if 类型.strip()]
+    return 类型列表 or None
+
+
+def _解析上次事件ID(request: Request, last_event_id: Optional[str]) -> Optional[int]:
+    """浏览器自动重连时带 Last-Event-ID 请求头；手动重建 EventSource 时用 last_event_id 查询参数"""
+    原始值 = request.headers.get("last-event-id") or last_event_id
+    try:
+        return int(原始值) if 原始值 else None
+    except ValueError:
+        return None
+
+
+@router.get("/subscribers")
+async def 订阅者状态(任务管理: 任务管理器 = Depends(获取任务管理器)):
+    """当前 SSE 订阅者的积压、丢弃与滞后情况，用于排查慢客户端"""
+    总线 = 任务管理.事件总线
+    return {"last_event_id": 总线.最新事件ID, "subscribers": 总线.订阅者统计()}
 
 
 @router.get("/tasks")
 async def 任务事件流(
     request: Request,
+    events: Optional[str] = Query(None, description="只订阅这些事件类型，逗号分隔，如 task.progress,task.completed"),
+    last_event_id: Optional[str] = Query(None, description="从该事件编号之后补发（优先使用 Last-Event-ID 请求头）"),
+    任务管理: 任务管理器 = Depends(获取任务管理器),
+):
+    return await _创建事件流(request, 任务管理, _解析事件类型(events), None, _解析上次事件ID(request, last_event_id))
+
+
+@router.get("/tasks/{task_id}")
+async def 单任务事件流(
+    request: Request,
+    task_id: str,
+    events: Optional[str] = Query(None, description="只订阅这些事件类型，逗号分隔，如 task.log"),
+    last_event_id: Optional[str] = Query(None, description="从该事件编号之后补发（优先使用 Last-Event-ID 请求头）"),
     任务管理: 任务管理器 = Depends(获取任务管理器),
 ):
-    订阅队列 = await 任务管理.事件总线.订阅()
+    try:
+        await 任务管理.获取任务(task_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return await _创建事件流(
+        request, 任务管理, _解析事件类型(events), task_id, _解析上次事件ID(request, last_event_id)
+    )
+
+
+async def _创建事件流(
+    request: Request,
+    任务管理: 任务管理器,
+    事件类型: Optional[List[str]],
+    任务ID: Optional[str],
+    上次事件ID: Optional[int] = None,
+) -> StreamingResponse:
+    订阅 = await 任务管理.事件总线.订阅(事件类型=事件类型, 任务ID=任务ID, 上次事件ID=上次事件ID)
 
-    async def 生成器() -> AsyncGenerator[str, None]:
+    async def 生成器() -> AsyncGenerator[bytes, None]:
         关闭事件 = getattr(request.app.state, "shutdown_event", None)
         try:
-            yield "retry: 3000\n\n"
+            yield b"retry: 3000\n\n"
             try:
                 while True:
-                    if 关闭事件 and 关闭事件.is_set():
+                    if 订阅.已关闭 or (关闭事件 and 关闭事件.is_set()):
                         break
                     if await request.is_disconnected():
                         break
-                    取事件任务 = asyncio.create_task(订阅队列.get())
-                    关闭任务 = asyncio.create_task(关闭事件.wait()) if 关闭事件 else None
-                    try:
-                        等待任务 = {取事件任务}
-                        if 关闭任务:
-                            等待任务.add(关闭任务)
-
-                        完成, 未完成 = await asyncio.wait(等待任务, timeout=5.0, return_when=asyncio.FIRST_COMPLETED)
-                        if 未完成:
-                            for t in 未完成:
-                                t.cancel()
-                            _ = await asyncio.gather(*未完成, return_exceptions=True)
-
-                        if not 完成:
-                            yield "event: ping\ndata: {}\n\n"
-                            continue
-                        if 关闭任务 and 关闭任务 in 完成:
-                            break
-                        if 取事件任务 in 完成:
-                            事件对象 = 取事件任务.result()
-                            yield _格式化SSE(事件对象.event, 事件对象.data)
-                    finally:
-                        if 取事件任务 and not 取事件任务.done():
-                            取事件任务.cancel()
-                        if 关闭任务 and not 关闭任务.done():
-                            关闭任务.cancel()
-                        _ = await asyncio.gather(*[t for t in (取事件任务, 关闭任务) if t], return_exceptions=True)
+                    if not await 订阅.等待(超时=5.0):
+                        yield _心跳
+                        continue
+                    事件列表 = 订阅.取出全部()
+                    if 事件列表:
+                        # 每次唤醒把积压的事件合并成一次写入；报文字节由事件对象缓存，订阅者之间共享
+                        yield b"".join(事件对象.编码 for 事件对象 in 事件列表)
             except asyncio.CancelledError:
                 return
         finally:
-            await 任务管理.事件总线.取消订阅(订阅队列)
+            await 任务管理.事件总线.取消订阅(订阅)
 
     return 静默StreamingResponse(生成器(), media_type="text/event-stream")
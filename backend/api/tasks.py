@@ -1,19 +1,152 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import PlainTextResponse
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, get_args
 
-from backend.core.task_manager import 任务管理器
-from backend.models.task import Task, TaskCreateRequest
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import ValidationError
+
+from backend.core.task_manager import 任务管理器, 批量校验错误
+from backend.models.task import Task, TaskCreateRequest, TaskPriorityRequest, TaskStatus
 from .deps import 获取任务管理器
 
 
 router = APIRouter(prefix="/api/tasks", tags=["tasks"])
 
+_NDJSON类型 = {"application/x-ndjson", "application/jsonl", "application/x-jsonlines"}
+
+
+async def _读取批量条目(request: Request, 键: str) -> List[Any]:
+    """
+    读取批量请求体：JSON 数组、{键: [...]} 或逐行 JSON（Content-Type: application/x-ndjson）
+    逐行格式边接收边解析，大批量导入不需要拼成一个 JSON 文档
+    """
+    内容类型 = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if 内容类型 in _NDJSON类型:
+        条目列表: List[Any] = []
+        剩余 = b""
+        行号 = 0
+
+        def 解析(行: bytes):
+            nonlocal 行号
+            行号 += 1
+            if not 行.strip():
+                return
+            try:
+                条目列表.append(json.loads(行))
+            except json.JSONDecodeError:
+                raise HTTPException(status_code=400, detail=f"第 {行号} 行不是合法的 JSON")
+
+        async for 数据块 in request.stream():
+            *完整行, 剩余 = (剩余 + 数据块).split(b"\n")
+            for 行 in 完整行:
+                解析(行)
+        解析(剩余)
+        return 条目列表
+
+    try:
+        数据 = await request.json()
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="请求体不是合法的 JSON")
+    if isinstance(数据, dict):
+        数据 = 数据.get(键)
+    if not isinstance(数据, list):
+        raise HTTPException(status_code=400, detail=f"请求体应为数组或 {{\"{键}\": [...]}}")
+    return 数据
+
+
+async def _读取批量任务ID(request: Request) -> List[str]:
+    任务ID列表 = []
+    for 序号, 条目 in enumerate(await _读取批量条目(request, "ids")):
+        任务ID = 条目.get("id") if isinstance(条目, dict) else 条目
+        if not isinstance(任务ID, str) or not 任务ID:
+            raise HTTPException(status_code=400, detail=[{"index": 序号, "error": "任务 ID 应为非空字符串"}])
+        任务ID列表.append(任务ID)
+    return 任务ID列表
+
+
+def _编码游标(键: tuple) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(键)).encode()).decode().rstrip("=")
+
+
+def _解码游标(游标: str) -> tuple:
+    try:
+        时间戳, 任务ID = json.loads(base64.urlsafe_b64decode(游标 + "=" * (-len(游标) % 4)))
+        return float(时间戳), str(任务ID)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="cursor 不合法")
+
+
+def _逗号列表(值: Optional[str]) -> Optional[List[str]]:
+    列表 = [项.strip() for 项 in (值 or "").split(",") if 项.strip()]
+    return 列表 or None
+
+
+def _命中ETag(请求头: Optional[str], 标签: str) -> bool:
+    if not 请求头:
+        return False
+    return any(项.strip() in ("*", 标签) for 项 in 请求头.split(","))
+
 
 @router.get("", response_model=list[Task])
-async def 获取所有任务(任务管理: 任务管理器 = Depends(获取任务管理器)):
-    return await 任务管理.列出任务()
+async def 获取所有任务(
+    request: Request,
+    status: Optional[str] = Query(None, description="按状态过滤，逗号分隔，如 running,pending"),
+    created_after: Optional[datetime] = Query(None, description="只返回此时间（含）之后创建的任务"),
+    created_before: Optional[datetime] = Query(None, description="只返回此时间之前创建的任务"),
+    fields: Optional[str] = Query(None, description="只返回这些字段，逗号分隔（总是包含 id）"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="分页大小；传入后返回分页结构"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
+    since: Optional[int] = Query(None, description="只返回该修订号之后变化的任务与被删除的 ID"),
+    任务管理: 任务管理器 = Depends(获取任务管理器),
+):
+    """
+    不带 limit/cursor/since 时返回任务数组（与旧接口一致）；带上时返回
+    {"items", "next_cursor", "revision"}，since 查询另含 "deleted" 与 "full"
+    响应带 ETag（基于修订号），If-None-Match 命中时直接返回 304
+    """
+    标签 = f'W/"{任务管理.修订号}"'
+    if _命中ETag(request.headers.get("if-none-match"), 标签):
+        return Response(status_code=304, headers={"ETag": 标签})
+
+    字段 = _逗号列表(fields)
+    if 字段 is not None:
+        未知字段 = set(字段) - set(Task.model_fields)
+        if 未知字段:
+            raise HTTPException(status_code=400, detail=f"未知字段: {', '.join(sorted(未知字段))}")
+        字段 = set(字段) | {"id"}
+    状态列表 = _逗号列表(status)
+    if 状态列表 is not None:
+        未知状态 = set(状态列表) - set(get_args(TaskStatus))
+        if 未知状态:
+            raise HTTPException(status_code=400, detail=f"未知状态: {', '.join(sorted(未知状态))}")
+
+    分页 = limit is not None or cursor is not None or since is not None
+    结果 = await 任务管理.查询任务(
+        状态=状态列表,
+        创建起=created_after,
+        创建止=created_before,
+        游标=_解码游标(cursor) if cursor else None,
+        数量=(limit or 100) if 分页 else None,
+        since=since,
+    )
+    条目 = [任务.model_dump(mode="json", include=字段) for 任务 in 结果["items"]]
+    if 分页:
+        内容: Any = {
+            "items": 条目,
+            "next_cursor": _编码游标(结果["next_cursor"]) if 结果["next_cursor"] else None,
+            "revision": 结果["revision"],
+        }
+        if since is not None:
+            内容["deleted"] = 结果["deleted"]
+            内容["full"] = 结果["full"]
+    else:
+        内容 = 条目
+    # 以查询时的修订号为准，查询期间发生的变化会让下一次请求拿到新的 ETag
+    return JSONResponse(内容, headers={"ETag": f'W/"{结果["revision"]}"'})
 
 
 @router.post("", response_model=Task)
@@ -22,11 +155,60 @@ async def 创建新任务(
     任务管理: 任务管理器 = Depends(获取任务管理器),
 ):
     try:
-        return await 任务管理.创建任务(链接=请求.url, 保存名称=请求.name)
+        return await 任务管理.创建任务(链接=请求.url, 保存名称=请求.name, 优先级=请求.priority)
     except ValueError as 异常:
         raise HTTPException(status_code=400, detail=str(异常))
 
 
+@router.post("/batch")
+async def 批量创建任务(request: Request, 任务管理: 任务管理器 = Depends(获取任务管理器)):
+    条目列表 = []
+    错误列表 = []
+    for 序号, 条目 in enumerate(await _读取批量条目(request, "tasks")):
+        try:
+            请求 = TaskCreateRequest.model_validate(条目)
+        except ValidationError as 异常:
+            错误列表.append(
+                {"index": 序号, "error": "; ".join(f"{'.'.join(map(str, 项['loc']))}: {项['msg']}" for 项 in 异常.errors())}
+            )
+            continue
+        条目列表.append((请求.url, 请求.name, 请求.priority))
+    if 错误列表:
+        raise HTTPException(status_code=400, detail=错误列表)
+    try:
+        任务列表 = await 任务管理.批量创建任务(条目列表)
+    except 批量校验错误 as 异常:
+        raise HTTPException(status_code=400, detail=异常.错误列表)
+    return {"count": len(任务列表), "tasks": 任务列表}
+
+
+@router.post("/batch/start")
+async def 批量开始任务(request: Request, 任务管理: 任务管理器 = Depends(获取任务管理器)):
+    try:
+        任务列表 = await 任务管理.批量开始任务(await _读取批量任务ID(request))
+    except 批量校验错误 as 异常:
+        raise HTTPException(status_code=404, detail=异常.错误列表)
+    return {"count": len(任务列表), "tasks": 任务列表}
+
+
+@router.post("/batch/pause")
+async def 批量暂停任务(request: Request, 任务管理: 任务管理器 = Depends(获取任务管理器)):
+    try:
+        任务列表 = await 任务管理.批量暂停任务(await _读取批量任务ID(request))
+    except 批量校验错误 as 异常:
+        raise HTTPException(status_code=404, detail=异常.错误列表)
+    return {"count": len(任务列表), "tasks": 任务列表}
+
+
+@router.post("/batch/delete")
+async def 批量删除任务(request: Request, 任务管理: 任务管理器 = Depends(获取任务管理器)):
+    try:
+        数量 = await 任务管理.批量删除任务(await _读取批量任务ID(request))
+    except 批量校验错误 as 异常:
+        raise HTTPException(status_code=404, detail=异常.错误列表)
+    return {"success": True, "count": 数量}
+
+
 @router.get("/{task_id}", response_model=Task)
 async def 获取任务详情(task_id: str, 任务管理: 任务管理器 = Depends(获取任务管理器)):
     try:
@@ -60,6 +242,30 @@ async def 暂停任务(task_id: str, 任务管理: 任务管理器 = Depends(获
         raise HTTPException(status_code=404, detail="任务不存在")
 
 
+@router.put("/{task_id}/priority", response_model=Task)
+async def 设置任务优先级(
+    task_id: str,
+    请求: TaskPriorityRequest,
+    任务管理: 任务管理器 = Depends(获取任务管理器),
+):
+    try:
+        return await 任务管理.设置任务优先级(task_id, 请求.priority)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="任务不存在")
+
+
+@router.get("/{task_id}/metrics")
+async def 获取任务指标(
+    task_id: str,
+    points: int = Query(120, ge=1, le=1000),
+    任务管理: 任务管理器 = Depends(获取任务管理器),
+):
+    try:
+        return await 任务管理.获取任务指标(task_id, points)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="任务不存在")
+
+
 @router.get("/{task_id}/logs")
 async def 获取任务日志(
     task_id: str,
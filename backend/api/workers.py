@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import hmac
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+
+from backend.core.config import get_config
+from backend.core.task_manager import 任务管理器
+from backend.core.worker_coordinator import 租约协调器, 租约无效
+from backend.models.worker import WorkerCompleteRequest, WorkerHeartbeatRequest, WorkerLeaseRequest
+from .deps import 获取任务管理器
+
+
+router = APIRouter(prefix="/api/workers", tags=["workers"])
+
+
+def 获取协调器(
+    x_worker_token: Optional[str] = Header(default=None),
+    任务管理: 任务管理器 = Depends(获取任务管理器),
+) -> 租约协调器:
+    令牌 = get_config().worker_token
+    if 令牌 and not hmac.compare_digest(x_worker_token or "", 令牌):
+        raise HTTPException(status_code=401, detail="工作节点令牌无效")
+    if 任务管理.协调器 is None:
+        raise HTTPException(status_code=503, detail="未启用远程工作节点（workers.mode 不是 remote）")
+    return 任务管理.协调器
+
+
+@router.get("")
+async def 获取工作节点状态(协调器: 租约协调器 = Depends(获取协调器)):
+    return await 协调器.状态()
+
+
+@router.post("/lease")
+async def 租用作业(请求: WorkerLeaseRequest, 协调器: 租约协调器 = Depends(获取协调器)):
+    作业列表 = await 协调器.租用(请求.worker_id, 请求.capacity, 请求.wait)
+    return {"jobs": 作业列表}
+
+
+@router.post("/heartbeat")
+async def 心跳(请求: WorkerHeartbeatRequest, 协调器: 租约协调器 = Depends(获取协调器)):
+    try:
+        return await 协调器.心跳(请求.lease_id, 请求.worker_id, 请求.progress, 请求.logs)
+    except 租约无效 as 异常:
+        raise HTTPException(status_code=409, detail=str(异常.args[0]))
+
+
+@router.post("/complete")
+async def 完成作业(请求: WorkerCompleteRequest, 协调器: 租约协调器 = Depends(获取协调器)):
+    try:
+        if 请求.logs:
+            await 协调器.心跳(请求.lease_id, 请求.worker_id, None, 请求.logs)
+        await 协调器.完成(请求.lease_id, 请求.worker_id, 请求.success, 请求.error)
+    except 租约无效 as 异常:
+        raise HTTPException(status_code=409, detail=str(异常.args[0]))
+    return {"ok": True}
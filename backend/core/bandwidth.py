@@ -0,0 +1,216 @@
+"""
+全局带宽预算
+总限速按优先级加权分给运行中的任务（每高一级份额翻倍），任务开始/结束/暂停/调整优先级或排队变化时重新分配。
+份额按调度器的名额计算：空闲名额上有排队任务时按优先级 0 为其预留，排队任务拿到名额时不必挤占已在运行的任务。
+原生引擎任务用可实时调速的令牌桶；外部 N_m3u8DL-RE 进程只能在启动时通过 -R 指定，份额偏离目标时由任务管理器按新份额重启。
+已分出的份额合计始终不超过总限速，份额不足 1K 的外部进程等其它进程让出份额后再启动
+"""
+
+from __future__ import annotations
+
+import asyncio
+import re
+import time
+from typing import Dict, List, Optional, Set
+
+_单位倍率 = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def 解析速率(文本: Optional[str]) -> Optional[float]:
+    """把 "15M" / "100K" / "2.5MB" 解析为字节/秒；空串或 None 表示不限速"""
+    文本 = (文本 or "").strip()
+    if not 文本:
+        return None
+    匹配 = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([KMG]?)(?:B|B/s|Bps)?", 文本, re.IGNORECASE)
+    if not 匹配:
+        raise ValueError(f"无法解析的限速: {文本}")
+    速率 = float(匹配.group(1)) * _单位倍率[匹配.group(2).upper()]
+    if 速率 < 1024:
+        # N_m3u8DL-RE 的 -R 以 K 为单位，更低的限速无法对外部进程生效
+        raise ValueError("限速不能低于 1K")
+    return 速率
+
+
+def 格式化限速参数(速率: float) -> str:
+    """N_m3u8DL-RE 的 -R 参数，统一用整数 K 表示（向下取整，不超过分到的份额）"""
+    return f"{max(1, int(速率 // 1024))}K"
+
+
+def _按K取整(速率: float) -> float:
+    return float(int(速率 // 1024) * 1024)
+
+
+class 令牌桶:
+    def __init__(self, 速率: Optional[float] = None, 突发秒数: float = 0.5):
+        self._速率 = 速率
+        self._突发秒数 = 突发秒数
+        self._令牌 = 0.0
+        self._上次时间 = time.monotonic()
+        # 速率为 0（预算暂时全被外部进程占用）时，消耗方等到重新分到份额
+        self._有份额 = asyncio.Event()
+        if 速率 != 0:
+            self._有份额.set()
+
+    @property
+    def 速率(self) -> Optional[float]:
+        return self._速率
+
+    def 设置速率(self, 速率: Optional[float]):
+        self._补充()
+        self._速率 = 速率
+        if 速率 == 0:
+            self._有份额.clear()
+        else:
+            self._有份额.set()
+
+    def _补充(self):
+        现在 = time.monotonic()
+        if self._速率 is not None:
+            self._令牌 = min(self._速率 * self._突发秒数, self._令牌 + (现在 - self._上次时间) * self._速率)
+        self._上次时间 = 现在
+
+    async def 消耗(self, 字节数: int):
+        """取走 字节数 个令牌，不足时等待（允许欠账，等待时长按当前速率计算）"""
+        while self._速率 == 0:
+            await self._有份额.wait()
+        if self._速率 is None:
+            return
+        self._补充()
+        self._令牌 -= 字节数
+        if self._令牌 < 0:
+            await asyncio.sleep(-self._令牌 / self._速率)
+
+
+class 带宽预算:
+    # 外部进程的份额与目标相差超过该比例才按新份额重启，避免小幅波动反复重启进程
+    调整阈值 = 0.125
+
+    def __init__(self, 总速率: Optional[float] = None, 并发上限: int = 1):
+        self._总速率 = 总速率
+        self._并发上限 = max(1, int(并发上限))
+        self._排队数 = 0
+        self._优先级: Dict[str, int] = {}
+        self._令牌桶: Dict[str, 令牌桶] = {}
+        self._外部任务: Set[str] = set()
+        # 外部进程启动时分到的份额（已按 K 取整，与 -R 一致）；0 表示在等其它进程让出份额
+        self._固定份额: Dict[str, float] = {}
+        self._份额释放 = asyncio.Event()
+
+    @property
+    def 总速率(self) -> Optional[float]:
+        return self._总速率
+
+    @staticmethod
+    def _权重(优先级: int) -> float:
+        return 2.0 ** max(-10, min(10, int(优先级)))
+
+    def 设置总速率(self, 总速率: Optional[float]):
+        self._总速率 = 总速率
+        self._重新分配()
+
+    def 设置调度状态(self, 并发上限: int, 排队数: int):
+        """调度器的并发上限或排队数变化时调用，决定为空闲名额预留多少份额"""
+        self._并发上限 = max(1, int(并发上限))
+        self._排队数 = max(0, int(排队数))
+        self._重新分配()
+
+    def 目标份额(self) -> Dict[str, float]:
+        """各运行中任务按优先级应得的份额；未设置总预算时为空"""
+        if self._总速率 is None:
+            return {}
+        空闲名额 = max(0, self._并发上限 - len(self._优先级))
+        总权重 = sum(self._权重(值) for 值 in self._优先级.values()) + self._权重(0) * min(空闲名额, self._排队数)
+        if 总权重 <= 0:
+            return {}
+        return {任务ID: self._总速率 * self._权重(值) / 总权重 for 任务ID, 值 in self._优先级.items()}
+
+    def 注册原生任务(self, 任务ID: str, 优先级: int = 0) -> 令牌桶:
+        self._优先级[任务ID] = 优先级
+        桶 = self._令牌桶.setdefault(任务ID, 令牌桶())
+        self._重新分配()
+        return 桶
+
+    def 注册外部任务(self, 任务ID: str, 优先级: int = 0) -> Optional[float]:
+        """
+        返回该进程启动时应使用的限速：未设置总预算时为 None；
+        否则为目标份额与尚未分出部分的较小值，按 K 取整；为 0 表示要等其它外部进程按新份额重启后再申请
+        """
+        self._优先级[任务ID] = 优先级
+        self._外部任务.add(任务ID)
+        旧份额 = self._固定份额.pop(任务ID, None)
+        if self._总速率 is not None:
+            剩余 = max(0.0, self._总速率 - sum(self._固定份额.values()))
+            # -R 最低 1K：目标不足 1K 的低优先级进程也按 1K 计入总预算
+            self._固定份额[任务ID] = _按K取整(min(剩余, max(1024.0, self.目标份额()[任务ID])))
+        if 旧份额 and 旧份额 > self._固定份额.get(任务ID, 0.0):
+            self._份额释放.set()
+        self._重新分配()
+        return self._固定份额.get(任务ID)
+
+    async def 等待份额释放(self):
+        """注册外部任务得到 0 之后调用，等到其它外部进程注销或按更小的份额重启，再重新注册"""
+        self._份额释放.clear()
+        await self._份额释放.wait()
+
+    def 注销(self, 任务ID: str):
+        self._优先级.pop(任务ID, None)
+        self._令牌桶.pop(任务ID, None)
+        self._外部任务.discard(任务ID)
+        if self._固定份额.pop(任务ID, None):
+            self._份额释放.set()
+        self._重新分配()
+
+    def 设置优先级(self, 任务ID: str, 优先级: int):
+        if 任务ID not in self._优先级:
+            return
+        self._优先级[任务ID] = 优先级
+        self._重新分配()
+
+    def 各任务限速(self) -> Dict[str, Optional[float]]:
+        结果: Dict[str, Optional[float]] = {任务ID: 桶.速率 for 任务ID, 桶 in self._令牌桶.items()}
+        for 任务ID in self._优先级:
+            if 任务ID not in 结果:
+                结果[任务ID] = self._固定份额.get(任务ID)
+        return 结果
+
+    def 待调整外部任务(self) -> List[str]:
+        """
+        份额偏离目标、需要按新的 -R 重启的外部进程：
+        超出目标的必须让出；低于目标的只在尚未分出的部分足以补上时才调整，避免重启后份额不变；
+        有进程在等份额（分到 0）时，超出目标 1K 以上的都要让出，否则等待方可能一直等到别的任务结束
+        """
+        if self._总速率 is None:
+            # 取消了总预算，按启动时份额限速的进程重启后不再限速
+            return [任务ID for 任务ID in self._外部任务 if self._固定份额.get(任务ID)]
+        目标 = self.目标份额()
+        剩余 = max(0.0, self._总速率 - sum(self._固定份额.values()))
+        有等待 = any(self._固定份额.get(任务ID) == 0 for 任务ID in self._外部任务)
+        结果 = []
+        for 任务ID in self._外部任务:
+            当前 = self._固定份额.get(任务ID)
+            if 当前 == 0:
+                continue
+            if 当前 is None:
+                # 设置总预算之前启动的进程没有限速
+                结果.append(任务ID)
+                continue
+            阈值 = max(1024.0, 目标[任务ID] * self.调整阈值)
+            可得 = _按K取整(min(目标[任务ID], 剩余 + 当前))
+            if 有等待 and 当前 - _按K取整(目标[任务ID]) >= 1024.0:
+                结果.append(任务ID)
+            elif 当前 - 目标[任务ID] > 阈值 or 可得 - 当前 > 阈值:
+                结果.append(任务ID)
+        return 结果
+
+    def _重新分配(self):
+        if self._总速率 is None:
+            for 桶 in self._令牌桶.values():
+                桶.设置速率(None)
+            return
+        if not self._令牌桶:
+            return
+        # 原生任务实时调速，分走外部进程没有占用的全部预算
+        可分配 = max(0.0, self._总速率 - sum(self._固定份额.values()))
+        总权重 = sum(self._权重(self._优先级[任务ID]) for 任务ID in self._令牌桶)
+        for 任务ID, 桶 in self._令牌桶.items():
+            桶.设置速率(可分配 * self._权重(self._优先级[任务ID]) / 总权重)
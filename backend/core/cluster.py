@@ -0,0 +1,542 @@
+"""
+多进程 API 集群
+uvicorn --workers N 启动的多个进程里，抢到文件锁的一个成为主进程：持有任务管理器、任务存储与全部下载，
+并在本地 Unix 域套接字上提供中继；其余进程持有任务表副本，读请求在本进程内完成，写操作转发给主进程。
+主进程的任务变更与事件按原编号推送给每个副本，连到任何进程的 SSE 客户端看到的是同一条事件流
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from pydantic import BaseModel
+
+from backend.models.task import Task
+from .event_bus import 订阅者
+from .metrics import 指标文本
+from .task_manager import 任务管理器, 批量校验错误
+from .worker_coordinator import 租约无效
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# 单条消息（含完整快照）的最大长度，以及主进程为单个副本缓冲的最大未发送字节数
+_消息长度上限 = 64 * 1024 * 1024
+_写缓冲上限 = 64 * 1024 * 1024
+
+# 副本可以转发给主进程执行的任务管理器方法（均为协程）
+_可转发方法 = frozenset(
+    {
+        "创建任务",
+        "批量创建任务",
+        "开始任务",
+        "暂停任务",
+        "删除任务",
+        "批量开始任务",
+        "批量暂停任务",
+        "批量删除任务",
+        "设置任务优先级",
+        "更新调度设置",
+        "刷新任务日志",
+        "获取任务指标",
+    }
+)
+_协调器方法 = frozenset({"租用", "心跳", "完成", "状态"})
+
+
+def _编码(消息: Dict[str, Any]) -> bytes:
+    return json.dumps(消息, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def _转为JSON(值: Any) -> Any:
+    if isinstance(值, BaseModel):
+        return 值.model_dump(mode="json")
+    if isinstance(值, (list, tuple)):
+        return [_转为JSON(项) for 项 in 值]
+    return 值
+
+
+def _编码异常(异常: Exception) -> Dict[str, Any]:
+    """只保留路由层区分处理的异常类型，其它一律按 RuntimeError 传回"""
+    if isinstance(异常, 批量校验错误):
+        return {"error": "批量校验错误", "message": str(异常), "errors": 异常.错误列表}
+    for 类型 in (租约无效, KeyError, ValueError):
+        if isinstance(异常, 类型):
+            return {"error": 类型.__name__, "message": 异常.args[0] if 异常.args else ""}
+    return {"error": "RuntimeError", "message": str(异常)}
+
+
+def _还原异常(回复: Dict[str, Any]) -> Exception:
+    类型 = 回复.get("error")
+    消息 = 回复.get("message") or ""
+    if 类型 == "批量校验错误":
+        return 批量校验错误(回复.get("errors") or [])
+    if 类型 == "租约无效":
+        return 租约无效(消息)
+    if 类型 == "KeyError":
+        return KeyError(消息)
+    if 类型 == "ValueError":
+        return ValueError(消息)
+    return RuntimeError(消息)
+
+
+def 尝试成为主进程(锁路径: Path) -> Optional[int]:
+    """以非阻塞方式对锁文件加排他锁，成功返回文件描述符（进程存活期间保持打开），已被占用返回 None"""
+    if fcntl is None:
+        raise RuntimeError("集群模式依赖 Unix 域套接字与 fcntl 文件锁，仅支持 Linux/macOS")
+    锁路径.parent.mkdir(parents=True, exist_ok=True)
+    描述符 = os.open(锁路径, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(描述符, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(描述符)
+        return None
+    return 描述符
+
+
+class 集群中继:
+    """主进程侧：向每个副本推送快照、任务变更与事件，并执行副本转发来的写操作"""
+
+    def __init__(self, 管理器: 任务管理器, 套接字路径: Path, 同步间隔: float = 0.05, 状态间隔: float = 1.0):
+        self._管理器 = 管理器
+        self._套接字路径 = Path(套接字路径)
+        self._同步间隔 = 同步间隔
+        self._状态间隔 = 状态间隔
+        # 尚未推送的变更：任务ID -> 修订号，多次修改合并为一条
+        self._待同步: Dict[str, int] = {}
+        self._有变更 = asyncio.Event()
+        self._连接: Set[asyncio.StreamWriter] = set()
+        self._连接任务: Set[asyncio.Task] = set()
+        self._调用任务: Set[asyncio.Task] = set()
+        self._服务器: Optional[asyncio.AbstractServer] = None
+        self._同步任务: Optional[asyncio.Task] = None
+        管理器.订阅变更(self._记录变更)
+
+    @property
+    def 副本数(self) -> int:
+        return len(self._连接)
+
+    async def 启动(self):
+        self._套接字路径.parent.mkdir(parents=True, exist_ok=True)
+        # 持有主进程锁时残留的套接字文件一定来自已退出的旧主进程
+        self._套接字路径.unlink(missing_ok=True)
+        self._服务器 = await asyncio.start_unix_server(
+            self._处理连接, path=str(self._套接字路径), limit=_消息长度上限
+        )
+        self._同步任务 = asyncio.create_task(self._同步循环(), name="cluster-sync")
+
+    async def 关闭(self):
+        任务 = self._同步任务
+        self._同步任务 = None
+        if 任务 and not 任务.done():
+            任务.cancel()
+            _ = await asyncio.gather(任务, return_exceptions=True)
+        if self._服务器 is not None:
+            self._服务器.close()
+        for 调用 in list(self._调用任务):
+            # 主要是长轮询中的租用请求，不等它们超时
+            调用.cancel()
+        for 写入端 in list(self._连接):
+            写入端.close()
+        if self._连接任务:
+            _ = await asyncio.gather(*self._连接任务, return_exceptions=True)
+        if self._服务器 is not None:
+            await self._服务器.wait_closed()
+            self._服务器 = None
+        self._套接字路径.unlink(missing_ok=True)
+
+    def _记录变更(self, 任务ID: str, 修订号: int):
+        self._待同步[任务ID] = 修订号
+        self._有变更.set()
+
+    def _写入(self, 写入端: asyncio.StreamWriter, 数据: bytes):
+        if 写入端.is_closing():
+            return
+        if 写入端.transport.get_write_buffer_size() > _写缓冲上限:
+            # 副本长时间不读：断开连接，它重连后会重新拿到完整快照
+            self._连接.discard(写入端)
+            写入端.close()
+            return
+        写入端.write(数据)
+
+    def _刷新同步(self, 附带状态: bool = False):
+        """把积攒的变更推给所有副本；写入都是同步的，调用方随后写出的消息一定排在变更之后"""
+        self._有变更.clear()
+        if not self._连接:
+            self._待同步.clear()
+            return
+        if not self._待同步 and not 附带状态:
+            return
+        变更, self._待同步 = self._待同步, {}
+        消息 = {"type": "sync", **self._管理器.复制变更(变更)}
+        if 附带状态:
+            消息["status"] = self._管理器.复制状态()
+        数据 = _编码(消息)
+        for 写入端 in list(self._连接):
+            self._写入(写入端, 数据)
+
+    async def _同步循环(self):
+        上次状态 = 0.0
+        while True:
+            try:
+                await asyncio.wait_for(self._有变更.wait(), timeout=self._状态间隔)
+            except asyncio.TimeoutError:
+                pass
+            现在 = time.monotonic()
+            附带状态 = 现在 - 上次状态 >= self._状态间隔
+            if 附带状态:
+                上次状态 = 现在
+            self._刷新同步(附带状态)
+            await asyncio.sleep(self._同步间隔)
+
+    async def _处理连接(self, 读取端: asyncio.StreamReader, 写入端: asyncio.StreamWriter):
+        当前任务 = asyncio.current_task()
+        self._连接任务.add(当前任务)
+        # 先把积攒的变更发给已有副本，再生成快照；快照与订阅之间没有 await，之后的事件一条不漏
+        self._刷新同步()
+        快照 = {"type": "snapshot", **self._管理器.复制快照(), "status": self._管理器.复制状态()}
+        订阅 = await self._管理器.事件总线.订阅()
+        self._连接.add(写入端)
+        self._写入(写入端, _编码(快照))
+        推送 = asyncio.create_task(self._推送事件(写入端, 订阅), name="cluster-events")
+        try:
+            while True:
+                行 = await 读取端.readline()
+                if not 行:
+                    break
+                消息 = json.loads(行)
+                if 消息.get("type") == "call":
+                    调用 = asyncio.create_task(self._执行调用(写入端, 消息))
+                    self._调用任务.add(调用)
+                    调用.add_done_callback(self._调用任务.discard)
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            推送.cancel()
+            _ = await asyncio.gather(推送, return_exceptions=True)
+            await self._管理器.事件总线.取消订阅(订阅)
+            self._连接.discard(写入端)
+            写入端.close()
+            self._连接任务.discard(当前任务)
+
+    async def _推送事件(self, 写入端: asyncio.StreamWriter, 订阅: 订阅者):
+        while not 订阅.已关闭 and not 写入端.is_closing():
+            await 订阅.等待()
+            事件列表 = 订阅.取出全部()
+            if not 事件列表:
+                continue
+            # 先推送任务变更：副本收到 task.created 等事件时，对应任务已经在它的任务表里
+            self._刷新同步()
+            self._写入(
+                写入端,
+                b"".join(
+                    _编码({"type": "event", "event": 事件对象.event, "data": 事件对象.data, "id": 事件对象.id})
+                    for 事件对象 in 事件列表
+                ),
+            )
+
+    async def _执行调用(self, 写入端: asyncio.StreamWriter, 消息: Dict[str, Any]):
+        方法 = str(消息.get("method") or "")
+        try:
+            对象, _, 方法名 = 方法.rpartition(".")
+            if not 对象 and 方法名 in _可转发方法:
+                目标 = getattr(self._管理器, 方法名)
+            elif 对象 == "协调器" and 方法名 in _协调器方法:
+                协调器 = self._管理器.协调器
+                if 协调器 is None:
+                    raise RuntimeError("未启用远程工作节点")
+                目标 = getattr(协调器, 方法名)
+            else:
+                raise RuntimeError(f"不支持转发的方法: {方法}")
+            回复 = {"ok": True, "value": _转为JSON(await 目标(*(消息.get("args") or [])))}
+        except Exception as 异常:
+            回复 = {"ok": False, **_编码异常(异常)}
+        # 先推送这次调用造成的变更，副本拿到结果时本地任务表已是最新
+        self._刷新同步()
+        self._写入(写入端, _编码({"type": "result", "id": 消息.get("id"), **回复}))
+
+
+class _协调器代理:
+    """副本上的 /api/workers 请求经主进程的租约协调器处理，接口与 租约协调器 的协程方法一致"""
+
+    def __init__(self, 副本: "任务管理器副本"):
+        self._副本 = 副本
+
+    async def 租用(self, 工作节点: str, 数量: int = 1, 等待秒数: float = 0.0) -> List[Dict[str, Any]]:
+        return await self._副本._调用("协调器.租用", 工作节点, 数量, 等待秒数)
+
+    async def 心跳(self, 租约ID: str, 工作节点: str, 进度=None, 日志行=None) -> Dict[str, Any]:
+        return await self._副本._调用("协调器.心跳", 租约ID, 工作节点, 进度, 日志行)
+
+    async def 完成(self, 租约ID: str, 工作节点: str, 成功: bool, 错误: Optional[str] = None):
+        return await self._副本._调用("协调器.完成", 租约ID, 工作节点, 成功, 错误)
+
+    async def 状态(self) -> Dict[str, Any]:
+        return await self._副本._调用("协调器.状态")
+
+
+class 任务管理器副本(任务管理器):
+    """
+    集群中的非主进程：任务表、索引与修订号由主进程推送维护，查询/分页/ETag 与主进程结果一致
+    写操作转发给主进程执行；本进程不启动下载、不写任务存储与日志
+    """
+
+    def __init__(self, 套接字路径: Path, 事件回放容量: int = 1000, 连接超时: float = 30.0):
+        super().__init__(事件回放容量=事件回放容量)
+        self._套接字路径 = Path(套接字路径)
+        self._连接超时 = 连接超时
+        self._写入端: Optional[asyncio.StreamWriter] = None
+        self._连接任务: Optional[asyncio.Task] = None
+        self._已同步 = asyncio.Event()
+        self._已连接过 = False
+        self._调用编号 = itertools.count(1)
+        self._等待回复: Dict[int, asyncio.Future] = {}
+        # 主进程定期推送的调度、锁、缓存状态与指标文本
+        self._主进程状态: Dict[str, Any] = {}
+        self._协调器代理 = _协调器代理(self)
+
+    async def 初始化(self):
+        self._连接任务 = asyncio.create_task(self._连接循环(), name="cluster-replica")
+        try:
+            await asyncio.wait_for(self._已同步.wait(), timeout=self._连接超时)
+        except asyncio.TimeoutError:
+            await self.关闭()
+            raise RuntimeError(f"无法连接集群主进程: {self._套接字路径}")
+
+    async def 关闭(self):
+        任务 = self._连接任务
+        self._连接任务 = None
+        if 任务 and not 任务.done():
+            任务.cancel()
+            _ = await asyncio.gather(任务, return_exceptions=True)
+
+    @property
+    def 已连接(self) -> bool:
+        return self._已同步.is_set()
+
+    async def _连接循环(self):
+        while True:
+            try:
+                读取端, 写入端 = await asyncio.open_unix_connection(str(self._套接字路径), limit=_消息长度上限)
+            except OSError:
+                # 主进程还在启动，或已退出等待新的主进程接手
+                await asyncio.sleep(0.2)
+                continue
+            self._写入端 = 写入端
+            try:
+                while True:
+                    行 = await 读取端.readline()
+                    if not 行:
+                        break
+                    self._处理消息(json.loads(行))
+            except (ConnectionError, ValueError):
+                pass
+            finally:
+                self._写入端 = None
+                self._已同步.clear()
+                写入端.close()
+                for 结果 in self._等待回复.values():
+                    if not 结果.done():
+                        结果.set_exception(ConnectionError("与集群主进程的连接已断开"))
+                self._等待回复.clear()
+            await asyncio.sleep(0.2)
+
+    def _处理消息(self, 消息: Dict[str, Any]):
+        类型 = 消息.get("type")
+        if 类型 == "event":
+            self._事件总线.立即发布(消息["event"], 消息["data"], 编号=int(消息["id"]))
+        elif 类型 == "sync":
+            self._应用变更(消息)
+        elif 类型 == "result":
+            结果 = self._等待回复.pop(消息.get("id"), None)
+            if 结果 is not None and not 结果.done():
+                if 消息.get("ok"):
+                    结果.set_result(消息.get("value"))
+                else:
+                    结果.set_exception(_还原异常(消息))
+        elif 类型 == "snapshot":
+            self._应用快照(消息)
+            self._已同步.set()
+        if "status" in 消息:
+            self._主进程状态 = 消息["status"]
+
+    def _应用快照(self, 消息: Dict[str, Any]):
+        if self._已连接过:
+            # 重连期间可能漏掉了事件：关闭现有 SSE 订阅者，让客户端带 Last-Event-ID 重连后补发快照
+            self._事件总线.关闭()
+        self._已连接过 = True
+        self._事件总线.重置编号(int(消息.get("last_event_id") or 0))
+        self._任务表 = {项["id"]: Task.model_validate(项) for 项 in 消息.get("tasks") or []}
+        self._重建索引()
+        self._任务修订 = {任务ID: int(修订) for 任务ID, 修订 in (消息.get("revisions") or {}).items()}
+        self._修订号 = int(消息["revision"])
+        self._初始修订号 = int(消息.get("initial_revision") or self._修订号)
+        # 快照之前的删除记录不可得，早于快照的 since 查询按全量返回
+        self._删除记录.clear()
+        self._删除记录截断修订 = self._修订号
+
+    def _应用变更(self, 消息: Dict[str, Any]):
+        修订表 = 消息.get("revisions") or {}
+        for 项 in 消息.get("tasks") or []:
+            任务 = Task.model_validate(项)
+            self._替换任务(任务)
+            self._任务修订[任务.id] = int(修订表.get(任务.id, 消息["revision"]))
+        for 修订, 任务ID in 消息.get("deleted") or []:
+            if 任务ID in self._任务表:
+                self._移除任务(任务ID)
+            self._任务修订.pop(任务ID, None)
+            if len(self._删除记录) == self._删除记录.maxlen:
+                self._删除记录截断修订 = self._删除记录[0][0]
+            self._删除记录.append((int(修订), 任务ID))
+        self._修订号 = max(self._修订号, int(消息["revision"]))
+
+    def _替换任务(self, 任务: Task):
+        """进度等字段变化时原位替换，只有名称、链接或创建时间变化才重建该任务的索引"""
+        旧任务 = self._任务表.get(任务.id)
+        if 旧任务 is None:
+            self._加入任务(任务)
+            return
+        if (旧任务.name, 旧任务.url, 旧任务.created_at) != (任务.name, 任务.url, 任务.created_at):
+            self._移除任务(任务.id)
+            self._加入任务(任务)
+            return
+        if 旧任务.status != 任务.status:
+            self._状态索引[旧任务.status].discard(任务.id)
+            self._状态索引[任务.status].add(任务.id)
+        self._任务表[任务.id] = 任务
+
+    async def _调用(self, 方法: str, *参数: Any) -> Any:
+        写入端 = self._写入端
+        if 写入端 is None or 写入端.is_closing():
+            raise ConnectionError("未连接到集群主进程")
+        编号 = next(self._调用编号)
+        结果 = asyncio.get_running_loop().create_future()
+        self._等待回复[编号] = 结果
+        写入端.write(_编码({"type": "call", "id": 编号, "method": 方法, "args": list(参数)}))
+        try:
+            return await 结果
+        finally:
+            self._等待回复.pop(编号, None)
+
+    def _本地任务(self, 数据: Dict[str, Any]) -> Task:
+        # 主进程在回复之前已推送变更，通常直接取到副本里的同一任务
+        return self._任务表.get(数据["id"]) or Task.model_validate(数据)
+
+    # ========== 转发给主进程的写操作 ==========
+
+    async def 创建任务(self, 链接: str, 保存名称: str, 优先级: int = 0) -> Task:
+        return self._本地任务(await self._调用("创建任务", 链接, 保存名称, 优先级))
+
+    async def 批量创建任务(self, 条目列表: List[tuple[str, str, int]]) -> List[Task]:
+        return [self._本地任务(项) for 项 in await self._调用("批量创建任务", [list(条目) for 条目 in 条目列表])]
+
+    async def 开始任务(self, 任务ID: str) -> Task:
+        return self._本地任务(await self._调用("开始任务", 任务ID))
+
+    async def 暂停任务(self, 任务ID: str) -> Task:
+        return self._本地任务(await self._调用("暂停任务", 任务ID))
+
+    async def 删除任务(self, 任务ID: str):
+        await self._调用("删除任务", 任务ID)
+
+    async def 批量开始任务(self, 任务ID列表: List[str]) -> List[Task]:
+        return [self._本地任务(项) for 项 in await self._调用("批量开始任务", list(任务ID列表))]
+
+    async def 批量暂停任务(self, 任务ID列表: List[str]) -> List[Task]:
+        return [self._本地任务(项) for 项 in await self._调用("批量暂停任务", list(任务ID列表))]
+
+    async def 批量删除任务(self, 任务ID列表: List[str]) -> int:
+        return int(await self._调用("批量删除任务", list(任务ID列表)))
+
+    async def 设置任务优先级(self, 任务ID: str, 优先级: int) -> Task:
+        return self._本地任务(await self._调用("设置任务优先级", 任务ID, 优先级))
+
+    async def 更新调度设置(
+        self, 并发上限: Optional[int] = None, 带宽上限: Optional[str] = None
+    ) -> Dict[str, Any]:
+        状态 = await self._调用("更新调度设置", 并发上限, 带宽上限)
+        self._主进程状态["scheduler"] = 状态
+        return 状态
+
+    async def 刷新任务日志(self, 任务ID: str):
+        # 日志文件由主进程写入，读取前让它把缓冲落盘
+        await self._调用("刷新任务日志", 任务ID)
+
+    async def 获取任务指标(self, 任务ID: str, 点数: int = 120) -> Dict[str, Any]:
+        # 遥测只在执行下载的主进程里记录
+        return await self._调用("获取任务指标", 任务ID, 点数)
+
+    # ========== 主进程推送的运行状态 ==========
+
+    @property
+    def 协调器(self) -> Optional[_协调器代理]:
+        return self._协调器代理 if self._主进程状态.get("workers_enabled") else None
+
+    def 调度器状态(self) -> Dict[str, Any]:
+        return self._主进程状态.get("scheduler", {})
+
+    def 自适应状态(self) -> Dict[str, Any]:
+        return self._主进程状态.get("adaptive", {"enabled": False})
+
+    def 锁统计(self) -> Dict[str, Any]:
+        return self._主进程状态.get("locks", {})
+
+    def 缓存统计(self) -> Dict[str, Any]:
+        return self._主进程状态.get("cache", {})
+
+    def 导出指标(self, 输出: 指标文本):
+        输出.原文(self._主进程状态.get("metrics", ""))
+
+
+class 集群节点:
+    """本进程在集群中的角色：主进程持有真正的任务管理器与中继，其它进程持有副本"""
+
+    def __init__(self, 管理器: 任务管理器, 中继: Optional[集群中继] = None, 锁文件: Optional[int] = None):
+        self.管理器 = 管理器
+        self._中继 = 中继
+        self._锁文件 = 锁文件
+
+    @property
+    def 是主进程(self) -> bool:
+        return self._中继 is not None
+
+    async def 关闭(self):
+        try:
+            if self._中继 is not None:
+                await self._中继.关闭()
+            await self.管理器.关闭()
+        finally:
+            if self._锁文件 is not None:
+                os.close(self._锁文件)
+                self._锁文件 = None
+
+
+async def 加入集群(
+    套接字路径: Path,
+    创建管理器: Callable[[], 任务管理器],
+    事件回放容量: int = 1000,
+) -> 集群节点:
+    """抢到 <套接字路径>.lock 的进程成为主进程，其余进程连接主进程的套接字建立副本"""
+    套接字路径 = Path(套接字路径)
+    锁文件 = 尝试成为主进程(套接字路径.with_name(套接字路径.name + ".lock"))
+    if 锁文件 is None:
+        副本 = 任务管理器副本(套接字路径, 事件回放容量=事件回放容量)
+        await 副本.初始化()
+        return 集群节点(副本)
+    try:
+        管理器 = 创建管理器()
+        await 管理器.初始化()
+        中继 = 集群中继(管理器, 套接字路径)
+        await 中继.启动()
+    except BaseException:
+        os.close(锁文件)
+        raise
+    return 集群节点(管理器, 中继, 锁文件)
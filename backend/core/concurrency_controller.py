@@ -0,0 +1,182 @@
+"""
+自适应并发控制器
+周期性采样所有运行中任务的总吞吐，交替调整同时运行的任务数与新任务的线程数（爬山法），吞吐不再提升时停在当前设置并继续试探
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from .scheduler import 任务调度器
+
+_并发 = "concurrency"
+_线程 = "threads"
+
+
+class 自适应并发控制器:
+    def __init__(
+        self,
+        调度器: 任务调度器,
+        吞吐采样: Callable[[], float],
+        初始线程数: int = 16,
+        最小并发: int = 1,
+        最大并发: int = 8,
+        最小线程数: int = 2,
+        最大线程数: int = 64,
+        调整间隔: float = 15.0,
+        采样间隔: float = 1.0,
+        容差: float = 0.05,
+        决策记录上限: int = 100,
+    ):
+        self._调度器 = 调度器
+        self._吞吐采样 = 吞吐采样
+        self._最小并发 = max(1, int(最小并发))
+        self._最大并发 = max(self._最小并发, int(最大并发))
+        self._最小线程数 = max(1, int(最小线程数))
+        self._最大线程数 = max(self._最小线程数, int(最大线程数))
+        self._线程数 = min(self._最大线程数, max(self._最小线程数, int(初始线程数)))
+        self._调整间隔 = max(0.1, float(调整间隔))
+        self._采样间隔 = max(0.01, float(采样间隔))
+        self._容差 = max(0.0, float(容差))
+
+        self._维度 = _并发
+        self._方向: Dict[str, int] = {_并发: 1, _线程: 1}
+        # 当前设置下测得的吞吐；上一步为 (维度, 旧值, 新值)，下个周期据此判断是否保留
+        self._基线吞吐: Optional[float] = None
+        self._上一步: Optional[tuple] = None
+        self._决策: Deque[Dict[str, Any]] = deque(maxlen=max(1, int(决策记录上限)))
+        self._后台任务: Optional[asyncio.Task] = None
+
+    @property
+    def 线程数(self) -> int:
+        """新启动任务使用的线程数"""
+        return self._线程数
+
+    def 启动(self):
+        if self._后台任务 is None or self._后台任务.done():
+            self._后台任务 = asyncio.create_task(self._调整循环(), name="adaptive-concurrency")
+
+    async def 关闭(self):
+        任务 = self._后台任务
+        self._后台任务 = None
+        if 任务 and not 任务.done():
+            任务.cancel()
+            _ = await asyncio.gather(任务, return_exceptions=True)
+
+    def 状态(self) -> Dict[str, Any]:
+        return {
+            "enabled": True,
+            "max_concurrency": self._调度器.并发上限,
+            "thread_count": self._线程数,
+            "baseline_bps": self._基线吞吐,
+            "decisions": self.决策记录(),
+        }
+
+    def 决策记录(self) -> List[Dict[str, Any]]:
+        return list(self._决策)
+
+    async def _调整循环(self):
+        样本: List[float] = []
+        周期开始 = time.monotonic()
+        while True:
+            await asyncio.sleep(self._采样间隔)
+            if self._调度器.运行数 == 0:
+                # 空闲时吞吐没有意义，丢弃基线，下次有任务时重新测量
+                样本.clear()
+                self._基线吞吐 = None
+                self._上一步 = None
+                周期开始 = time.monotonic()
+                continue
+            样本.append(float(self._吞吐采样()))
+            if time.monotonic() - 周期开始 < self._调整间隔:
+                continue
+            self.评估(sum(样本) / len(样本))
+            样本.clear()
+            周期开始 = time.monotonic()
+
+    def 评估(self, 吞吐: float) -> Dict[str, Any]:
+        """根据一个周期的平均吞吐做一次决策"""
+        if self._上一步 is not None and self._基线吞吐 is not None:
+            维度, 旧值, 新值 = self._上一步
+            self._上一步 = None
+            变化率 = self._变化率(self._基线吞吐, 吞吐)
+            if 变化率 > self._容差:
+                self._基线吞吐 = 吞吐
+                return self._迈步(吞吐, f"吞吐提升 {变化率:+.1%}，继续")
+            增加 = 新值 > 旧值
+            self._维度 = _线程 if 维度 == _并发 else _并发
+            if 变化率 < -self._容差 or 增加:
+                # 吞吐下降，或加资源没有带来提升：退回原设置，下次朝反方向试探
+                self._设置(维度, 旧值)
+                self._方向[维度] = -1 if 增加 else 1
+                self._基线吞吐 = None
+                原因 = f"吞吐下降 {变化率:+.1%}" if 变化率 < -self._容差 else f"吞吐无明显提升 {变化率:+.1%}"
+                return self._记录("revert", 维度, 新值, 旧值, 吞吐, 原因)
+            # 减少资源而吞吐持平：保留更省资源的设置
+            self._基线吞吐 = 吞吐
+            return self._记录("keep", 维度, 旧值, 新值, 吞吐, f"吞吐持平 {变化率:+.1%}")
+
+        if self._基线吞吐 is None:
+            self._基线吞吐 = 吞吐
+        return self._迈步(吞吐, "试探")
+
+    def _迈步(self, 吞吐: float, 原因: str) -> Dict[str, Any]:
+        维度 = self._维度
+        方向 = self._方向[维度]
+        当前 = self._取值(维度)
+        if 维度 == _并发 and self._调度器.运行数 < self._调度器.并发上限:
+            # 并发上限没有被用满时调整它测不出效果，改为调整线程数
+            self._维度 = _线程
+            return self._记录("hold", 维度, 当前, 当前, 吞吐, "并发上限未用满")
+        if 维度 == _并发 and 方向 > 0 and self._调度器.排队数 == 0:
+            self._维度 = _线程
+            return self._记录("hold", 维度, 当前, 当前, 吞吐, "没有排队任务")
+
+        新值 = self._下一个值(维度, 当前, 方向)
+        if 新值 == 当前:
+            self._方向[维度] = -方向
+            self._维度 = _线程 if 维度 == _并发 else _并发
+            return self._记录("hold", 维度, 当前, 当前, 吞吐, "已到边界")
+        self._设置(维度, 新值)
+        self._上一步 = (维度, 当前, 新值)
+        return self._记录("increase" if 新值 > 当前 else "decrease", 维度, 当前, 新值, 吞吐, 原因)
+
+    def _下一个值(self, 维度: str, 当前: int, 方向: int) -> int:
+        if 维度 == _并发:
+            return min(self._最大并发, max(self._最小并发, 当前 + 方向))
+        新值 = max(当前 + 1, round(当前 * 1.5)) if 方向 > 0 else min(当前 - 1, round(当前 / 1.5))
+        return min(self._最大线程数, max(self._最小线程数, 新值))
+
+    def _取值(self, 维度: str) -> int:
+        return self._调度器.并发上限 if 维度 == _并发 else self._线程数
+
+    def _设置(self, 维度: str, 值: int):
+        if 维度 == _并发:
+            self._调度器.设置并发上限(值)
+        else:
+            self._线程数 = 值
+
+    @staticmethod
+    def _变化率(基线: float, 吞吐: float) -> float:
+        if 基线 <= 0:
+            return 1.0 if 吞吐 > 0 else 0.0
+        return (吞吐 - 基线) / 基线
+
+    def _记录(self, 动作: str, 维度: str, 原值: int, 新值: int, 吞吐: float, 原因: str) -> Dict[str, Any]:
+        决策 = {
+            "time": datetime.now(timezone.utc).isoformat(),
+            "action": 动作,
+            "dimension": 维度,
+            "from": 原值,
+            "to": 新值,
+            "throughput_bps": round(吞吐, 1),
+            "max_concurrency": self._调度器.并发上限,
+            "thread_count": self._线程数,
+            "reason": 原因,
+        }
+        self._决策.append(决策)
+        return 决策
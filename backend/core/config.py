@@ -55,6 +55,26 @@ class Config:
         """N_m3u8DL-RE 可执行文件路径"""
         return self._解析路径(self._config["downloader"]["m3u8d_path"])
     
+    @property
+    def engine(self) -> str:
+        """下载引擎：external（N_m3u8DL-RE 子进程）或 native（内置 asyncio 引擎）"""
+        return self._config["downloader"].get("engine", "external")
+    
+    @property
+    def native_max_connections(self) -> int:
+        """原生引擎共享连接池的最大连接数（所有任务共用）"""
+        return self._config["downloader"].get("native_max_connections", 64)
+    
+    @property
+    def segment_cache_dir(self) -> str:
+        """原生引擎分片缓存目录（所有任务共用）"""
+        return self._解析路径(self._config["downloader"].get("segment_cache_dir", "./segment_cache"))
+    
+    @property
+    def segment_cache_max_mb(self) -> int:
+        """分片缓存容量上限（MB），0 表示不启用"""
+        return int(self._config["downloader"].get("segment_cache_max_mb", 1024))
+    
     @property
     def save_dir(self) -> str:
         """最终文件保存目录"""
@@ -195,6 +215,141 @@ class Config:
         """解密工具路径"""
         return self._解析路径(self._config["downloader"]["decryption_binary_path"])
 
+    
+    # ========== 任务管理配置 ==========
+    
+    def _管理配置(self) -> Dict[str, Any]:
+        return self._config.get("manager", {})
+    
+    @property
+    def max_concurrency(self) -> int:
+        """同时下载的任务数上限（运行时可通过 /api/scheduler 调整）"""
+        return int(self._管理配置().get("max_concurrency", 3))
+    
+    @property
+    def bandwidth_limit(self) -> str:
+        """所有任务合计的限速（如 "20M"），留空表示不限速"""
+        return str(self._管理配置().get("bandwidth_limit", ""))
+    
+    @property
+    def adaptive_concurrency(self) -> bool:
+        """是否按总吞吐自动调整并发任务数与新任务线程数"""
+        return bool(self._管理配置().get("adaptive_concurrency", False))
+    
+    @property
+    def adaptive_max_concurrency(self) -> int:
+        """自适应控制可调到的最大并发任务数"""
+        return int(self._管理配置().get("adaptive_max_concurrency", 8))
+    
+    @property
+    def adaptive_max_threads(self) -> int:
+        """自适应控制可调到的最大线程数"""
+        return int(self._管理配置().get("adaptive_max_threads", 64))
+    
+    @property
+    def adaptive_interval(self) -> float:
+        """自适应控制每次调整之间的采样时长（秒）"""
+        return float(self._管理配置().get("adaptive_interval", 15.0))
+    
+    @property
+    def progress_flush_hz(self) -> float:
+        """进度合并刷新频率（次/秒）"""
+        return float(self._管理配置().get("progress_flush_hz", 4.0))
+    
+    @property
+    def tasks_save_max_hz(self) -> float:
+        """tasks.json 每秒最多落盘次数"""
+        return float(self._管理配置().get("tasks_save_max_hz", 2.0))
+    
+    @property
+    def log_queue_size(self) -> int:
+        """任务日志内存队列上限（行），写满后丢弃并在日志中记录丢弃行数"""
+        return int(self._管理配置().get("log_queue_size", 10000))
+    
+    @property
+    def event_replay_size(self) -> int:
+        """SSE 事件回放缓冲容量（条），客户端带 Last-Event-ID 重连时从中补发"""
+        return int(self._管理配置().get("event_replay_size", 1000))
+    
+    @property
+    def telemetry_interval(self) -> float:
+        """任务遥测的采样间隔（秒）"""
+        return float(self._管理配置().get("telemetry_interval", 1.0))
+    
+    @property
+    def telemetry_samples(self) -> int:
+        """每个任务遥测环形缓冲保留的采样数"""
+        return int(self._管理配置().get("telemetry_samples", 3600))
+    
+    @property
+    def stall_timeout(self) -> float:
+        """占用名额的任务连续多少秒没有任何输出视为卡死（0 表示不检测）"""
+        return float(self._管理配置().get("stall_timeout", 300.0))
+    
+    @property
+    def stall_progress_timeout(self) -> float:
+        """有输出但进度连续多少秒没有推进视为卡死（0 表示不检测）"""
+        return float(self._管理配置().get("stall_progress_timeout", 900.0))
+    
+    @property
+    def stall_action(self) -> str:
+        """卡死后的处理："requeue" 重新排队或 "fail" 直接失败"""
+        return str(self._管理配置().get("stall_action", "requeue"))
+    
+    @property
+    def stall_max_requeues(self) -> int:
+        """同一任务因卡死重新排队的最多次数，超过后标记为失败"""
+        return int(self._管理配置().get("stall_max_requeues", 2))
+    
+    # ========== 远程工作节点 ==========
+    
+    def _节点配置(self) -> Dict[str, Any]:
+        return self._config.get("workers", {})
+    
+    @property
+    def worker_mode(self) -> str:
+        """下载执行位置：local 本机运行；remote 交给通过 /api/workers 租用作业的工作节点"""
+        return str(self._节点配置().get("mode", "local"))
+    
+    @property
+    def worker_lease_seconds(self) -> float:
+        """作业租约时长（秒），工作节点超过该时长未心跳则作业重新排队"""
+        return float(self._节点配置().get("lease_seconds", 30.0))
+    
+    @property
+    def worker_max_attempts(self) -> int:
+        """同一作业最多租出几次；租约连续过期达到该次数后任务标记为失败"""
+        return int(self._节点配置().get("max_attempts", 3))
+    
+    @property
+    def worker_token(self) -> str:
+        """工作节点访问 /api/workers 需携带的 X-Worker-Token；留空不校验"""
+        return str(self._节点配置().get("token", ""))
+    
+    # ========== 多进程集群 ==========
+    
+    @property
+    def cluster_enabled(self) -> bool:
+        """多个 API 进程（uvicorn --workers N）共享一个主进程的任务状态，仅支持 Linux/macOS"""
+        return bool(self._config.get("cluster", {}).get("enabled", False))
+    
+    @property
+    def cluster_socket_path(self) -> str:
+        """主进程中继使用的 Unix 域套接字路径，同目录下的 <名称>.lock 用于选出主进程"""
+        return self._解析路径(self._config.get("cluster", {}).get("socket_path", "./var/cluster.sock"))
+    
+    # ========== 存储配置 ==========
+    
+    @property
+    def storage_backend(self) -> str:
+        """任务存储后端：json 或 sqlite"""
+        return self._config.get("storage", {}).get("backend", "json")
+    
+    @property
+    def sqlite_path(self) -> str:
+        """SQLite 数据库路径（storage.backend = "sqlite" 时生效）"""
+        return self._解析路径(self._config.get("storage", {}).get("sqlite_path", "./var/tasks.db"))
+
 
 def _默认配置文件路径() -> Path:
     return Path(__file__).resolve().parent.parent / "config.toml"
@@ -1,18 +1,102 @@
 """
 M3U8 下载器核心模块
-封装 N_m3u8DL-RE 的调用逻辑
+封装 N_m3u8DL-RE 的调用逻辑，也可切换到内置的原生引擎
 """
 
 import asyncio
+import json
 import os
-import re
 import subprocess
 import signal
+import time
 from pathlib import Path
-from typing import Optional, Callable, Dict, Any
 from datetime import datetime
+from typing import Optional, Callable, Dict, Any, Tuple
 
 from .config import get_config, Config
+from .metrics import 子进程启动耗时
+from .native_engine import 原生HLS引擎
+from .output_reader import 输出行读取器
+from .progress_parser import 输出解码器, 解析进度行
+
+
+class _外部续传记录:
+    """
+    N_m3u8DL-RE 重新启动时跳过 <tmp-dir>/<save-name>/ 下已下载完的分片（暂停后继续、按新限速重启都会用到），
+    但在它输出第一条进度之前任务会显示为 0%。这里记下上次运行的分片总数，
+    启动前按临时目录里已有的分片先报告一次真实进度；下载成功后删除记录
+    """
+
+    # 分片与初始化段的扩展名；下载中的临时文件、播放列表与 meta json 不计入
+    分片扩展名 = {".ts", ".m4s", ".mp4", ".m4a", ".m4v", ".aac", ".mp3", ".ac3", ".ec3", ".vtt", ".webm"}
+
+    def __init__(self, 临时目录: Path, 保存名称: str):
+        self._分片目录 = 临时目录 / 保存名称
+        self._路径 = 临时目录 / f"{保存名称}.resume.json"
+        self._分片总数: Optional[int] = None
+        try:
+            self._分片总数 = int(json.loads(self._路径.read_text(encoding="utf-8"))["segments_total"])
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    def 统计已下载(self) -> Tuple[int, int]:
+        if not self._分片目录.is_dir():
+            return 0, 0
+        数量 = 字节数 = 0
+        for 文件 in self._分片目录.rglob("*"):
+            if 文件.suffix.lower() in self.分片扩展名 and 文件.is_file():
+                数量 += 1
+                字节数 += 文件.stat().st_size
+        return 数量, 字节数
+
+    def 报告(
+        self,
+        进度回调: Optional[Callable[[Dict[str, Any]], None]],
+        日志回调: Optional[Callable[[str], None]],
+    ):
+        数量, 字节数 = self.统计已下载()
+        if not 数量:
+            return
+        if 日志回调:
+            日志回调(f"续传：临时目录中已有 {数量} 个分片，N_m3u8DL-RE 将跳过它们")
+        if 进度回调 and self._分片总数:
+            已完成 = min(数量, self._分片总数)
+            进度回调(
+                {
+                    "percent": round(已完成 * 100.0 / self._分片总数, 2),
+                    "speed": None,
+                    "speed_bps": None,
+                    "eta": None,
+                    "segments_done": 已完成,
+                    "segments_total": self._分片总数,
+                    "bytes_done": 字节数,
+                    "bytes_total": None,
+                    "timestamp": datetime.now().isoformat(),
+                }
+            )
+
+    def 包装(self, 进度回调: Optional[Callable[[Dict[str, Any]], None]]):
+        """透传进度，分片总数变化时写入记录"""
+        if 进度回调 is None:
+            return None
+
+        def 回调(进度: Dict[str, Any]):
+            总数 = 进度.get("segments_total")
+            if 总数 and 总数 != self._分片总数:
+                self._分片总数 = int(总数)
+                try:
+                    self._路径.write_text(json.dumps({"segments_total": self._分片总数}), encoding="utf-8")
+                except OSError:
+                    pass
+            进度回调(进度)
+
+        return 回调
+
+    def 清除(self):
+        try:
+            self._路径.unlink()
+        except OSError:
+            pass
 
 
 class M3U8下载器:
@@ -36,12 +120,18 @@ class M3U8下载器:
         self.默认保存目录.mkdir(parents=True, exist_ok=True)
         self.默认临时目录.mkdir(parents=True, exist_ok=True)
         
-        # 检查 N_m3u8DL-RE 是否存在
-        if not self.m3u8d路径.exists():
+        self.引擎 = (self.配置.engine or "external").lower()
+        if self.引擎 not in ("external", "native"):
+            raise ValueError(f"未知的下载引擎: {self.引擎}")
+        
+        # 检查 N_m3u8DL-RE 是否存在（原生引擎不需要）
+        if self.引擎 == "external" and not self.m3u8d路径.exists():
             raise FileNotFoundError(f"找不到 N_m3u8DL-RE: {self.m3u8d路径}")
         
         # 当前运行的进程（用于清理）
         self._当前进程: Optional[asyncio.subprocess.Process] = None
+        # 当前运行的原生引擎（用于取消）
+        self._原生引擎: Optional[原生HLS引擎] = None
     
     async def 下载(
         self,
@@ -79,6 +169,19 @@ class M3U8下载器:
         最终保存目录.mkdir(parents=True, exist_ok=True)
         最终临时目录.mkdir(parents=True, exist_ok=True)
         
+        if self.引擎 == "native":
+            return await self._原生下载(
+                链接=链接,
+                保存名称=保存名称,
+                保存目录=最终保存目录,
+                临时目录=最终临时目录,
+                线程数=线程数,
+                自定义请求头=自定义请求头,
+                进度回调=进度回调,
+                日志回调=日志回调,
+                **其他参数
+            )
+        
         # 构建命令
         命令 = self._构建下载命令(
             链接=链接,
@@ -95,10 +198,13 @@ class M3U8下载器:
             日志回调(f"命令: {' '.join(命令)}")
         
         try:
+            续传 = _外部续传记录(最终临时目录, 保存名称)
+            续传.报告(进度回调, 日志回调)
             # 执行下载
-            成功 = await self._执行下载(命令, 进度回调, 日志回调)
+            成功 = await self._执行下载(命令, 续传.包装(进度回调), 日志回调)
             
             if 成功:
+                续传.清除()
                 if 日志回调:
                     日志回调(f"下载完成: {保存名称}")
                 return True
@@ -117,6 +223,46 @@ class M3U8下载器:
             except Exception:
                 pass
     
+    async def _原生下载(
+        self,
+        链接: str,
+        保存名称: str,
+        保存目录: Path,
+        临时目录: Path,
+        进度回调: Optional[Callable[[Dict[str, Any]], None]] = None,
+        日志回调: Optional[Callable[[str], None]] = None,
+        **其他参数
+    ) -> bool:
+        """使用内置原生引擎下载（不启动子进程，进度为精确的字节/分片计数）"""
+        if 日志回调:
+            日志回调(f"开始下载: {保存名称}（原生引擎）")
+        
+        self._原生引擎 = 原生HLS引擎(self.配置)
+        try:
+            成功 = await self._原生引擎.下载(
+                链接=链接,
+                保存名称=保存名称,
+                保存目录=保存目录,
+                临时目录=临时目录,
+                进度回调=进度回调,
+                日志回调=日志回调,
+                **其他参数
+            )
+        except asyncio.CancelledError:
+            if 日志回调:
+                日志回调("下载被中断，正在停止...")
+            raise
+        except Exception as 异常:
+            if 日志回调:
+                日志回调(f"下载出错: {str(异常)}")
+            return False
+        finally:
+            self._原生引擎 = None
+        
+        if 日志回调:
+            日志回调(f"下载完成: {保存名称}" if 成功 else f"下载失败: {保存名称}")
+        return 成功
+    
     def _构建下载命令(
         self,
         链接: str,
@@ -256,35 +402,26 @@ class M3U8下载器:
     ) -> bool:
         """执行下载命令并解析输出"""
         进程 = None
+        读取器 = None
         try:
             # 创建子进程
+            开始 = time.perf_counter()
             进程 = await asyncio.create_subprocess_exec(
                 *命令,
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.STDOUT,
                 creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
             )
+            子进程启动耗时.观测(time.perf_counter() - 开始)
             
             # 保存当前进程引用
             self._当前进程 = 进程
             
-            # 读取输出
-            while True:
-                行 = await 进程.stdout.readline()
-                if not 行:
-                    break
-                
-                # 尝试多种编码解码（优先 GBK，因为 Windows 中文环境）
-                行文本 = None
-                for 编码 in ['gbk', 'utf-8', 'cp936']:
-                    try:
-                        行文本 = 行.decode(编码).strip()
-                        break
-                    except (UnicodeDecodeError, LookupError):
-                        continue
-                
-                if 行文本 is None:
-                    行文本 = 行.decode('utf-8', errors='ignore').strip()
+            # 读取输出（按 \r / \n 分块切行，进度条重绘也能及时送达）
+            读取器 = 输出行读取器(进程.stdout)
+            解码器 = 输出解码器()
+            async for 行 in 读取器:
+                行文本 = 解码器.解码(行).strip()
                 
                 if 日志回调:
                     日志回调(行文本)
@@ -316,6 +453,8 @@ class M3U8下载器:
             return False
         
         finally:
+            if 读取器:
+                await 读取器.关闭()
             # 清理进程引用
             self._当前进程 = None
     
@@ -353,43 +492,14 @@ class M3U8下载器:
     
     async def 取消(self):
         """取消当前下载"""
+        if self._原生引擎:
+            await self._原生引擎.取消()
         if self._当前进程 and self._当前进程.returncode is None:
             await self._终止进程(self._当前进程)
     
     def _解析进度(self, 输出行: str) -> Optional[Dict[str, Any]]:
-        """
-        解析 N_m3u8DL-RE 输出的进度信息
-        
-        示例输出格式:
-        [12:34:56] 45.5% | 2.5 MB/s | ETA: 00:02:30
-        Vid 1280x720 | 0 Kbps ------------------------------ 523/739 70.77% 153.99MB/228.51MB 15.76MBps 00:00:03
-        """
-        # 匹配百分比
-        百分比匹配 = re.search(r'(\d+\.?\d*)%', 输出行)
-        
-        # 匹配速度（注意：日志里还有 0 Kbps 这种码率信息，这里只识别大写 B 的下载速度）
-        # 兼容：15.76MBps / 2.5 MB/s / 1.70MBps
-        速度列表 = re.findall(r'(\d+(?:\.\d+)?)\s*([KMG]?B)\s*(?:/s|ps)\b', 输出行)
-        速度 = None
-        if 速度列表:
-            数值, 单位 = 速度列表[-1]
-            速度 = f"{数值} {单位}/s"
-        
-        # 匹配 ETA（兼容：ETA: 00:02:30 / 行尾 00:00:03 或 00:01:49 /）
-        eta匹配 = re.search(r'ETA[:\s]+(\d{2}:\d{2}:\d{2})', 输出行)
-        if not eta匹配:
-            eta匹配 = re.search(r'(\d{2}:\d{2}:\d{2})(?=\s*(?:/|$))', 输出行)
-        
-        if 百分比匹配:
-            进度信息 = {
-                "percent": float(百分比匹配.group(1)),
-                "speed": 速度,
-                "eta": eta匹配.group(1) if eta匹配 else None,
-                "timestamp": datetime.now().isoformat()
-            }
-            return 进度信息
-        
-        return None
+        """解析 N_m3u8DL-RE 输出的进度信息（见 progress_parser.解析进度行）"""
+        return 解析进度行(输出行)
     
     def 获取下载路径(self, 保存名称: str, 保存目录: Optional[str] = None) -> Path:
         """获取下载文件的完整路径"""
@@ -1,44 +1,304 @@
 from __future__ import annotations
 
 import asyncio
+import heapq
+import itertools
+import json
+import time
+from collections import deque
 from dataclasses import dataclass
-from typing import Any, Dict, Set
+from functools import cached_property
+from typing import Any, Callable, Deque, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
 
 
 @dataclass(frozen=True)
 class 事件:
     event: str
     data: Dict[str, Any]
+    id: int = 0
+
+    @cached_property
+    def 编码(self) -> bytes:
+        """SSE 报文，每个事件只序列化一次，所有订阅者共享同一份字节"""
+        编号 = f"id: {self.id}\n" if self.id else ""
+        return f"{编号}event: {self.event}\ndata: {json.dumps(self.data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+# 进度事件可合并，日志事件积压时可丢弃，其余（创建/完成/失败/快照）为生命周期事件，从不丢弃
+_进度事件类型 = "task.progress"
+_日志事件类型 = "task.log"
+
+
+class 订阅者:
+    """
+    订阅者队列：投递不阻塞，消费端一次取走全部积压事件
+    积压时进度事件按任务就地合并，日志事件超出上限丢弃最旧的，生命周期事件从不丢弃
+    """
+
+    def __init__(self, 事件类型: Optional[FrozenSet[str]], 任务ID: Optional[str], 上限: int = 1000):
+        self.事件类型 = 事件类型
+        self.任务ID = 任务ID
+        self._生命周期: Deque[事件] = deque()
+        self._日志: Deque[事件] = deque(maxlen=max(1, int(上限)))
+        self._进度: Optional[事件] = None
+        self._信号 = asyncio.Event()
+        self.已关闭 = False
+
+        self.创建时间 = time.time()
+        self._最早积压时间: Optional[float] = None
+        self.已送达ID = 0
+        self.送达数 = 0
+        self.丢弃数 = 0
+        self.合并数 = 0
+        self.最大积压 = 0
+
+    def 索引键(self) -> List[Tuple[Optional[str], Optional[str]]]:
+        if self.事件类型 is None:
+            return [(None, self.任务ID)]
+        return [(类型, self.任务ID) for 类型 in self.事件类型]
+
+    def 匹配(self, 事件对象: 事件) -> bool:
+        if self.事件类型 is not None and 事件对象.event not in self.事件类型:
+            return False
+        return self.任务ID is None or self.任务ID in _提取任务ID(事件对象.data)
+
+    @property
+    def 积压数(self) -> int:
+        return len(self._生命周期) + len(self._日志) + (1 if self._进度 is not None else 0)
+
+    def 放入(self, 事件对象: 事件):
+        if 事件对象.event == _进度事件类型 and self._进度 is not None:
+            self._进度 = _合并进度(self._进度, 事件对象)
+            self.合并数 += 1
+        elif 事件对象.event == _进度事件类型:
+            self._进度 = 事件对象
+        elif 事件对象.event == _日志事件类型:
+            if len(self._日志) == self._日志.maxlen:
+                self.丢弃数 += 1
+            self._日志.append(事件对象)
+        else:
+            self._生命周期.append(事件对象)
+
+        if self._最早积压时间 is None:
+            self._最早积压时间 = time.monotonic()
+        self.最大积压 = max(self.最大积压, self.积压数)
+        self._信号.set()
+
+    def 取出全部(self) -> List[事件]:
+        """按事件编号顺序取出全部积压事件"""
+        进度 = [self._进度] if self._进度 is not None else []
+        结果 = list(heapq.merge(self._生命周期, self._日志, 进度, key=lambda 事件对象: 事件对象.id))
+        self._生命周期.clear()
+        self._日志.clear()
+        self._进度 = None
+        self._最早积压时间 = None
+        self._信号.clear()
+        if 结果:
+            self.送达数 += len(结果)
+            self.已送达ID = max(self.已送达ID, 结果[-1].id)
+        return 结果
+
+    def empty(self) -> bool:
+        return self.积压数 == 0
+
+    def 统计(self, 最新事件ID: int) -> Dict[str, Any]:
+        return {
+            "events": sorted(self.事件类型) if self.事件类型 is not None else None,
+            "task_id": self.任务ID,
+            "connected_at": self.创建时间,
+            "depth": self.积压数,
+            "max_depth": self.最大积压,
+            "delivered": self.送达数,
+            "last_delivered_id": self.已送达ID,
+            "dropped": self.丢弃数,
+            "conflated": self.合并数,
+            "lag_events": self._滞后事件数(最新事件ID),
+            "lag_seconds": round(time.monotonic() - self._最早积压时间, 3) if self._最早积压时间 is not None else 0.0,
+        }
+
+    def _滞后事件数(self, 最新事件ID: int) -> int:
+        """最早一条未送达事件之后总线又发布了多少事件"""
+        队首 = [队列[0].id for 队列 in (self._生命周期, self._日志) if 队列]
+        if self._进度 is not None:
+            队首.append(self._进度.id)
+        return max(0, 最新事件ID - min(队首) + 1) if 队首 else 0
+
+    def 关闭(self):
+        self.已关闭 = True
+        self._信号.set()
+
+    async def 等待(self, 超时: Optional[float] = None) -> bool:
+        """等待有事件或被关闭；超时返回 False。不为每次等待创建 Task"""
+        if self.积压数 or self.已关闭:
+            return True
+        try:
+            async with asyncio.timeout(超时):
+                await self._信号.wait()
+        except TimeoutError:
+            return False
+        return True
+
+
+def _合并进度(旧: 事件, 新: 事件) -> 事件:
+    """同一任务的新进度覆盖旧条目；保留旧事件的编号和位置，保证送达顺序与编号单调"""
+    条目 = {项.get("task_id"): 项 for 项 in 旧.data.get("items", [])}
+    for 项 in 新.data.get("items", []):
+        条目[项.get("task_id")] = 项
+    return 事件(event=新.event, data={**新.data, "items": list(条目.values())}, id=旧.id)
+
+
+def _提取任务ID(data: Dict[str, Any]) -> List[str]:
+    任务ID = data.get("task_id")
+    if isinstance(任务ID, str):
+        return [任务ID]
+    任务 = data.get("task")
+    if isinstance(任务, dict) and isinstance(任务.get("id"), str):
+        return [任务["id"]]
+    项列表 = data.get("items")
+    if isinstance(项列表, list):
+        return [项["task_id"] for 项 in 项列表 if isinstance(项, dict) and isinstance(项.get("task_id"), str)]
+    任务列表 = data.get("tasks")
+    if isinstance(任务列表, list):
+        return [任务["id"] for 任务 in 任务列表 if isinstance(任务, dict) and isinstance(任务.get("id"), str)]
+    任务ID列表 = data.get("task_ids")
+    if isinstance(任务ID列表, list):
+        return [任务ID for 任务ID in 任务ID列表 if isinstance(任务ID, str)]
+    return []
+
+
+def _收窄(事件对象: 事件, 任务ID: str) -> 事件:
+    """批量事件只保留属于该任务的条目，用于按任务订阅的客户端"""
+    data = 事件对象.data
+    if "task_id" in data or "task" in data:
+        return 事件对象
+    if isinstance(data.get("items"), list):
+        data = {**data, "items": [项 for 项 in data["items"] if 项.get("task_id") == 任务ID]}
+    elif isinstance(data.get("tasks"), list):
+        data = {**data, "tasks": [任务 for 任务 in data["tasks"] if 任务.get("id") == 任务ID]}
+    elif isinstance(data.get("task_ids"), list):
+        data = {**data, "task_ids": [任务ID]}
+    else:
+        return 事件对象
+    return 事件(event=事件对象.event, data=data, id=事件对象.id)
 
 
 class 事件总线:
-    def __init__(self):
-        self._订阅者: Set[asyncio.Queue[事件]] = set()
-        self._锁 = asyncio.Lock()
+    def __init__(self, 回放容量: int = 1000, 日志积压上限: int = 1000):
+        # (事件类型 | None, 任务ID | None) -> 订阅者集合；None 表示不过滤
+        self._索引: Dict[Tuple[Optional[str], Optional[str]], Set[订阅者]] = {}
+        self._订阅者: Set[订阅者] = set()
+        self._日志积压上限 = 日志积压上限
+        # 最近发布的事件（编号连续递增），客户端带 Last-Event-ID 重连时从这里补发
+        self._回放缓冲: Deque[事件] = deque(maxlen=max(1, int(回放容量)))
+        self._最新ID = 0
+        self._快照提供者: Callable[[Optional[str]], Dict[str, Any]] = lambda 任务ID: {"tasks": []}
+        # 累计计数，供 /metrics 计算发布速率与丢弃总数（已断开订阅者的丢弃数在退订时并入）
+        self.发布计数: Dict[str, int] = {}
+        self._已退订丢弃数 = 0
+
+    @property
+    def 最新事件ID(self) -> int:
+        return self._最新ID
+
+    def 重置编号(self, 编号: int):
+        """事件来源换成另一条编号序列（集群主进程重启）时调用：清空回放缓冲，之前的 Last-Event-ID 改为补发快照"""
+        self._回放缓冲.clear()
+        self._最新ID = int(编号)
 
-    async def 订阅(self) -> asyncio.Queue[事件]:
-        队列: asyncio.Queue[事件] = asyncio.Queue(maxsize=1000)
-        async with self._锁:
-            self._订阅者.add(队列)
-        return 队列
+    def 设置快照提供者(self, 提供者: Callable[[Optional[str]], Dict[str, Any]]):
+        """断线过久无法补发时，用提供者生成 task.snapshot 事件的数据"""
+        self._快照提供者 = 提供者
 
-    async def 取消订阅(self, 队列: asyncio.Queue[事件]):
-        async with self._锁:
-            self._订阅者.discard(队列)
+    async def 订阅(
+        self,
+        事件类型: Optional[Iterable[str]] = None,
+        任务ID: Optional[str] = None,
+        上次事件ID: Optional[int] = None,
+    ) -> 订阅者:
+        类型集合 = frozenset(类型 for 类型 in 事件类型 if 类型) if 事件类型 is not None else None
+        订阅 = 订阅者(事件类型=类型集合 or None, 任务ID=任务ID or None, 上限=self._日志积压上限)
+        # 补发与注册之间没有 await，不会漏掉或重复期间发布的事件
+        if 上次事件ID is not None:
+            for 事件对象 in self._补发事件(订阅, 上次事件ID):
+                订阅.放入(事件对象)
+        for 键 in 订阅.索引键():
+            self._索引.setdefault(键, set()).add(订阅)
+        self._订阅者.add(订阅)
+        return 订阅
+
+    def _补发事件(self, 订阅: 订阅者, 上次事件ID: int) -> List[事件]:
+        if 上次事件ID == self._最新ID:
+            return []
+        最早ID = self._回放缓冲[0].id if self._回放缓冲 else self._最新ID + 1
+        if 上次事件ID > self._最新ID or 上次事件ID < 最早ID - 1:
+            # 缺口已不在缓冲内（或服务已重启），发送紧凑快照代替逐条补发
+            return [事件(event="task.snapshot", data=self._快照提供者(订阅.任务ID), id=self._最新ID)]
+        # 本地发布的编号连续，按偏移定位；转发来的事件编号可能有间隔（进度被合并），逐条跳过
+        if self._回放缓冲[-1].id - 最早ID + 1 == len(self._回放缓冲):
+            待补发 = itertools.islice(self._回放缓冲, 上次事件ID - 最早ID + 1, None)
+        else:
+            待补发 = (事件对象 for 事件对象 in self._回放缓冲 if 事件对象.id > 上次事件ID)
+        结果 = []
+        for 事件对象 in 待补发:
+            if 订阅.匹配(事件对象):
+                结果.append(_收窄(事件对象, 订阅.任务ID) if 订阅.任务ID else 事件对象)
+        return 结果
+
+    async def 取消订阅(self, 订阅: 订阅者):
+        if 订阅 not in self._订阅者:
+            return
+        self._订阅者.discard(订阅)
+        self._已退订丢弃数 += 订阅.丢弃数
+        for 键 in 订阅.索引键():
+            集合 = self._索引.get(键)
+            if 集合 is None:
+                continue
+            集合.discard(订阅)
+            if not 集合:
+                del self._索引[键]
+
+    def 关闭(self):
+        """唤醒并关闭所有订阅者（服务关闭时调用）"""
+        for 订阅 in list(self._订阅者):
+            订阅.关闭()
+
+    @property
+    def 订阅者数量(self) -> int:
+        return len(self._订阅者)
+
+    def 订阅者统计(self) -> List[Dict[str, Any]]:
+        """每个订阅者的积压深度、丢弃/合并计数与滞后"""
+        return [订阅.统计(self._最新ID) for 订阅 in sorted(self._订阅者, key=lambda 订阅: 订阅.创建时间)]
+
+    def 丢弃总数(self) -> int:
+        """所有订阅者（含已断开的）因积压超限丢弃的日志事件数"""
+        return self._已退订丢弃数 + sum(订阅.丢弃数 for 订阅 in self._订阅者)
 
     async def 发布(self, event: str, data: Dict[str, Any]):
-        事件对象 = 事件(event=event, data=data)
-        async with self._锁:
-            订阅者列表 = list(self._订阅者)
-        for 队列 in 订阅者列表:
-            try:
-                队列.put_nowait(事件对象)
-            except asyncio.QueueFull:
-                try:
-                    _ = 队列.get_nowait()
-                except asyncio.QueueEmpty:
-                    pass
-                try:
-                    队列.put_nowait(事件对象)
-                except asyncio.QueueFull:
-                    pass
+        self.立即发布(event, data)
+
+    def 立即发布(self, event: str, data: Dict[str, Any], 编号: Optional[int] = None):
+        """
+        同步发布，只投递给关心该事件类型/任务的订阅者
+        编号用于转发其它进程的事件（集群副本），沿用来源的编号，客户端换进程重连时 Last-Event-ID 依然有效
+        """
+        self._最新ID = max(self._最新ID + 1, 编号) if 编号 is not None else self._最新ID + 1
+        self.发布计数[event] = self.发布计数.get(event, 0) + 1
+        事件对象 = 事件(event=event, data=data, id=self._最新ID)
+        self._回放缓冲.append(事件对象)
+        if not self._索引:
+            return
+        for 键 in ((event, None), (None, None)):
+            for 订阅 in self._索引.get(键, ()):
+                订阅.放入(事件对象)
+
+        任务ID列表 = _提取任务ID(data)
+        if not 任务ID列表:
+            return
+        for 任务ID in 任务ID列表:
+            目标 = [*self._索引.get((event, 任务ID), ()), *self._索引.get((None, 任务ID), ())]
+            if not 目标:
+                continue
+            单任务事件 = _收窄(事件对象, 任务ID)
+            for 订阅 in 目标:
+                订阅.放入(单任务事件)
@@ -0,0 +1,110 @@
+"""
+带计时的异步锁
+记录每次获取的等待时长与持有时长；任务级锁共用一份统计，便于和全局锁对比争用情况
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+
+from .metrics import 直方图
+
+# 等待时长直方图的桶上限（秒）
+等待分桶 = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class 锁统计:
+    def __init__(self, 名称: str):
+        self.名称 = 名称
+        self.获取次数 = 0
+        self.争用次数 = 0
+        self.等待总秒 = 0.0
+        self.最大等待秒 = 0.0
+        self.持有总秒 = 0.0
+        self.最大持有秒 = 0.0
+        self.等待直方图 = 直方图(等待分桶)
+
+    def 记录等待(self, 秒数: float, 争用: bool):
+        self.获取次数 += 1
+        if 争用:
+            self.争用次数 += 1
+        self.等待总秒 += 秒数
+        self.最大等待秒 = max(self.最大等待秒, 秒数)
+        self.等待直方图.观测(秒数)
+
+    def 记录持有(self, 秒数: float):
+        self.持有总秒 += 秒数
+        self.最大持有秒 = max(self.最大持有秒, 秒数)
+
+    def 快照(self) -> Dict[str, Any]:
+        分桶 = {
+            "+Inf" if 上限 == float("inf") else str(上限): 累计 for 上限, 累计 in self.等待直方图.累计分桶()
+        }
+        return {
+            "acquisitions": self.获取次数,
+            "contended": self.争用次数,
+            "wait_seconds_total": round(self.等待总秒, 6),
+            "wait_seconds_max": round(self.最大等待秒, 6),
+            "hold_seconds_total": round(self.持有总秒, 6),
+            "hold_seconds_max": round(self.最大持有秒, 6),
+            "wait_buckets": 分桶,
+        }
+
+
+class 计时锁:
+    """asyncio.Lock 的包装，用法相同（async with）"""
+
+    def __init__(self, 统计: 锁统计):
+        self._锁 = asyncio.Lock()
+        self.统计 = 统计
+        self._获得时间 = 0.0
+
+    def locked(self) -> bool:
+        return self._锁.locked()
+
+    async def __aenter__(self):
+        开始 = time.perf_counter()
+        争用 = self._锁.locked()
+        await self._锁.acquire()
+        self._获得时间 = time.perf_counter()
+        self.统计.记录等待(self._获得时间 - 开始, 争用)
+        return self
+
+    async def __aexit__(self, *异常信息):
+        self.统计.记录持有(time.perf_counter() - self._获得时间)
+        self._锁.release()
+
+
+class 任务锁表:
+    """每个任务一把锁，随任务加入/移除；不同任务的操作互不等待"""
+
+    def __init__(self):
+        self._锁表: Dict[str, 计时锁] = {}
+        self.统计 = 锁统计("task")
+
+    def 创建(self, 任务ID: str) -> 计时锁:
+        return self._锁表.setdefault(任务ID, 计时锁(self.统计))
+
+    def 移除(self, 任务ID: str):
+        self._锁表.pop(任务ID, None)
+
+    def 清空(self):
+        self._锁表.clear()
+
+    def get(self, 任务ID: str) -> Optional[计时锁]:
+        return self._锁表.get(任务ID)
+
+    @asynccontextmanager
+    async def 多个(self, 任务ID列表: Iterable[str]) -> AsyncIterator[List[str]]:
+        """按 ID 排序依次加锁（固定顺序避免死锁），产出实际加锁的 ID（已不存在的任务被跳过）"""
+        async with AsyncExitStack() as 栈:
+            已加锁: List[str] = []
+            for 任务ID in sorted(set(任务ID列表)):
+                锁 = self._锁表.get(任务ID)
+                if 锁 is not None:
+                    await 栈.enter_async_context(锁)
+                    已加锁.append(任务ID)
+            yield 已加锁
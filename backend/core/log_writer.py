@@ -0,0 +1,166 @@
+"""
+任务日志写入器
+每个活跃任务保持一个带缓冲的文件句柄，日志行先进入有界内存队列，按字节数或时间阈值批量落盘
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, TextIO, Tuple
+
+
+class 任务日志写入器:
+    def __init__(
+        self,
+        路径解析: Callable[[str], Path],
+        队列上限: int = 10000,
+        刷新字节数: int = 64 * 1024,
+        刷新间隔: float = 0.5,
+    ):
+        self._路径解析 = 路径解析
+        self._队列: asyncio.Queue[Tuple[str, str]] = asyncio.Queue(maxsize=max(1, int(队列上限)))
+        self._刷新字节数 = max(1, int(刷新字节数))
+        self._刷新间隔 = max(0.01, float(刷新间隔))
+
+        self._缓冲: Dict[str, List[str]] = {}
+        self._缓冲字节数 = 0
+        self._丢弃行数: Dict[str, int] = {}
+        self._句柄: Dict[str, TextIO] = {}
+        self._写盘锁 = asyncio.Lock()
+        self._后台任务: Optional[asyncio.Task] = None
+        self._上次刷新时间 = time.monotonic()
+
+        self.已写入行数 = 0
+        self.已丢弃行数 = 0
+        self.写盘错误数 = 0
+
+    def 启动(self):
+        if self._后台任务 is None or self._后台任务.done():
+            self._后台任务 = asyncio.create_task(self._刷新循环(), name="task-log-writer")
+
+    async def 关闭(self):
+        任务 = self._后台任务
+        self._后台任务 = None
+        if 任务 and not 任务.done():
+            任务.cancel()
+            _ = await asyncio.gather(任务, return_exceptions=True)
+        self._收集队列()
+        await self._线程写盘(None, 关闭全部=True)
+
+    def 写入(self, 任务ID: str, 行文本: str):
+        """非阻塞写入一行；队列已满时丢弃并计数，不会阻塞事件循环"""
+        内容 = (行文本 or "").rstrip("\r\n") + "\n"
+        try:
+            self._队列.put_nowait((任务ID, 内容))
+        except asyncio.QueueFull:
+            self._丢弃行数[任务ID] = self._丢弃行数.get(任务ID, 0) + 1
+            self.已丢弃行数 += 1
+
+    async def 刷新(self, 任务ID: Optional[str] = None):
+        """把已排队的日志立即落盘（读取日志前调用）"""
+        self._收集队列()
+        await self._线程写盘(任务ID)
+
+    async def 关闭任务(self, 任务ID: str):
+        """任务结束：落盘剩余日志并关闭句柄"""
+        self._收集队列()
+        await self._线程写盘(任务ID, 关闭=True)
+
+    async def 丢弃任务(self, 任务ID: str):
+        """任务删除：丢掉未落盘的日志并关闭句柄"""
+        self._收集队列()
+        self._取出(任务ID)
+        await self._线程写盘(任务ID, 关闭=True)
+
+    def _收集队列(self):
+        while True:
+            try:
+                任务ID, 内容 = self._队列.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            self._缓冲.setdefault(任务ID, []).append(内容)
+            self._缓冲字节数 += len(内容)
+
+    def _取出(self, 任务ID: Optional[str] = None) -> Dict[str, List[str]]:
+        """在事件循环内取出待写缓冲（含丢弃提示行），返回给线程写盘"""
+        任务ID列表 = list(set(self._缓冲) | set(self._丢弃行数)) if 任务ID is None else [任务ID]
+        结果: Dict[str, List[str]] = {}
+        for 当前ID in 任务ID列表:
+            行列表 = self._缓冲.pop(当前ID, None) or []
+            self._缓冲字节数 -= sum(len(行) for 行 in 行列表)
+            丢弃数 = self._丢弃行数.pop(当前ID, 0)
+            if 丢弃数:
+                行列表.append(f"[日志队列已满，丢弃 {丢弃数} 行]\n")
+            if 行列表:
+                结果[当前ID] = 行列表
+        return 结果
+
+    async def _刷新循环(self):
+        while True:
+            剩余时间 = self._刷新间隔 - (time.monotonic() - self._上次刷新时间)
+            try:
+                async with asyncio.timeout(max(0.0, 剩余时间)):
+                    任务ID, 内容 = await self._队列.get()
+                self._缓冲.setdefault(任务ID, []).append(内容)
+                self._缓冲字节数 += len(内容)
+            except TimeoutError:
+                pass
+            self._收集队列()
+
+            到时 = time.monotonic() - self._上次刷新时间 >= self._刷新间隔
+            if self._缓冲字节数 < self._刷新字节数 and not 到时:
+                continue
+            self._上次刷新时间 = time.monotonic()
+            if not self._缓冲 and not self._丢弃行数:
+                continue
+            try:
+                await self._线程写盘(None)
+            except OSError:
+                pass
+
+    async def _线程写盘(self, 任务ID: Optional[str], 关闭: bool = False, 关闭全部: bool = False):
+        async with self._写盘锁:
+            需关闭 = None if 关闭全部 else ([任务ID] if 关闭 and 任务ID else [])
+            写入 = asyncio.ensure_future(asyncio.to_thread(self._写盘, self._取出(任务ID), 需关闭))
+            try:
+                await asyncio.shield(写入)
+            except asyncio.CancelledError:
+                # 线程中的写入无法中断，等它结束后再释放写盘锁
+                await 写入
+                raise
+
+    def _写盘(self, 缓冲: Dict[str, List[str]], 需关闭: Optional[List[str]]):
+        """
+        在线程中执行：批量写入各任务的缓冲并按需关闭句柄（需关闭为 None 时关闭全部）
+        某个任务写盘出错（磁盘满、没有权限）只丢弃该任务这一批日志并计数，不影响其它任务，句柄照常关闭
+        """
+        try:
+            for 任务ID, 行列表 in 缓冲.items():
+                try:
+                    句柄 = self._句柄.get(任务ID)
+                    if 句柄 is None:
+                        路径 = self._路径解析(任务ID)
+                        路径.parent.mkdir(parents=True, exist_ok=True)
+                        句柄 = open(路径, "a", encoding="utf-8", errors="ignore", buffering=self._刷新字节数)
+                        self._句柄[任务ID] = 句柄
+                    句柄.write("".join(行列表))
+                    句柄.flush()
+                    self.已写入行数 += len(行列表)
+                except OSError:
+                    self.已丢弃行数 += len(行列表)
+                    self.写盘错误数 += 1
+                    # 出错的句柄可能处于不确定状态，下次写入时重新打开
+                    self._关闭句柄(任务ID)
+        finally:
+            for 任务ID in list(self._句柄) if 需关闭 is None else 需关闭:
+                self._关闭句柄(任务ID)
+
+    def _关闭句柄(self, 任务ID: str):
+        句柄 = self._句柄.pop(任务ID, None)
+        if 句柄 is not None:
+            try:
+                句柄.close()
+            except OSError:
+                pass
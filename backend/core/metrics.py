@@ -0,0 +1,145 @@
+"""
+运行指标
+轻量的直方图与 Prometheus 文本格式输出（不依赖 prometheus_client），
+以及事件循环延迟监测；各组件只做计数，/metrics 抓取时再统一汇总
+"""
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import math
+from typing import Iterable, List, Mapping, Optional, Sequence, Tuple
+
+# 秒级耗时的默认分桶
+默认分桶 = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class 直方图:
+    def __init__(self, 分桶: Sequence[float] = 默认分桶):
+        self.分桶 = tuple(sorted(float(上限) for 上限 in 分桶))
+        self._计数 = [0] * (len(self.分桶) + 1)
+        self.总和 = 0.0
+        self.次数 = 0
+
+    def 观测(self, 值: float):
+        self._计数[bisect.bisect_left(self.分桶, 值)] += 1
+        self.总和 += 值
+        self.次数 += 1
+
+    def 累计分桶(self) -> List[Tuple[float, int]]:
+        """[(上限, 小于等于该上限的累计次数)]，最后一项上限为 +Inf"""
+        结果 = []
+        累计 = 0
+        for 上限, 数量 in zip((*self.分桶, math.inf), self._计数):
+            累计 += 数量
+            结果.append((上限, 累计))
+        return 结果
+
+
+# 进程级指标：子进程启动耗时在下载器里记录，每个下载器实例共用
+子进程启动耗时 = 直方图()
+
+
+def _格式化数值(值: float) -> str:
+    if 值 == math.inf:
+        return "+Inf"
+    if 值 == -math.inf:
+        return "-Inf"
+    if isinstance(值, float) and 值.is_integer() and abs(值) < 1e15:
+        return str(int(值))
+    return repr(float(值)) if isinstance(值, float) else str(值)
+
+
+def _转义标签值(值: object) -> str:
+    return str(值).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _格式化标签(标签: Mapping[str, str]) -> str:
+    if not 标签:
+        return ""
+    return "{" + ",".join(f'{键}="{_转义标签值(值)}"' for 键, 值 in 标签.items()) + "}"
+
+
+class 指标文本:
+    """按 Prometheus 文本格式（0.0.4）拼接指标；同名指标族只输出一次 HELP/TYPE"""
+
+    内容类型 = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, 前缀: str = "m3u8_"):
+        self._前缀 = 前缀
+        self._行: List[str] = []
+        self._已声明: set[str] = set()
+
+    def _声明(self, 名称: str, 类型: str, 说明: str) -> str:
+        全名 = self._前缀 + 名称
+        if 全名 not in self._已声明:
+            self._已声明.add(全名)
+            self._行.append(f"# HELP {全名} {说明}")
+            self._行.append(f"# TYPE {全名} {类型}")
+        return 全名
+
+    def 仪表(self, 名称: str, 说明: str, 样本: Iterable[Tuple[Mapping[str, str], float]]):
+        全名 = self._声明(名称, "gauge", 说明)
+        for 标签, 值 in 样本:
+            self._行.append(f"{全名}{_格式化标签(标签)} {_格式化数值(值)}")
+
+    def 计数(self, 名称: str, 说明: str, 样本: Iterable[Tuple[Mapping[str, str], float]]):
+        """名称需以 _total 结尾"""
+        全名 = self._声明(名称, "counter", 说明)
+        for 标签, 值 in 样本:
+            self._行.append(f"{全名}{_格式化标签(标签)} {_格式化数值(值)}")
+
+    def 直方图(
+        self,
+        名称: str,
+        说明: str,
+        直方图对象: 直方图,
+        标签: Optional[Mapping[str, str]] = None,
+    ):
+        全名 = self._声明(名称, "histogram", 说明)
+        标签 = dict(标签 or {})
+        for 上限, 累计 in 直方图对象.累计分桶():
+            self._行.append(f"{全名}_bucket{_格式化标签({**标签, 'le': _格式化数值(上限)})} {累计}")
+        self._行.append(f"{全名}_sum{_格式化标签(标签)} {_格式化数值(直方图对象.总和)}")
+        self._行.append(f"{全名}_count{_格式化标签(标签)} {直方图对象.次数}")
+
+    def 原文(self, 文本: str):
+        """并入另一进程生成的指标文本（集群中非主进程转发主进程的指标）"""
+        for 行 in 文本.splitlines():
+            if 行.startswith("# TYPE "):
+                self._已声明.add(行.split()[2])
+            if 行:
+                self._行.append(行)
+
+    def 文本(self) -> str:
+        return "\n".join(self._行) + "\n"
+
+
+class 事件循环延迟监测:
+    """定时 sleep 并测量实际唤醒比预期晚了多少；持续偏大说明有同步代码阻塞了事件循环"""
+
+    def __init__(self, 间隔: float = 0.5):
+        self._间隔 = max(0.01, float(间隔))
+        self.直方图 = 直方图()
+        self.最近延迟 = 0.0
+        self._后台任务: Optional[asyncio.Task] = None
+
+    def 启动(self):
+        if self._后台任务 is None or self._后台任务.done():
+            self._后台任务 = asyncio.create_task(self._监测循环(), name="event-loop-lag")
+
+    async def 关闭(self):
+        任务 = self._后台任务
+        self._后台任务 = None
+        if 任务 and not 任务.done():
+            任务.cancel()
+            _ = await asyncio.gather(任务, return_exceptions=True)
+
+    async def _监测循环(self):
+        循环 = asyncio.get_running_loop()
+        while True:
+            开始 = 循环.time()
+            await asyncio.sleep(self._间隔)
+            self.最近延迟 = max(0.0, 循环.time() - 开始 - self._间隔)
+            self.直方图.观测(self.最近延迟)
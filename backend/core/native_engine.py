@@ -0,0 +1,524 @@
+"""
+原生 HLS 下载引擎
+纯 asyncio 实现：解析播放列表，通过共享的 HTTP 连接池并发拉取分片并直接写盘
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import shutil
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+import aiofiles
+import httpx
+
+from .bandwidth import 令牌桶
+from .config import Config
+from .segment_cache import 分片缓存, 获取共享缓存
+from .segment_ledger import 分片账本
+
+
+@dataclass
+class 媒体分片:
+    序号: int
+    链接: str
+    时长: float = 0.0
+
+
+@dataclass
+class 播放列表:
+    变体列表: List[Tuple[int, str]] = field(default_factory=list)
+    分片列表: List[媒体分片] = field(default_factory=list)
+    初始化分片: Optional[str] = None
+    加密方式: Optional[str] = None
+    # 分片是同一文件的字节区间（EXT-X-BYTERANGE）
+    字节范围: bool = False
+    # 出现了 EXT-X-ENDLIST；没有的是直播流，只能拿到当前窗口
+    已结束: bool = False
+
+    @property
+    def 是主播放列表(self) -> bool:
+        return bool(self.变体列表) and not self.分片列表
+
+
+def _解析属性(文本: str) -> Dict[str, str]:
+    结果: Dict[str, str] = {}
+    键 = ""
+    值 = ""
+    在引号中 = False
+    读键 = True
+    for 字符 in 文本:
+        if 读键:
+            if 字符 == "=":
+                读键 = False
+            elif 字符 != ",":
+                键 += 字符
+            continue
+        if 字符 == '"':
+            在引号中 = not 在引号中
+            continue
+        if 字符 == "," and not 在引号中:
+            结果[键.strip().upper()] = 值
+            键, 值, 读键 = "", "", True
+            continue
+        值 += 字符
+    if 键.strip():
+        结果[键.strip().upper()] = 值
+    return 结果
+
+
+def 解析播放列表(文本: str, 基础链接: str) -> 播放列表:
+    """解析 m3u8 文本；主播放列表返回变体列表，媒体播放列表返回分片列表"""
+    行列表 = [行.strip() for 行 in (文本 or "").splitlines()]
+    if not 行列表 or not 行列表[0].startswith("#EXTM3U"):
+        raise ValueError("不是有效的 m3u8 播放列表")
+
+    结果 = 播放列表()
+    待定带宽: Optional[int] = None
+    待定时长 = 0.0
+    for 行 in 行列表[1:]:
+        if not 行:
+            continue
+        if 行.startswith("#EXT-X-STREAM-INF:"):
+            属性 = _解析属性(行.split(":", 1)[1])
+            try:
+                待定带宽 = int(属性.get("BANDWIDTH", "0"))
+            except ValueError:
+                待定带宽 = 0
+            continue
+        if 行.startswith("#EXTINF:"):
+            try:
+                待定时长 = float(行.split(":", 1)[1].split(",", 1)[0])
+            except ValueError:
+                待定时长 = 0.0
+            continue
+        if 行.startswith("#EXT-X-KEY:"):
+            方式 = _解析属性(行.split(":", 1)[1]).get("METHOD", "NONE").upper()
+            if 方式 != "NONE":
+                结果.加密方式 = 方式
+            continue
+        if 行.startswith("#EXT-X-BYTERANGE"):
+            结果.字节范围 = True
+            continue
+        if 行.startswith("#EXT-X-ENDLIST"):
+            结果.已结束 = True
+            continue
+        if 行.startswith("#EXT-X-MAP:"):
+            地址 = _解析属性(行.split(":", 1)[1]).get("URI")
+            if 地址:
+                结果.初始化分片 = urljoin(基础链接, 地址)
+            continue
+        if 行.startswith("#"):
+            continue
+
+        绝对链接 = urljoin(基础链接, 行)
+        if 待定带宽 is not None:
+            结果.变体列表.append((待定带宽, 绝对链接))
+            待定带宽 = None
+        else:
+            结果.分片列表.append(媒体分片(序号=len(结果.分片列表), 链接=绝对链接, 时长=待定时长))
+            待定时长 = 0.0
+    return 结果
+
+
+def 格式化速度(字节每秒: float) -> str:
+    for 单位, 倍数 in (("GB", 1024 ** 3), ("MB", 1024 ** 2), ("KB", 1024)):
+        if 字节每秒 >= 倍数:
+            return f"{字节每秒 / 倍数:.2f} {单位}/s"
+    return f"{字节每秒:.0f} B/s"
+
+
+def 格式化时长(秒数: float) -> str:
+    秒数 = max(0, int(秒数))
+    return f"{秒数 // 3600:02d}:{秒数 % 3600 // 60:02d}:{秒数 % 60:02d}"
+
+
+def _解析请求头(请求头列表: Optional[List[str]]) -> Dict[str, str]:
+    结果: Dict[str, str] = {}
+    for 请求头 in 请求头列表 or []:
+        if ":" not in 请求头:
+            continue
+        键, 值 = 请求头.split(":", 1)
+        if 键.strip():
+            结果[键.strip()] = 值.strip()
+    return 结果
+
+
+# 共享连接池：同一事件循环内的所有原生下载任务复用一个 httpx 客户端
+_共享客户端: Optional[httpx.AsyncClient] = None
+_共享客户端循环: Optional[asyncio.AbstractEventLoop] = None
+
+
+def 获取共享客户端(配置: Config) -> httpx.AsyncClient:
+    global _共享客户端, _共享客户端循环
+    当前循环 = asyncio.get_running_loop()
+    if _共享客户端 is not None and _共享客户端循环 is 当前循环 and not _共享客户端.is_closed:
+        return _共享客户端
+
+    最大连接数 = max(1, int(配置.native_max_connections))
+    _共享客户端 = httpx.AsyncClient(
+        follow_redirects=True,
+        timeout=httpx.Timeout(float(配置.http_request_timeout)),
+        limits=httpx.Limits(max_connections=最大连接数, max_keepalive_connections=最大连接数),
+        proxy=配置.custom_proxy or None,
+        trust_env=bool(配置.use_system_proxy),
+    )
+    _共享客户端循环 = 当前循环
+    return _共享客户端
+
+
+async def 关闭共享客户端():
+    global _共享客户端, _共享客户端循环
+    客户端 = _共享客户端
+    _共享客户端 = None
+    _共享客户端循环 = None
+    if 客户端 is not None and not 客户端.is_closed:
+        try:
+            await 客户端.aclose()
+        except Exception:
+            pass
+
+
+class 原生HLS引擎:
+    """原生 HLS 引擎，每个下载任务一个实例，连接池在实例间共享"""
+
+    def __init__(
+        self, 配置: Config, 客户端: Optional[httpx.AsyncClient] = None, 缓存: Optional[分片缓存] = None
+    ):
+        self.配置 = 配置
+        self._客户端 = 客户端
+        self._缓存 = 缓存
+        self._执行任务: Optional[asyncio.Task] = None
+        self._已取消 = False
+        # 全局带宽预算分给本任务的令牌桶，速率可在下载过程中被调整
+        self._限速器: Optional[令牌桶] = None
+
+    async def 下载(
+        self,
+        链接: str,
+        保存名称: str,
+        保存目录: Path,
+        临时目录: Path,
+        线程数: Optional[int] = None,
+        自定义请求头: Optional[list] = None,
+        进度回调: Optional[Callable[[Dict[str, Any]], None]] = None,
+        日志回调: Optional[Callable[[str], None]] = None,
+        限速器: Optional[令牌桶] = None,
+        **其他参数,
+    ) -> bool:
+        self._已取消 = False
+        self._限速器 = 限速器
+        self._执行任务 = asyncio.ensure_future(
+            self._执行(链接, 保存名称, 保存目录, 临时目录, 线程数, 自定义请求头, 进度回调, 日志回调, 其他参数)
+        )
+        try:
+            return await self._执行任务
+        except asyncio.CancelledError:
+            当前任务 = asyncio.current_task()
+            if self._已取消 and not (当前任务 and 当前任务.cancelling()):
+                return False
+            raise
+        finally:
+            self._执行任务 = None
+
+    async def 取消(self):
+        """取消当前下载"""
+        self._已取消 = True
+        if self._执行任务 and not self._执行任务.done():
+            self._执行任务.cancel()
+
+    async def _执行(
+        self,
+        链接: str,
+        保存名称: str,
+        保存目录: Path,
+        临时目录: Path,
+        线程数: Optional[int],
+        自定义请求头: Optional[list],
+        进度回调: Optional[Callable[[Dict[str, Any]], None]],
+        日志回调: Optional[Callable[[str], None]],
+        其他参数: Dict[str, Any],
+    ) -> bool:
+        def 记录(消息: str):
+            if 日志回调:
+                日志回调(消息)
+
+        客户端 = self._客户端 or 获取共享客户端(self.配置)
+        请求头 = _解析请求头(自定义请求头 if 自定义请求头 is not None else self.配置.custom_headers)
+        重试次数 = int(其他参数.get("download_retry_count", self.配置.download_retry_count))
+
+        列表 = await self._获取播放列表(客户端, 链接, 请求头, 重试次数, 记录)
+        if 列表.加密方式:
+            记录(f"原生引擎暂不支持加密分片（METHOD={列表.加密方式}），请改用 external 引擎")
+            return False
+        if 列表.字节范围:
+            # 分片按链接下载和缓存，字节区间会被当成整个文件重复合并
+            记录("原生引擎暂不支持 EXT-X-BYTERANGE 分段的播放列表，请改用 external 引擎")
+            return False
+        if not 列表.已结束:
+            记录("播放列表没有 EXT-X-ENDLIST（直播流），原生引擎只下载点播流，请改用 external 引擎")
+            return False
+        if not 列表.分片列表:
+            记录("播放列表中没有分片")
+            return False
+
+        任务临时目录 = 临时目录 / 保存名称
+        任务临时目录.mkdir(parents=True, exist_ok=True)
+        分片总数 = len(列表.分片列表)
+        记录(f"共 {分片总数} 个分片，并发数 {线程数 or self.配置.thread_count}")
+
+        if 其他参数.get("skip_download", self.配置.skip_download):
+            return True
+
+        账本 = 分片账本(
+            任务临时目录,
+            分片账本.计算指纹([列表.初始化分片 or "", *(分片.链接 for 分片 in 列表.分片列表)]),
+        )
+        await asyncio.to_thread(账本.加载)
+        # 首次获取共享缓存时会扫描缓存目录，放到线程里
+        缓存 = self._缓存 or await asyncio.to_thread(获取共享缓存, self.配置)
+        try:
+            return await self._下载并合并(
+                客户端, 列表, 账本, 缓存, 保存名称, 保存目录, 任务临时目录, 线程数, 请求头, 重试次数, 进度回调, 记录, 其他参数
+            )
+        finally:
+            账本.关闭()
+
+    async def _下载并合并(
+        self,
+        客户端: httpx.AsyncClient,
+        列表: 播放列表,
+        账本: 分片账本,
+        缓存: Optional[分片缓存],
+        保存名称: str,
+        保存目录: Path,
+        任务临时目录: Path,
+        线程数: Optional[int],
+        请求头: Dict[str, str],
+        重试次数: int,
+        进度回调: Optional[Callable[[Dict[str, Any]], None]],
+        记录: Callable[[str], None],
+        其他参数: Dict[str, Any],
+    ) -> bool:
+        分片总数 = len(列表.分片列表)
+        待下载: asyncio.Queue[媒体分片] = asyncio.Queue()
+        for 分片 in 列表.分片列表:
+            if not 账本.已完成(_分片文件名(分片)):
+                待下载.put_nowait(分片)
+
+        已完成分片 = 分片总数 - 待下载.qsize()
+        统计 = _进度统计(分片总数, 已完成分片=已完成分片, 已下载字节=账本.已完成字节)
+
+        def 上报():
+            if 进度回调:
+                进度回调(统计.快照())
+
+        if 已完成分片:
+            记录(f"续传：跳过 {已完成分片} 个已完成的分片")
+            上报()
+
+        async def 获取分片(链接: str, 目标: Path):
+            """先查共享缓存，未命中再下载并放入缓存；完成后记入账本"""
+            命中 = await 缓存.异步取出到(链接, 目标) if 缓存 is not None else None
+            if 命中 is not None:
+                字节数, 摘要 = 命中
+                统计.缓存命中(字节数)
+            else:
+                字节数, 摘要 = await self._下载分片(客户端, 链接, 目标, 请求头, 重试次数, 统计)
+                if 缓存 is not None:
+                    统计.缓存未命中()
+                    await 缓存.异步放入(链接, 目标, 摘要, 字节数)
+            账本.记录(目标.name, 字节数, 摘要)
+
+        初始化文件: Optional[Path] = None
+        if 列表.初始化分片:
+            初始化文件 = 任务临时目录 / "init.mp4"
+            if not 账本.已完成(初始化文件.name):
+                await 获取分片(列表.初始化分片, 初始化文件)
+
+        async def 工作协程():
+            while True:
+                try:
+                    分片 = 待下载.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await 获取分片(分片.链接, 任务临时目录 / _分片文件名(分片))
+                统计.完成分片()
+                上报()
+
+        并发数 = max(1, int(线程数 or self.配置.thread_count))
+        try:
+            async with asyncio.TaskGroup() as 任务组:
+                for _ in range(min(并发数, 待下载.qsize())):
+                    任务组.create_task(工作协程())
+        except ExceptionGroup as 异常组:
+            记录(f"分片下载失败: {异常组.exceptions[0]}")
+            return False
+
+        if 其他参数.get("skip_merge", self.配置.skip_merge):
+            return True
+
+        扩展名 = ".mp4" if 初始化文件 else ".ts"
+        输出文件 = 保存目录 / f"{保存名称}{扩展名}"
+        分片文件列表 = ([初始化文件] if 初始化文件 else []) + [任务临时目录 / _分片文件名(分片) for 分片 in 列表.分片列表]
+        await asyncio.to_thread(_合并分片, 分片文件列表, 输出文件)
+        记录(f"已合并到 {输出文件}")
+
+        if 其他参数.get("del_after_done", self.配置.del_after_done):
+            # 账本文件也在临时目录里，先关闭再删除（Windows 下打开的文件无法删除）
+            账本.关闭()
+            await asyncio.to_thread(shutil.rmtree, 任务临时目录, True)
+        return True
+
+    async def _获取播放列表(
+        self,
+        客户端: httpx.AsyncClient,
+        链接: str,
+        请求头: Dict[str, str],
+        重试次数: int,
+        记录: Callable[[str], None],
+    ) -> 播放列表:
+        for _ in range(5):
+            响应 = await self._带重试请求(客户端, 链接, 请求头, 重试次数)
+            列表 = 解析播放列表(响应.text, str(响应.url))
+            if not 列表.是主播放列表:
+                return 列表
+            带宽, 链接 = max(列表.变体列表, key=lambda 项: 项[0])
+            记录(f"选择最高码率变体: {带宽} bps")
+        raise ValueError("主播放列表嵌套层级过深")
+
+    async def _带重试请求(
+        self, 客户端: httpx.AsyncClient, 链接: str, 请求头: Dict[str, str], 重试次数: int
+    ) -> httpx.Response:
+        for 第几次 in range(重试次数 + 1):
+            try:
+                响应 = await 客户端.get(链接, headers=请求头)
+                响应.raise_for_status()
+                return 响应
+            except httpx.HTTPError:
+                if 第几次 >= 重试次数:
+                    raise
+                await asyncio.sleep(min(2.0, 0.2 * (第几次 + 1)))
+        raise RuntimeError("unreachable")
+
+    async def _下载分片(
+        self,
+        客户端: httpx.AsyncClient,
+        链接: str,
+        目标: Path,
+        请求头: Dict[str, str],
+        重试次数: int,
+        统计: "_进度统计",
+    ) -> Tuple[int, str]:
+        """写完后改名为正式文件，返回 (字节数, SHA-256)"""
+        临时文件 = 目标.with_suffix(目标.suffix + ".part")
+        for 第几次 in range(重试次数 + 1):
+            已写字节 = 0
+            摘要 = hashlib.sha256()
+            try:
+                async with 客户端.stream("GET", 链接, headers=请求头) as 响应:
+                    响应.raise_for_status()
+                    async with aiofiles.open(临时文件, "wb") as f:
+                        async for 数据块 in 响应.aiter_bytes(65536):
+                            if self._限速器 is not None:
+                                await self._限速器.消耗(len(数据块))
+                            await f.write(数据块)
+                            摘要.update(数据块)
+                            已写字节 += len(数据块)
+                            统计.增加字节(len(数据块))
+                临时文件.replace(目标)
+                return 已写字节, 摘要.hexdigest()
+            except httpx.HTTPError:
+                统计.增加字节(-已写字节)
+                if 第几次 >= 重试次数:
+                    raise
+                await asyncio.sleep(min(2.0, 0.2 * (第几次 + 1)))
+
+
+def _分片文件名(分片: 媒体分片) -> str:
+    return f"{分片.序号:06d}.ts"
+
+
+def _合并分片(分片文件列表: List[Path], 输出文件: Path):
+    输出文件.parent.mkdir(parents=True, exist_ok=True)
+    临时输出 = 输出文件.with_suffix(输出文件.suffix + ".part")
+    with open(临时输出, "wb") as 输出:
+        for 分片文件 in 分片文件列表:
+            with open(分片文件, "rb") as 输入:
+                shutil.copyfileobj(输入, 输出, 1024 * 1024)
+    临时输出.replace(输出文件)
+
+
+class _进度统计:
+    """精确的分片/字节计数，速度按最近几秒的滑动窗口计算"""
+
+    窗口秒数 = 3.0
+
+    def __init__(self, 分片总数: int, 已完成分片: int = 0, 已下载字节: int = 0):
+        self.分片总数 = 分片总数
+        # 续传时从账本中已完成的部分起算；速度只统计本次从网络下载的字节，不含续传和缓存命中
+        self.已完成分片 = 已完成分片
+        self.已下载字节 = 已下载字节
+        self._网络字节 = 0
+        self.缓存命中数 = 0
+        self.缓存未命中数 = 0
+        self.缓存字节 = 0
+        self._开始时间 = time.monotonic()
+        self._采样: Deque[Tuple[float, int]] = deque()
+
+    def 增加字节(self, 字节数: int):
+        self.已下载字节 += 字节数
+        self._网络字节 += 字节数
+        现在 = time.monotonic()
+        self._采样.append((现在, self._网络字节))
+        while self._采样 and 现在 - self._采样[0][0] > self.窗口秒数:
+            self._采样.popleft()
+
+    def 缓存命中(self, 字节数: int):
+        self.缓存命中数 += 1
+        self.缓存字节 += 字节数
+        self.已下载字节 += 字节数
+
+    def 缓存未命中(self):
+        self.缓存未命中数 += 1
+
+    def 完成分片(self):
+        self.已完成分片 += 1
+
+    def 速度(self) -> float:
+        现在 = time.monotonic()
+        if len(self._采样) >= 2 and self._采样[-1][0] > self._采样[0][0]:
+            起点时间, 起点字节 = self._采样[0]
+            return max(0.0, (self._网络字节 - 起点字节) / max(1e-6, 现在 - 起点时间))
+        耗时 = 现在 - self._开始时间
+        return self._网络字节 / 耗时 if 耗时 > 0 else 0.0
+
+    def 快照(self) -> Dict[str, Any]:
+        速度 = self.速度()
+        百分比 = self.已完成分片 / self.分片总数 * 100.0 if self.分片总数 else 0.0
+        预计总字节: Optional[int] = None
+        剩余秒数: Optional[float] = None
+        if self.已完成分片:
+            预计总字节 = int(self.已下载字节 / self.已完成分片 * self.分片总数)
+            if 速度 > 0:
+                剩余秒数 = max(0, 预计总字节 - self.已下载字节) / 速度
+        return {
+            "percent": round(百分比, 2),
+            "speed": 格式化速度(速度),
+            "eta": 格式化时长(剩余秒数) if 剩余秒数 is not None else None,
+            "segments_done": self.已完成分片,
+            "segments_total": self.分片总数,
+            "bytes_done": self.已下载字节,
+            "bytes_total": self.已下载字节 if self.已完成分片 == self.分片总数 else 预计总字节,
+            "speed_bps": 速度,
+            "cache_hits": self.缓存命中数,
+            "cache_misses": self.缓存未命中数,
+            "cache_bytes": self.缓存字节,
+            "timestamp": time.time(),
+        }
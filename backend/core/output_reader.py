@@ -0,0 +1,132 @@
+"""
+子进程输出的分块读取
+N_m3u8DL-RE 的进度条用 \r 原地重绘，readline() 要等到 \n 才返回：进度要么到最后才一次性出现，
+要么攒成一个超长行触发 StreamReader 的长度上限。这里按块读取、同时按 \r 和 \n 切行，
+后台持续把管道读空（子进程不会因管道写满而阻塞），消费跟不上时连续的重绘只保留最新一条
+"""
+
+from __future__ import annotations
+
+import asyncio
+import re
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+_行分隔符 = re.compile(rb"\r\n|\r|\n")
+
+
+class 输出行读取器:
+    """
+    async for 行 in 输出行读取器(进程.stdout): ...
+
+    产出去掉分隔符的原始字节行（不含空行）。内存按任务封顶：
+    单行超过 行长度上限 的部分丢弃，待消费行超过 积压上限 时丢弃最旧的日志行
+    """
+
+    def __init__(
+        self,
+        流: asyncio.StreamReader,
+        块大小: int = 64 * 1024,
+        行长度上限: int = 16 * 1024,
+        积压上限: int = 256,
+    ):
+        self._流 = 流
+        self._块大小 = max(1, int(块大小))
+        self._行长度上限 = max(1, int(行长度上限))
+        # (行, 是否为 \r 结尾的重绘)
+        self._待消费: Deque[Tuple[bytes, bool]] = deque()
+        self._积压上限 = max(1, int(积压上限))
+        self._半行 = bytearray()
+        self._半行已截断 = False
+        # 块末尾的 \r 可能与下一块开头的 \n 组成 \r\n，留到下一块再判断
+        self._余留回车 = False
+        self._有数据 = asyncio.Event()
+        self._已结束 = False
+        self._异常: Optional[BaseException] = None
+        self._读取任务: Optional[asyncio.Task] = None
+        self.合并重绘数 = 0
+        self.丢弃行数 = 0
+        self.截断行数 = 0
+
+    def __aiter__(self) -> "输出行读取器":
+        if self._读取任务 is None:
+            self._读取任务 = asyncio.create_task(self._读取循环(), name="stdout-reader")
+        return self
+
+    async def __anext__(self) -> bytes:
+        while not self._待消费:
+            if self._已结束:
+                if self._异常 is not None:
+                    raise self._异常
+                raise StopAsyncIteration
+            self._有数据.clear()
+            await self._有数据.wait()
+        行, _ = self._待消费.popleft()
+        return 行
+
+    async def 关闭(self):
+        任务 = self._读取任务
+        if 任务 and not 任务.done():
+            任务.cancel()
+            _ = await asyncio.gather(任务, return_exceptions=True)
+
+    async def _读取循环(self):
+        try:
+            while True:
+                块 = await self._流.read(self._块大小)
+                if not 块:
+                    break
+                self._切分(块)
+            if self._余留回车:
+                self._余留回车 = False
+                self._结束一行(重绘=True)
+            if self._半行:
+                self._结束一行(重绘=False)
+        except asyncio.CancelledError:
+            raise
+        except Exception as 异常:
+            self._异常 = 异常
+        finally:
+            self._已结束 = True
+            self._有数据.set()
+
+    def _切分(self, 块: bytes):
+        if self._余留回车:
+            self._余留回车 = False
+            块 = b"\r" + 块
+        if 块.endswith(b"\r"):
+            self._余留回车 = True
+            块 = 块[:-1]
+        起点 = 0
+        for 匹配 in _行分隔符.finditer(块):
+            self._追加半行(块[起点:匹配.start()])
+            self._结束一行(重绘=匹配.group() == b"\r")
+            起点 = 匹配.end()
+        self._追加半行(块[起点:])
+
+    def _追加半行(self, 片段: bytes):
+        if not 片段 or self._半行已截断:
+            return
+        剩余 = self._行长度上限 - len(self._半行)
+        if len(片段) > 剩余:
+            片段 = 片段[:剩余]
+            self._半行已截断 = True
+            self.截断行数 += 1
+        self._半行 += 片段
+
+    def _结束一行(self, 重绘: bool):
+        行 = bytes(self._半行)
+        self._半行.clear()
+        self._半行已截断 = False
+        if not 行.strip():
+            return
+        if 重绘 and self._待消费 and self._待消费[-1][1]:
+            # 上一条重绘还没被取走，已经过时，直接替换
+            self._待消费[-1] = (行, True)
+            self.合并重绘数 += 1
+        else:
+            if len(self._待消费) >= self._积压上限:
+                _ = self._待消费.popleft()
+                self.丢弃行数 += 1
+            self._待消费.append((行, 重绘))
+        self._有数据.set()
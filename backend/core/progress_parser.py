@@ -0,0 +1,100 @@
+"""
+N_m3u8DL-RE 输出的解码与进度解析
+编码在每个子进程第一次出现非 ASCII 输出时判定一次，之后复用同一个增量解码器；
+进度行先用 "%" 预筛并定位，再用一条预编译的组合正则一次匹配出全部字段，字段与原生引擎的进度快照一致
+"""
+
+from __future__ import annotations
+
+import codecs
+import re
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+_字节单位倍率 = {"B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "TB": 1024 ** 4}
+
+# 进度字段在百分比前后依次排列（分片 百分比 大小 速度 ETA，大小未知时是 -/-），用一条模式一次匹配，
+# 从 "%" 前一小段开始搜索，不必在整行的每个位置都尝试
+_进度模式 = re.compile(
+    r"""
+    (?<![\d.])
+    (?:(?P<分片>\d+)/(?P<分片总数>\d+)\s+)?
+    (?P<百分比>\d+(?:\.\d+)?)%[\s|]*
+    (?:(?:(?P<已下载>\d+(?:\.\d+)?)\s*(?P<已下载单位>[KMGT]?B)\s*/\s*(?P<总大小>\d+(?:\.\d+)?)\s*(?P<总大小单位>[KMGT]?B)|-+/-+)[\s|]*)?
+    (?:(?P<速度>\d+(?:\.\d+)?)\s*(?P<速度单位>[KMG]?B)\s*(?:/s|ps)\b[\s|]*)?
+    (?:ETA[:\s]+)?(?P<eta>\d{2}:\d{2}:\d{2})?
+    """,
+    re.VERBOSE,
+)
+_百分比前最大长度 = 48
+
+
+class 输出解码器:
+    """
+    子进程输出的解码（每个子进程一个实例）
+    第一行非 ASCII 输出能按 UTF-8 解码就认定为 UTF-8，否则按 GBK（Windows 中文控制台）；
+    \\r、\\n 不会出现在 GBK/UTF-8 多字节字符中间，所以按行调用 decode(final=True) 与整流解码等价，
+    只有被长度上限截断的行末尾可能出现残缺字符，按 replace 处理
+    """
+
+    def __init__(self, 编码: Optional[str] = None):
+        self._编码: Optional[str] = None
+        self._解码器: Optional[codecs.IncrementalDecoder] = None
+        if 编码:
+            self._选定(编码)
+
+    @property
+    def 编码(self) -> Optional[str]:
+        """已判定的编码；还没见到非 ASCII 输出时为 None"""
+        return self._编码
+
+    def _选定(self, 编码: str):
+        self._编码 = codecs.lookup(编码).name
+        self._解码器 = codecs.getincrementaldecoder(self._编码)(errors="replace")
+
+    def 解码(self, 行: bytes) -> str:
+        if self._解码器 is None:
+            if 行.isascii():
+                return 行.decode("ascii")
+            try:
+                文本 = 行.decode("utf-8")
+            except UnicodeDecodeError:
+                self._选定("gbk")
+            else:
+                self._选定("utf-8")
+                return 文本
+        return self._解码器.decode(行, True)
+
+
+def 解析进度行(输出行: str) -> Optional[Dict[str, Any]]:
+    """
+    解析 N_m3u8DL-RE 输出的进度信息，不是进度行时返回 None
+
+    示例输出格式:
+    [12:34:56] 45.5% | 2.5 MB/s | ETA: 00:02:30
+    Vid 1280x720 | 0 Kbps ------------------------------ 523/739 70.77% 153.99MB/228.51MB 15.76MBps 00:00:03
+    """
+    位置 = 输出行.find("%")
+    if 位置 < 0:
+        return None
+    匹配 = _进度模式.search(输出行, max(0, 位置 - _百分比前最大长度))
+    if 匹配 is None:
+        return None
+
+    分片, 分片总数, 已下载, 速度, 速度单位 = 匹配.group("分片", "分片总数", "已下载", "速度", "速度单位")
+    if 已下载 is not None:
+        已下载字节 = int(float(已下载) * _字节单位倍率[匹配.group("已下载单位")])
+        总字节 = int(float(匹配.group("总大小")) * _字节单位倍率[匹配.group("总大小单位")])
+    else:
+        已下载字节 = 总字节 = None
+    return {
+        "percent": float(匹配.group("百分比")),
+        "speed": f"{速度} {速度单位}/s" if 速度 else None,
+        "speed_bps": float(速度) * _字节单位倍率[速度单位] if 速度 else None,
+        "eta": 匹配.group("eta"),
+        "segments_done": int(分片) if 分片 is not None else None,
+        "segments_total": int(分片总数) if 分片总数 is not None else None,
+        "bytes_done": 已下载字节,
+        "bytes_total": 总字节,
+        "timestamp": datetime.now().isoformat(),
+    }
@@ -0,0 +1,146 @@
+"""
+任务调度器
+按优先级发放下载名额：数值越大越先运行，同优先级按排队先后；并发上限可在运行时调整
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set
+
+from .metrics import 直方图
+
+
+class _排队项:
+    __slots__ = ("优先级", "序号", "任务ID", "名额")
+
+    def __init__(self, 优先级: int, 序号: int, 任务ID: str, 名额: asyncio.Future):
+        self.优先级 = 优先级
+        self.序号 = 序号
+        self.任务ID = 任务ID
+        self.名额 = 名额
+
+    def __lt__(self, 其他: "_排队项") -> bool:
+        return (-self.优先级, self.序号) < (-其他.优先级, 其他.序号)
+
+
+class 任务调度器:
+    def __init__(
+        self,
+        并发上限: int = 3,
+        排队变化回调: Optional[Callable[[List[str]], None]] = None,
+    ):
+        self._并发上限 = self._校验上限(并发上限)
+        self._排队变化回调 = 排队变化回调
+        self._堆: List[_排队项] = []
+        # 堆内的过期项（已取消或已调整优先级）惰性清理，以此表为准
+        self._排队: Dict[str, _排队项] = {}
+        self._运行中: Set[str] = set()
+        self._序号 = itertools.count()
+        # 从申请到拿到名额的等待时长（立即拿到记为 0）
+        self.等待直方图 = 直方图()
+
+    @staticmethod
+    def _校验上限(并发上限: int) -> int:
+        并发上限 = int(并发上限)
+        if 并发上限 < 1:
+            raise ValueError("并发上限必须大于等于 1")
+        return 并发上限
+
+    @property
+    def 并发上限(self) -> int:
+        return self._并发上限
+
+    @property
+    def 运行数(self) -> int:
+        return len(self._运行中)
+
+    @property
+    def 排队数(self) -> int:
+        return len(self._排队)
+
+    def 排队顺序(self) -> List[str]:
+        return [项.任务ID for 项 in sorted(self._排队.values())]
+
+    def 排队位置(self, 任务ID: str) -> Optional[int]:
+        """从 1 开始的排队位置；未在排队返回 None"""
+        项 = self._排队.get(任务ID)
+        if 项 is None:
+            return None
+        return 1 + sum(1 for 其他 in self._排队.values() if 其他 < 项)
+
+    def 设置并发上限(self, 并发上限: int):
+        """调大立即放行排队任务；调小不打断已在运行的任务，只是暂不再发放名额"""
+        self._并发上限 = self._校验上限(并发上限)
+        self._发放()
+
+    def 设置优先级(self, 任务ID: str, 优先级: int):
+        项 = self._排队.get(任务ID)
+        if 项 is None:
+            return
+        # 保留原排队序号，调整后在新优先级内仍按最初排队先后
+        新项 = _排队项(int(优先级), 项.序号, 任务ID, 项.名额)
+        self._排队[任务ID] = 新项
+        heapq.heappush(self._堆, 新项)
+        self._通知排队变化()
+
+    async def 获取(self, 任务ID: str, 优先级: int = 0):
+        if not self._排队 and len(self._运行中) < self._并发上限:
+            self._运行中.add(任务ID)
+            self.等待直方图.观测(0.0)
+            return
+
+        开始 = time.perf_counter()
+        名额 = asyncio.get_running_loop().create_future()
+        项 = _排队项(int(优先级), next(self._序号), 任务ID, 名额)
+        self._排队[任务ID] = 项
+        heapq.heappush(self._堆, 项)
+        self._通知排队变化()
+        try:
+            await 名额
+            self.等待直方图.观测(time.perf_counter() - 开始)
+        except asyncio.CancelledError:
+            if 名额.done() and not 名额.cancelled():
+                # 名额已发放但等待方被取消，归还名额
+                self.释放(任务ID)
+            elif self._排队.get(任务ID) is not None and self._排队[任务ID].名额 is 名额:
+                del self._排队[任务ID]
+                self._通知排队变化()
+            raise
+
+    def 释放(self, 任务ID: str):
+        self._运行中.discard(任务ID)
+        self._发放()
+
+    @asynccontextmanager
+    async def 占用(self, 任务ID: str, 优先级: int = 0) -> AsyncIterator[None]:
+        await self.获取(任务ID, 优先级)
+        try:
+            yield
+        finally:
+            self.释放(任务ID)
+
+    def _发放(self):
+        已变化 = False
+        while self._堆 and len(self._运行中) < self._并发上限:
+            项 = heapq.heappop(self._堆)
+            if self._排队.get(项.任务ID) is not 项:
+                continue
+            del self._排队[项.任务ID]
+            已变化 = True
+            if 项.名额.done():
+                continue
+            self._运行中.add(项.任务ID)
+            项.名额.set_result(None)
+        if not self._排队:
+            self._堆.clear()
+        if 已变化:
+            self._通知排队变化()
+
+    def _通知排队变化(self):
+        if self._排队变化回调 is not None:
+            self._排队变化回调(self.排队顺序())
@@ -0,0 +1,195 @@
+"""
+内容寻址的分片缓存
+所有原生引擎任务共用：分片内容按 SHA-256 存放，规范化链接指向内容摘要，
+不同链接下载到相同内容只存一份；总大小超过预算时按最近最少使用淘汰
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from .config import Config
+from .urls import 规范化链接
+
+
+class 分片缓存:
+    def __init__(self, 目录: Path, 容量字节: int):
+        self._目录 = Path(目录)
+        self._对象目录 = self._目录 / "objects"
+        self._链接目录 = self._目录 / "urls"
+        self._容量字节 = max(0, int(容量字节))
+        # 内容摘要 -> 字节数，按最近使用排序（末尾最新）
+        self._对象: "OrderedDict[str, int]" = OrderedDict()
+        self._已用字节 = 0
+        # 查询/写入在线程池里执行，多个事件循环也可能共用同一实例
+        self._锁 = threading.Lock()
+        self.命中数 = 0
+        self.未命中数 = 0
+        self.命中字节 = 0
+        self.写入字节 = 0
+        self.淘汰数 = 0
+        self._扫描()
+
+    @property
+    def 容量字节(self) -> int:
+        return self._容量字节
+
+    @staticmethod
+    def _链接键(链接: str) -> str:
+        return hashlib.sha256(规范化链接(链接).encode("utf-8")).hexdigest()
+
+    def _对象路径(self, 摘要: str) -> Path:
+        return self._对象目录 / 摘要[:2] / 摘要
+
+    def _链接路径(self, 链接: str) -> Path:
+        键 = self._链接键(链接)
+        return self._链接目录 / 键[:2] / 键
+
+    def _扫描(self):
+        """启动时按修改时间恢复 LRU 顺序（命中时会更新对象文件的修改时间）"""
+        self._对象目录.mkdir(parents=True, exist_ok=True)
+        self._链接目录.mkdir(parents=True, exist_ok=True)
+        对象列表 = []
+        for 路径 in self._对象目录.glob("*/*"):
+            if "." in 路径.name:
+                # 上次写入中途退出留下的临时文件
+                路径.unlink(missing_ok=True)
+                continue
+            try:
+                信息 = 路径.stat()
+            except OSError:
+                continue
+            对象列表.append((信息.st_mtime, 路径.name, 信息.st_size))
+        for _, 摘要, 字节数 in sorted(对象列表):
+            self._对象[摘要] = 字节数
+            self._已用字节 += 字节数
+        self._淘汰()
+
+    def 取出到(self, 链接: str, 目标: Path) -> Optional[Tuple[int, str]]:
+        """
+        命中时把分片放到 目标（优先硬链接，失败则复制），返回 (字节数, 摘要)；未命中返回 None
+        硬链接是安全的：引擎只通过改名替换分片文件，不会原地改写
+        """
+        链接路径 = self._链接路径(链接)
+        try:
+            摘要 = 链接路径.read_text(encoding="ascii").strip()
+        except (OSError, UnicodeDecodeError):
+            摘要 = ""
+        with self._锁:
+            字节数 = self._对象.get(摘要) if 摘要 else None
+            if 字节数 is None:
+                self.未命中数 += 1
+                return None
+            self._对象.move_to_end(摘要)
+        对象路径 = self._对象路径(摘要)
+        临时文件 = 目标.with_suffix(目标.suffix + ".part")
+        try:
+            临时文件.unlink(missing_ok=True)
+            try:
+                os.link(对象路径, 临时文件)
+            except OSError:
+                shutil.copyfile(对象路径, 临时文件)
+            临时文件.replace(目标)
+            os.utime(对象路径)
+        except OSError:
+            # 对象已被其它进程删除或损坏，当作未命中
+            with self._锁:
+                if self._对象.pop(摘要, None) is not None:
+                    self._已用字节 -= 字节数
+                self.未命中数 += 1
+            return None
+        with self._锁:
+            self.命中数 += 1
+            self.命中字节 += 字节数
+        return 字节数, 摘要
+
+    def 放入(self, 链接: str, 文件: Path, 摘要: str, 字节数: int):
+        """分片下载并改名完成后调用；内容已存在时只更新链接指向"""
+        if self._容量字节 <= 0 or 字节数 > self._容量字节:
+            return
+        对象路径 = self._对象路径(摘要)
+        with self._锁:
+            已存在 = 摘要 in self._对象
+        if not 已存在:
+            对象路径.parent.mkdir(parents=True, exist_ok=True)
+            临时对象 = 对象路径.with_name(f"{摘要}.{threading.get_ident()}.part")
+            try:
+                # 复制而不是硬链接：任务目录里的文件不受缓存控制，不能让它的改动影响缓存内容
+                shutil.copyfile(文件, 临时对象)
+                临时对象.replace(对象路径)
+            except OSError:
+                临时对象.unlink(missing_ok=True)
+                return
+        链接路径 = self._链接路径(链接)
+        链接路径.parent.mkdir(parents=True, exist_ok=True)
+        链接路径.write_text(摘要, encoding="ascii")
+        with self._锁:
+            if 摘要 not in self._对象:
+                self._对象[摘要] = int(字节数)
+                self._已用字节 += int(字节数)
+                self.写入字节 += int(字节数)
+            self._对象.move_to_end(摘要)
+            self._淘汰()
+
+    def _淘汰(self):
+        """调用方持有 _锁（或在构造中）；链接指向被淘汰的对象时在下次查询时视为未命中"""
+        while self._对象 and self._已用字节 > self._容量字节:
+            摘要, 字节数 = self._对象.popitem(last=False)
+            self._已用字节 -= 字节数
+            self.淘汰数 += 1
+            try:
+                self._对象路径(摘要).unlink()
+            except OSError:
+                pass
+
+    def 统计(self) -> Dict[str, Any]:
+        with self._锁:
+            查询数 = self.命中数 + self.未命中数
+            return {
+                "enabled": True,
+                "capacity_bytes": self._容量字节,
+                "size_bytes": self._已用字节,
+                "entries": len(self._对象),
+                "hits": self.命中数,
+                "misses": self.未命中数,
+                "hit_rate": round(self.命中数 / 查询数, 4) if 查询数 else None,
+                "bytes_served": self.命中字节,
+                "bytes_stored": self.写入字节,
+                "evictions": self.淘汰数,
+            }
+
+    async def 异步取出到(self, 链接: str, 目标: Path) -> Optional[Tuple[int, str]]:
+        return await asyncio.to_thread(self.取出到, 链接, 目标)
+
+    async def 异步放入(self, 链接: str, 文件: Path, 摘要: str, 字节数: int):
+        await asyncio.to_thread(self.放入, 链接, 文件, 摘要, 字节数)
+
+
+# 进程内共享：同一缓存目录与容量只创建一个实例
+_共享缓存: Optional[分片缓存] = None
+_共享缓存锁 = threading.Lock()
+
+
+def 获取共享缓存(配置: Config) -> Optional[分片缓存]:
+    """容量为 0 时不启用缓存，返回 None"""
+    global _共享缓存
+    容量字节 = int(配置.segment_cache_max_mb) * 1024 * 1024
+    if 容量字节 <= 0:
+        return None
+    目录 = Path(配置.segment_cache_dir)
+    with _共享缓存锁:
+        if _共享缓存 is None or _共享缓存._目录 != 目录 or _共享缓存.容量字节 != 容量字节:
+            _共享缓存 = 分片缓存(目录, 容量字节)
+        return _共享缓存
+
+
+def 共享缓存统计() -> Dict[str, Any]:
+    缓存 = _共享缓存
+    return 缓存.统计() if 缓存 is not None else {"enabled": False}
@@ -0,0 +1,118 @@
+"""
+分片完成账本
+原生引擎在任务临时目录里逐行追加已完整写盘的分片（文件名、字节数、SHA-256），
+暂停后重新开始时跳过这些分片，进度从真实完成比例起算
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+from typing import IO, Dict, Iterable, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+class 分片账本:
+    文件名 = "segments.ledger"
+    版本 = 1
+
+    def __init__(self, 目录: Path, 指纹: str):
+        self._目录 = Path(目录)
+        self._路径 = self._目录 / self.文件名
+        self._指纹 = 指纹
+        # 文件名 -> (字节数, SHA-256)
+        self._记录: Dict[str, Tuple[int, str]] = {}
+        self._文件: Optional[IO[str]] = None
+
+    @staticmethod
+    def 计算指纹(链接列表: Iterable[str]) -> str:
+        """按分片路径计算播放列表指纹；忽略查询参数，签名链接每次刷新不会使账本失效"""
+        摘要 = hashlib.sha256()
+        for 链接 in 链接列表:
+            摘要.update(urlsplit(链接).path.encode("utf-8", errors="ignore"))
+            摘要.update(b"\n")
+        return 摘要.hexdigest()
+
+    @property
+    def 已完成数(self) -> int:
+        return len(self._记录)
+
+    @property
+    def 已完成字节(self) -> int:
+        return sum(字节数 for 字节数, _ in self._记录.values())
+
+    def 已完成(self, 名称: str) -> bool:
+        return 名称 in self._记录
+
+    def 摘要(self, 名称: str) -> Optional[str]:
+        项 = self._记录.get(名称)
+        return 项[1] if 项 else None
+
+    def 加载(self):
+        """
+        读取已有账本并校验：指纹不同（换了流）时整体作废，文件缺失、大小或 SHA-256 不符的条目被丢弃
+        （写了一半或内容损坏的分片重新下载；每次续传只校验一遍，在线程中执行）
+        之后把保留的条目紧凑地重写一遍（顺带去掉崩溃时写了一半的末行），再以追加方式打开
+        """
+        self._目录.mkdir(parents=True, exist_ok=True)
+        self._记录 = {}
+        if self._路径.exists():
+            with open(self._路径, "r", encoding="utf-8", errors="ignore") as f:
+                行列表 = f.read().splitlines()
+            头 = self._解析行(行列表[0]) if 行列表 else None
+            if 头 and 头.get("version") == self.版本 and 头.get("fingerprint") == self._指纹:
+                for 行 in 行列表[1:]:
+                    项 = self._解析行(行)
+                    if not 项 or "name" not in 项:
+                        continue
+                    try:
+                        self._记录[str(项["name"])] = (int(项["size"]), str(项["sha256"]))
+                    except (KeyError, TypeError, ValueError):
+                        continue
+        for 名称, (字节数, 摘要) in list(self._记录.items()):
+            文件 = self._目录 / 名称
+            if not 文件.is_file() or 文件.stat().st_size != 字节数 or self._计算摘要(文件) != 摘要:
+                del self._记录[名称]
+
+        临时路径 = self._路径.with_suffix(".tmp")
+        with open(临时路径, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"version": self.版本, "fingerprint": self._指纹}) + "\n")
+            for 名称, (字节数, 摘要) in self._记录.items():
+                f.write(self._编码记录(名称, 字节数, 摘要))
+        临时路径.replace(self._路径)
+        self._文件 = open(self._路径, "a", encoding="utf-8")
+
+    def 记录(self, 名称: str, 字节数: int, 摘要: str):
+        """分片已经改名为正式文件后调用；一行一条，写完即 flush，进程被杀最多丢最后一条"""
+        self._记录[名称] = (int(字节数), 摘要)
+        if self._文件 is not None:
+            self._文件.write(self._编码记录(名称, 字节数, 摘要))
+            self._文件.flush()
+
+    def 关闭(self):
+        if self._文件 is not None:
+            try:
+                self._文件.close()
+            finally:
+                self._文件 = None
+
+    @staticmethod
+    def _计算摘要(文件: Path) -> str:
+        摘要 = hashlib.sha256()
+        with open(文件, "rb") as f:
+            for 数据块 in iter(lambda: f.read(1024 * 1024), b""):
+                摘要.update(数据块)
+        return 摘要.hexdigest()
+
+    @staticmethod
+    def _编码记录(名称: str, 字节数: int, 摘要: str) -> str:
+        return json.dumps({"name": 名称, "size": int(字节数), "sha256": 摘要}) + "\n"
+
+    @staticmethod
+    def _解析行(行: str) -> Optional[dict]:
+        try:
+            值 = json.loads(行)
+        except ValueError:
+            return None
+        return 值 if isinstance(值, dict) else None
@@ -1,26 +1,69 @@
 from __future__ import annotations
 
 import asyncio
-import json
+import bisect
 import os
 import re
+import time
 import uuid
+from collections import OrderedDict, deque
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Callable, Deque, Dict, List, Optional, Any, get_args
 import shutil
 import stat
 
-import aiofiles
-
 from backend.core.downloader import M3U8下载器
+from backend.core.native_engine import 关闭共享客户端, 格式化时长, 格式化速度
 from backend.core.config import get_config
-from backend.models.task import Task
+from backend.models.task import Task, TaskStatus
 from .event_bus import 事件总线
+from .locks import 任务锁表, 计时锁, 锁统计
+from .bandwidth import 带宽预算, 格式化限速参数, 解析速率
+from .concurrency_controller import 自适应并发控制器
+from .log_writer import 任务日志写入器
+from .metrics import 事件循环延迟监测, 子进程启动耗时, 直方图, 指标文本
+from .scheduler import 任务调度器
+from .segment_cache import 共享缓存统计
+from .task_store import JSON任务存储, 任务存储
+from .telemetry import 任务遥测
+from .urls import 规范化链接
+from .watchdog import 卡死看门狗
+from .worker_coordinator import 租约协调器, 远程下载器
+
+
+class 批量校验错误(ValueError):
+    """批量操作整批被拒绝，错误列表中每项带条目序号（index）与原因（error）"""
+
+    def __init__(self, 错误列表: List[Dict[str, Any]]):
+        super().__init__(f"{len(错误列表)} 个条目校验失败")
+        self.错误列表 = 错误列表
 
 
 class 任务管理器:
-    def __init__(self, 最大并发数: int = 3):
+    def __init__(
+        self,
+        最大并发数: int = 3,
+        进度刷新频率: float = 4.0,
+        最大落盘频率: float = 2.0,
+        存储: Optional[任务存储] = None,
+        日志队列上限: int = 10000,
+        事件回放容量: int = 1000,
+        自适应并发: bool = False,
+        自适应最大并发: int = 8,
+        自适应最大线程数: int = 64,
+        自适应调整间隔: float = 15.0,
+        带宽上限: Optional[str] = None,
+        工作节点模式: str = "local",
+        租约秒数: float = 30.0,
+        租约最大尝试次数: int = 3,
+        遥测采样间隔: float = 1.0,
+        遥测容量: int = 3600,
+        卡死无输出超时: float = 0.0,
+        卡死无进展超时: float = 0.0,
+        卡死处理: str = "requeue",
+        卡死最大重排次数: int = 2,
+    ):
         后端目录 = Path(__file__).resolve().parent.parent
 
         数据根目录 = 后端目录 / "var"
@@ -29,15 +72,91 @@ class 任务管理器:
         self._任务文件路径 = self._数据根目录 / "tasks.json"
         self._任务文件路径.parent.mkdir(parents=True, exist_ok=True)
 
-        self._锁 = asyncio.Lock()
-        self._并发信号量 = asyncio.Semaphore(最大并发数)
-        self._事件总线 = 事件总线()
+        # 全局锁只保护跨任务的约束（保存名称唯一、任务表增删）；单个任务的状态变化持有该任务自己的锁
+        # 只读查询与不含 await 的同步片段在事件循环内天然原子，不再加锁
+        self._锁 = 计时锁(锁统计("global"))
+        self._任务锁 = 任务锁表()
+        self._调度器 = 任务调度器(并发上限=最大并发数, 排队变化回调=self._更新排队位置)
+        self._排队中任务ID: set[str] = set()
+        # 全局限速按优先级分给运行中的任务，Task.speed_limit 反映各任务当前实际限速
+        self._带宽预算 = 带宽预算(解析速率(带宽上限), 并发上限=self._调度器.并发上限)
+        self._限速任务ID: set[str] = set()
+        # 份额变化后按新的 -R 重启外部进程的取消协程
+        self._限速调整任务: set[asyncio.Task] = set()
+        # 各运行中任务最近一次上报的速度（字节/秒），供自适应控制器采样总吞吐
+        self._任务速度: Dict[str, float] = {}
+        # 各任务的分片缓存命中情况（原生引擎随进度上报，累计值）
+        self._任务缓存统计: Dict[str, Dict[str, int]] = {}
+        # 各任务的数值采样（速度、百分比、分片、已下载字节）与 EWMA 推算的 ETA；
+        # 结束的任务只保留最近 _已结束遥测上限 个，用于事后对比
+        self._遥测采样间隔 = float(遥测采样间隔)
+        self._遥测容量 = int(遥测容量)
+        self._任务遥测: Dict[str, 任务遥测] = {}
+        self._已结束遥测: "OrderedDict[str, 任务遥测]" = OrderedDict()
+        self._已结束遥测上限 = 200
+        self._自适应控制器: Optional[自适应并发控制器] = None
+        if 自适应并发:
+            self._自适应控制器 = 自适应并发控制器(
+                self._调度器,
+                self.当前总吞吐,
+                初始线程数=get_config().thread_count,
+                最大并发=自适应最大并发,
+                最大线程数=自适应最大线程数,
+                调整间隔=自适应调整间隔,
+            )
+        # remote 模式下拿到名额的任务交给工作节点执行，调度、限速分配与状态管理仍在本机
+        self._协调器: Optional[租约协调器] = 租约协调器(租约秒数, 租约最大尝试次数) if 工作节点模式 == "remote" else None
+        self._事件总线 = 事件总线(回放容量=事件回放容量)
+        self._事件总线.设置快照提供者(self._事件快照)
 
         self._任务表: Dict[str, Task] = {}
+        # 修订号：任何任务变化都加一，用作列表 ETag 与 since 增量查询的基准
+        # 以启动时的毫秒时间戳起算，重启后客户端手里的旧修订号一定小于新的起点
+        self._修订号 = int(time.time() * 1000)
+        self._初始修订号 = self._修订号
+        self._任务修订: Dict[str, int] = {}
+        self._删除记录: Deque[tuple[int, str]] = deque(maxlen=10000)
+        self._删除记录截断修订 = 0
+        # 任务变化（含删除）时以 (任务ID, 修订号) 回调，集群主进程据此把变更同步给其它 API 进程
+        self._变更回调: List[Callable[[str, int], None]] = []
+        # 按 (创建时间, ID) 排序的任务 ID，任务增删时失效
+        self._有序缓存: Optional[tuple[List[tuple[float, str]], List[str]]] = None
+
+        # 二级索引随每次增删和状态变化维护：保存名称 -> ID、状态 -> ID 集合、规范化链接 -> ID 集合
+        self._名称索引: Dict[str, str] = {}
+        self._状态索引: Dict[str, set[str]] = {状态: set() for 状态 in get_args(TaskStatus)}
+        self._链接索引: Dict[str, set[str]] = {}
         self._运行中任务: Dict[str, asyncio.Task] = {}
         self._运行中下载器: Dict[str, M3U8下载器] = {}
         self._停止原因: Dict[str, str] = {}
-        self._上次落盘时间: Dict[str, float] = {}
+
+        # 占用名额却长时间没有输出/进展的任务由看门狗停止，按 卡死处理 重新排队（最多 卡死最大重排次数 次）或直接失败
+        self._看门狗 = 卡死看门狗(self._处理卡死, 卡死无输出超时, 卡死无进展超时)
+        self._卡死处理 = 卡死处理 if 卡死处理 in {"requeue", "fail"} else "requeue"
+        self._卡死最大重排次数 = max(0, int(卡死最大重排次数))
+        self._卡死原因: Dict[str, str] = {}
+        self._卡死重排次数: Dict[str, int] = {}
+
+        # 后台落盘：状态变更只打脏标记，由落盘协程合并写入，每秒最多 最大落盘频率 次
+        self._落盘间隔 = 1.0 / max(0.1, float(最大落盘频率))
+        self._待落盘 = asyncio.Event()
+        self._落盘锁 = asyncio.Lock()
+        self._落盘任务: Optional[asyncio.Task] = None
+        # 未指定存储时在初始化阶段使用 _任务文件路径 创建 JSON 存储
+        self._存储 = 存储
+        self._脏任务ID: set[str] = set()
+        self._已删除任务ID: set[str] = set()
+        self._落盘耗时 = 直方图()
+        self._事件循环监测 = 事件循环延迟监测()
+
+        # 路径解析在写入时调用，保证替换 _获取任务日志路径 后依然生效
+        self._日志写入器 = 任务日志写入器(lambda 任务ID: self._获取任务日志路径(任务ID), 队列上限=日志队列上限)
+
+        # 每个任务只保留最新一条进度，由单个刷新协程按固定频率批量应用
+        self._进度刷新间隔 = 1.0 / max(0.1, float(进度刷新频率))
+        self._最新进度: Dict[str, Dict[str, Any]] = {}
+        self._进度待刷新 = asyncio.Event()
+        self._进度刷新任务: Optional[asyncio.Task] = None
 
     @property
     def 事件总线(self) -> 事件总线:
@@ -45,27 +164,32 @@ class 任务管理器:
 
     async def 初始化(self):
         await self._加载任务文件()
-        async with self._锁:
-            需要保存 = False
-            for 任务 in self._任务表.values():
-                if 任务.status == "running":
-                    任务.status = "paused"
-                    if not 任务.error:
-                        任务.error = "服务已重启，任务已暂停"
-                    需要保存 = True
-            if 需要保存:
-                await self._保存任务文件(需持锁=True)
+        self._启动进度刷新()
+        self._启动落盘()
+        self._日志写入器.启动()
+        self._事件循环监测.启动()
+        if self._协调器 is not None:
+            self._协调器.启动()
+        if self._自适应控制器 is not None:
+            self._自适应控制器.启动()
+        self._看门狗.启动()
+        for 任务 in self._任务表.values():
+            if 任务.status == "running":
+                self._设置状态(任务, "paused")
+                if not 任务.error:
+                    任务.error = "服务已重启，任务已暂停"
+                self._标记待保存(任务.id)
 
     async def 关闭(self):
-        async with self._锁:
-            运行中任务ID列表 = [任务ID for 任务ID, 任务 in self._任务表.items() if 任务.status == "running"]
-            for 任务ID in 运行中任务ID列表:
-                self._停止原因[任务ID] = "shutdown"
-            下载器列表 = [(任务ID, self._运行中下载器.get(任务ID)) for 任务ID in 运行中任务ID列表]
-            协程任务列表 = [(任务ID, self._运行中任务.get(任务ID)) for 任务ID in 运行中任务ID列表]
+        await self._看门狗.关闭()
+        运行中任务ID列表 = [任务ID for 任务ID, 任务 in self._任务表.items() if 任务.status == "running"]
+        for 任务ID in 运行中任务ID列表:
+            self._停止原因[任务ID] = "shutdown"
+        下载器列表 = [(任务ID, self._运行中下载器.get(任务ID)) for 任务ID in 运行中任务ID列表]
+        协程任务列表 = [(任务ID, self._运行中任务.get(任务ID)) for 任务ID in 运行中任务ID列表]
 
         for 任务ID in 运行中任务ID列表:
-            await self._追加任务日志(任务ID, "=== 服务关闭，任务被强制停止 ===")
+            self._追加任务日志(任务ID, "=== 服务关闭，任务被强制停止 ===")
 
         取消任务列表: List[asyncio.Task] = []
         for _, 下载器 in 下载器列表:
@@ -87,31 +211,233 @@ class 任务管理器:
             except Exception:
                 pass
 
-        async with self._锁:
-            需要保存 = False
-            for 任务ID in 运行中任务ID列表:
-                任务 = self._任务表.get(任务ID)
-                if not 任务:
-                    continue
-                if 任务.status == "running":
-                    任务.status = "paused"
-                    任务.error = "服务关闭，任务已暂停"
-                    需要保存 = True
-            if 需要保存:
-                await self._保存任务文件(需持锁=True)
+        for 任务ID in 运行中任务ID列表:
+            任务 = self._任务表.get(任务ID)
+            if 任务 and 任务.status == "running":
+                self._设置状态(任务, "paused")
+                任务.error = "服务关闭，任务已暂停"
+                self._标记待保存(任务ID)
+
+        if self._自适应控制器 is not None:
+            await self._自适应控制器.关闭()
+        await self._事件循环监测.关闭()
+        if self._协调器 is not None:
+            await self._协调器.关闭()
+        await self._停止进度刷新()
+        await self._停止落盘()
+        await self._日志写入器.关闭()
+        if self._存储 is not None:
+            await asyncio.to_thread(self._存储.关闭)
+        await 关闭共享客户端()
+
+    def _事件快照(self, 任务ID: Optional[str] = None) -> Dict[str, Any]:
+        """SSE 断线过久时补发的紧凑快照，只包含列表页需要的字段"""
+        if 任务ID:
+            任务列表 = [self._任务表[任务ID]] if 任务ID in self._任务表 else []
+        else:
+            任务列表 = list(self._任务表.values())
+        return {
+            "tasks": [
+                {
+                    "id": 任务.id,
+                    "status": 任务.status,
+                    "progress": 任务.progress,
+                    "speed": 任务.speed,
+                    "eta": 任务.eta,
+                    "error": 任务.error,
+                }
+                for 任务 in 任务列表
+            ]
+        }
 
     async def 列出任务(self) -> List[Task]:
-        async with self._锁:
-            return list(self._任务表.values())
+        return list(self._任务表.values())
 
-    async def 获取任务(self, 任务ID: str) -> Task:
-        async with self._锁:
+    def 统计(self) -> Dict[str, Any]:
+        """任务总数与各状态数量，直接读索引，不遍历任务表"""
+        return {
+            "tasks": len(self._任务表),
+            "by_status": {状态: len(任务ID集合) for 状态, 任务ID集合 in self._状态索引.items()},
+        }
+
+    @property
+    def 协调器(self) -> Optional[租约协调器]:
+        """remote 模式下的工作节点租约协调器；local 模式为 None"""
+        return self._协调器
+
+    def 订阅变更(self, 回调: Callable[[str, int], None]):
+        self._变更回调.append(回调)
+
+    def 复制快照(self) -> Dict[str, Any]:
+        """完整任务表与修订号，集群中其它进程连接时据此建立副本"""
+        return {
+            "revision": self._修订号,
+            "initial_revision": self._初始修订号,
+            "tasks": [任务.model_dump(mode="json") for 任务 in self._任务表.values()],
+            "revisions": dict(self._任务修订),
+            "last_event_id": self._事件总线.最新事件ID,
+        }
+
+    def 复制变更(self, 变更: Dict[str, int]) -> Dict[str, Any]:
+        """变更为 任务ID -> 修订号；已不在任务表中的按删除处理"""
+        任务列表, 已删除 = [], []
+        for 任务ID, 修订 in 变更.items():
             任务 = self._任务表.get(任务ID)
-            if not 任务:
-                raise KeyError("任务不存在")
-            return 任务
+            if 任务 is None:
+                已删除.append([修订, 任务ID])
+            else:
+                任务列表.append(任务.model_dump(mode="json"))
+        return {
+            "revision": self._修订号,
+            "tasks": 任务列表,
+            "revisions": {任务["id"]: self._任务修订.get(任务["id"], 0) for 任务 in 任务列表},
+            "deleted": 已删除,
+        }
+
+    def 复制状态(self) -> Dict[str, Any]:
+        """只在主进程内可得的运行状态，定期推送给集群中的其它进程"""
+        指标 = 指标文本()
+        self.导出指标(指标)
+        return {
+            "scheduler": self.调度器状态(),
+            "adaptive": self.自适应状态(),
+            "locks": self.锁统计(),
+            "cache": self.缓存统计(),
+            "workers_enabled": self._协调器 is not None,
+            "metrics": 指标.文本(),
+        }
+
+    def 锁统计(self) -> Dict[str, Any]:
+        """全局锁与任务级锁（所有任务合计）的等待/持有时长"""
+        return {"global": self._锁.统计.快照(), "task": self._任务锁.统计.快照()}
+
+    @property
+    def 修订号(self) -> int:
+        return self._修订号
+
+    async def 查询任务(
+        self,
+        状态: Optional[List[str]] = None,
+        创建起: Optional[datetime] = None,
+        创建止: Optional[datetime] = None,
+        游标: Optional[tuple[float, str]] = None,
+        数量: Optional[int] = None,
+        since: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        按 (创建时间, ID) 排序的过滤/分页查询
+        游标为上一页最后一项的 (创建时间戳, ID)；since 为修订号时只返回之后变化的任务与已删除的 ID，
+        since 早于本次启动或删除记录已被截断时 full 为 True，调用方应按全量处理
+        """
+        键列表, 任务ID列表 = self._有序任务ID()
+        起点 = bisect.bisect_right(键列表, 游标) if 游标 is not None else 0
+        候选 = set().union(*(self._状态索引.get(值, set()) for 值 in 状态)) if 状态 else None
+        全量 = since is not None and (since < self._初始修订号 or since < self._删除记录截断修订 or since > self._修订号)
+
+        结果: List[Task] = []
+        下一游标: Optional[tuple[float, str]] = None
+        起始时间戳 = 创建起.timestamp() if 创建起 else None
+        截止时间戳 = 创建止.timestamp() if 创建止 else None
+        for 序号 in range(起点, len(任务ID列表)):
+            任务ID = 任务ID列表[序号]
+            if 候选 is not None and 任务ID not in 候选:
+                continue
+            时间戳 = 键列表[序号][0]
+            if 起始时间戳 is not None and 时间戳 < 起始时间戳:
+                continue
+            if 截止时间戳 is not None and 时间戳 >= 截止时间戳:
+                continue
+            if since is not None and not 全量 and self._任务修订.get(任务ID, 0) <= since:
+                continue
+            if 数量 is not None and len(结果) == 数量:
+                # 后面还有匹配项才给出下一页游标（上一页最后一项的排序键）
+                下一游标 = (结果[-1].created_at.timestamp(), 结果[-1].id)
+                break
+            结果.append(self._任务表[任务ID])
+        已删除 = (
+            [任务ID for 修订, 任务ID in self._删除记录 if 修订 > since]
+            if since is not None and not 全量
+            else []
+        )
+        return {
+            "items": 结果,
+            "next_cursor": 下一游标,
+            "deleted": 已删除,
+            "full": 全量,
+            "revision": self._修订号,
+        }
+
+    def _有序任务ID(self) -> tuple[List[tuple[float, str]], List[str]]:
+        if self._有序缓存 is None:
+            键列表 = sorted((任务.created_at.timestamp(), 任务.id) for 任务 in self._任务表.values())
+            self._有序缓存 = (键列表, [任务ID for _, 任务ID in 键列表])
+        return self._有序缓存
+
+    async def 按状态列出任务(self, 状态: str) -> List[Task]:
+        return [self._任务表[任务ID] for 任务ID in self._状态索引.get(状态, ())]
+
+    async def 按链接查找任务(self, 链接: str) -> List[Task]:
+        """按规范化后的链接查找（忽略协议/主机大小写、默认端口、片段和查询参数顺序）"""
+        return [self._任务表[任务ID] for 任务ID in self._链接索引.get(规范化链接(链接), ())]
+
+    def _加入任务(self, 任务: Task):
+        self._任务表[任务.id] = 任务
+        self._任务修订[任务.id] = self._修订号
+        self._有序缓存 = None
+        self._名称索引[任务.name] = 任务.id
+        self._状态索引[任务.status].add(任务.id)
+        self._链接索引.setdefault(规范化链接(任务.url), set()).add(任务.id)
+        self._任务锁.创建(任务.id)
+
+    def _移除任务(self, 任务ID: str):
+        任务 = self._任务表.pop(任务ID)
+        self._有序缓存 = None
+        if self._名称索引.get(任务.name) == 任务ID:
+            del self._名称索引[任务.name]
+        self._状态索引[任务.status].discard(任务ID)
+        链接键 = 规范化链接(任务.url)
+        同链接 = self._链接索引.get(链接键)
+        if 同链接 is not None:
+            同链接.discard(任务ID)
+            if not 同链接:
+                del self._链接索引[链接键]
+        self._任务锁.移除(任务ID)
+        self._任务缓存统计.pop(任务ID, None)
+        self._任务遥测.pop(任务ID, None)
+        self._已结束遥测.pop(任务ID, None)
+        self._卡死重排次数.pop(任务ID, None)
+
+    def _设置状态(self, 任务: Task, 状态: str):
+        """所有状态变化都经过这里，保证状态索引与任务一致"""
+        if 任务.status == 状态:
+            return
+        self._状态索引[任务.status].discard(任务.id)
+        任务.status = 状态
+        self._状态索引[状态].add(任务.id)
+
+    def _重建索引(self):
+        任务列表 = list(self._任务表.values())
+        self._任务表 = {}
+        self._名称索引 = {}
+        self._状态索引 = {状态: set() for 状态 in get_args(TaskStatus)}
+        self._链接索引 = {}
+        self._任务锁.清空()
+        for 任务 in 任务列表:
+            self._加入任务(任务)
+
+    async def 获取任务(self, 任务ID: str) -> Task:
+        任务 = self._任务表.get(任务ID)
+        if not 任务:
+            raise KeyError("任务不存在")
+        return 任务
 
-    async def 创建任务(self, 链接: str, 保存名称: str) -> Task:
+    def _取任务锁(self, 任务ID: str) -> 计时锁:
+        锁 = self._任务锁.get(任务ID)
+        if 锁 is None:
+            raise KeyError("任务不存在")
+        return 锁
+
+    async def 创建任务(self, 链接: str, 保存名称: str, 优先级: int = 0) -> Task:
         保存名称 = (保存名称 or "").strip()
         self._检查保存名称(保存名称)
         现在 = datetime.now(timezone.utc)
@@ -127,18 +453,18 @@ class 任务管理器:
             started_at=None,
             completed_at=None,
             error=None,
+            priority=优先级,
         )
         async with self._锁:
-            for 已有任务 in self._任务表.values():
-                if 已有任务.name == 保存名称:
-                    raise ValueError("保存名称已存在，请换一个名称")
-            self._任务表[任务.id] = 任务
-            await self._保存任务文件(需持锁=True)
+            if 保存名称 in self._名称索引:
+                raise ValueError("保存名称已存在，请换一个名称")
+            self._加入任务(任务)
+            self._标记待保存(任务.id)
         await self._事件总线.发布("task.created", {"task": 任务.model_dump(mode="json")})
         return 任务
 
     async def 删除任务(self, 任务ID: str):
-        async with self._锁:
+        async with self._取任务锁(任务ID):
             任务 = self._任务表.get(任务ID)
             if not 任务:
                 raise KeyError("任务不存在")
@@ -151,33 +477,36 @@ class 任务管理器:
         await self._删除任务日志(任务ID)
         async with self._锁:
             if 任务ID in self._任务表:
-                del self._任务表[任务ID]
-                await self._保存任务文件(需持锁=True)
+                self._移除任务(任务ID)
+                self._标记已删除(任务ID)
 
     async def 开始任务(self, 任务ID: str) -> Task:
-        async with self._锁:
-            任务 = self._任务表.get(任务ID)
-            if not 任务:
+        async with self._取任务锁(任务ID):
+            if 任务ID not in self._任务表:
                 raise KeyError("任务不存在")
-            if 任务.status == "completed":
-                return 任务
-            任务.status = "running"
-            任务.error = None
-            if not 任务.started_at:
-                任务.started_at = datetime.now(timezone.utc)
-            await self._保存任务文件(需持锁=True)
+            return self._开始(任务ID)
 
-            if 任务ID not in self._运行中任务 or self._运行中任务[任务ID].done():
-                self._停止原因.pop(任务ID, None)
-                协程任务 = asyncio.create_task(self._运行下载任务(任务ID), name=f"download:{任务ID}")
-                self._运行中任务[任务ID] = 协程任务
-            else:
-                return 任务
-
-        return await self.获取任务(任务ID)
+    def _开始(self, 任务ID: str) -> Task:
+        """调用方持有该任务的锁；已完成的任务不变，已在运行的任务不会重复启动"""
+        任务 = self._任务表[任务ID]
+        if 任务.status == "completed":
+            return 任务
+        self._设置状态(任务, "running")
+        任务.error = None
+        if not 任务.started_at:
+            任务.started_at = datetime.now(timezone.utc)
+        self._标记待保存(任务.id)
+
+        if 任务ID not in self._运行中任务 or self._运行中任务[任务ID].done():
+            self._停止原因.pop(任务ID, None)
+            self._卡死重排次数.pop(任务ID, None)
+            协程任务 = asyncio.create_task(self._运行下载任务(任务ID), name=f"download:{任务ID}")
+            self._运行中任务[任务ID] = 协程任务
+        return 任务
 
     async def 暂停任务(self, 任务ID: str) -> Task:
-        async with self._锁:
+        任务锁 = self._取任务锁(任务ID)
+        async with 任务锁:
             任务 = self._任务表.get(任务ID)
             if not 任务:
                 raise KeyError("任务不存在")
@@ -192,177 +521,695 @@ class 任务管理器:
         if 运行任务 and not 运行任务.done():
             运行任务.cancel()
 
-        async with self._锁:
+        async with 任务锁:
             任务 = self._任务表.get(任务ID)
             if 任务:
-                任务.status = "paused"
-                await self._保存任务文件(需持锁=True)
+                self._设置状态(任务, "paused")
+                self._标记待保存(任务.id)
         return await self.获取任务(任务ID)
 
+    def 调度器状态(self) -> Dict[str, Any]:
+        总速率 = self._带宽预算.总速率
+        return {
+            "max_concurrency": self._调度器.并发上限,
+            "running": self._调度器.运行数,
+            "queued": self._调度器.排队顺序(),
+            "bandwidth_limit": 格式化速度(总速率) if 总速率 is not None else None,
+            "bandwidth_limit_bps": 总速率,
+            "watchdog": self._看门狗.状态(),
+        }
+
+    def 设置带宽上限(self, 带宽上限: Optional[str]) -> Dict[str, Any]:
+        """运行时调整全局限速（空串表示不限速）；外部进程按新份额重启"""
+        self._带宽预算.设置总速率(解析速率(带宽上限))
+        self._同步限速()
+        return self.调度器状态()
+
+    def _同步限速(self):
+        各任务限速 = self._带宽预算.各任务限速()
+        for 任务ID in self._限速任务ID - set(各任务限速):
+            任务 = self._任务表.get(任务ID)
+            if 任务:
+                任务.speed_limit = None
+                self._记录修改(任务ID)
+        for 任务ID, 速率 in 各任务限速.items():
+            任务 = self._任务表.get(任务ID)
+            新限速 = 格式化速度(速率) if 速率 is not None else None
+            if 任务 and 任务.speed_limit != 新限速:
+                任务.speed_limit = 新限速
+                self._记录修改(任务ID)
+        self._限速任务ID = set(各任务限速)
+        self._调整外部限速()
+
+    def _同步带宽名额(self):
+        self._带宽预算.设置调度状态(self._调度器.并发上限, self._调度器.排队数)
+
+    def _调整外部限速(self):
+        """
+        外部进程的 -R 只能在启动时指定：份额偏离目标时停止进程，由 _运行下载任务 在同一名额内按新份额重启
+        N_m3u8DL-RE 会跳过临时目录里已下载的分片，重启只重新获取播放列表；合并阶段（100%）不再打断
+        """
+        for 任务ID in self._带宽预算.待调整外部任务():
+            任务 = self._任务表.get(任务ID)
+            下载器 = self._运行中下载器.get(任务ID)
+            if not 任务 or 下载器 is None or 任务ID in self._停止原因 or 任务.progress >= 100.0:
+                continue
+            self._停止原因[任务ID] = "rebalance"
+            调整 = asyncio.create_task(下载器.取消(), name=f"rebalance:{任务ID}")
+            self._限速调整任务.add(调整)
+            调整.add_done_callback(self._限速调整任务.discard)
+
+    def 当前总吞吐(self) -> float:
+        return sum(self._任务速度.values())
+
+    def 导出指标(self, 输出: 指标文本):
+        """抓取时汇总各组件的计数，写成 Prometheus 文本格式"""
+        输出.仪表("tasks", "各状态的任务数", [({"status": 状态}, len(集合)) for 状态, 集合 in self._状态索引.items()])
+        输出.仪表("scheduler_running", "占用下载名额的任务数", [({}, self._调度器.运行数)])
+        输出.仪表("scheduler_queued", "排队等待下载名额的任务数", [({}, self._调度器.排队数)])
+        输出.仪表("scheduler_max_concurrency", "同时下载的任务数上限", [({}, self._调度器.并发上限)])
+        输出.直方图("scheduler_wait_seconds", "任务等待下载名额的时长", self._调度器.等待直方图)
+        输出.计数("stalled_tasks_total", "看门狗判定卡死并强制停止的任务数", [({}, self._看门狗.卡死次数)])
+        输出.仪表("download_bytes_per_second", "所有运行中任务的总下载速度", [({}, self.当前总吞吐())])
+        输出.仪表(
+            "task_download_bytes_per_second",
+            "各运行中任务最近上报的下载速度",
+            [({"task_id": 任务ID}, 速度) for 任务ID, 速度 in sorted(self._任务速度.items())],
+        )
+        for 名称, 统计 in (("global", self._锁.统计), ("task", self._任务锁.统计)):
+            输出.直方图("lock_wait_seconds", "获取任务管理器锁的等待时长", 统计.等待直方图, {"lock": 名称})
+        输出.计数(
+            "events_published_total",
+            "事件总线发布的事件数",
+            [({"event": 类型}, 数量) for 类型, 数量 in sorted(self._事件总线.发布计数.items())],
+        )
+        输出.仪表("sse_subscribers", "当前 SSE 订阅者数", [({}, self._事件总线.订阅者数量)])
+        输出.计数("sse_dropped_events_total", "订阅者积压超限被丢弃的日志事件数", [({}, self._事件总线.丢弃总数())])
+        输出.直方图("store_commit_seconds", "任务存储每次提交（写 tasks.json 或 SQLite）的耗时", self._落盘耗时)
+        输出.计数("log_lines_total", "写入任务日志文件的行数", [({}, self._日志写入器.已写入行数)])
+        输出.计数("log_lines_dropped_total", "日志队列已满或写盘出错被丢弃的行数", [({}, self._日志写入器.已丢弃行数)])
+        输出.计数("log_write_errors_total", "写任务日志文件出错的次数", [({}, self._日志写入器.写盘错误数)])
+        输出.直方图("subprocess_spawn_seconds", "启动 N_m3u8DL-RE 子进程的耗时", 子进程启动耗时)
+        输出.直方图("event_loop_lag_seconds", "事件循环定时唤醒的延迟", self._事件循环监测.直方图)
+        缓存 = 共享缓存统计()
+        if 缓存.get("enabled"):
+            输出.计数("segment_cache_hits_total", "分片缓存命中次数", [({}, 缓存["hits"])])
+            输出.计数("segment_cache_misses_total", "分片缓存未命中次数", [({}, 缓存["misses"])])
+            输出.计数("segment_cache_evictions_total", "分片缓存淘汰的对象数", [({}, 缓存["evictions"])])
+            输出.仪表("segment_cache_size_bytes", "分片缓存当前占用", [({}, 缓存["size_bytes"])])
+
+    def 缓存统计(self) -> Dict[str, Any]:
+        """全局分片缓存状态与各任务的命中率"""
+        各任务 = {}
+        for 任务ID, 项 in self._任务缓存统计.items():
+            查询数 = 项["hits"] + 项["misses"]
+            各任务[任务ID] = {**项, "hit_rate": round(项["hits"] / 查询数, 4) if 查询数 else None}
+        return {"global": 共享缓存统计(), "tasks": 各任务}
+
+    def 自适应状态(self) -> Dict[str, Any]:
+        if self._自适应控制器 is None:
+            return {"enabled": False}
+        return self._自适应控制器.状态()
+
+    async def 更新调度设置(
+        self, 并发上限: Optional[int] = None, 带宽上限: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """PUT /api/scheduler：参数为 None 的项不修改；带宽上限不合法时抛出 ValueError"""
+        if 带宽上限 is not None:
+            self.设置带宽上限(带宽上限)
+        if 并发上限 is not None:
+            self.设置并发上限(并发上限)
+        return self.调度器状态()
+
+    def 设置并发上限(self, 并发上限: int) -> Dict[str, Any]:
+        """运行时调整同时下载的任务数，不写回配置文件"""
+        self._调度器.设置并发上限(并发上限)
+        self._同步带宽名额()
+        self._同步限速()
+        return self.调度器状态()
+
+    async def 设置任务优先级(self, 任务ID: str, 优先级: int) -> Task:
+        async with self._取任务锁(任务ID):
+            任务 = self._任务表.get(任务ID)
+            if not 任务:
+                raise KeyError("任务不存在")
+            任务.priority = int(优先级)
+            self._标记待保存(任务ID)
+            self._调度器.设置优先级(任务ID, 任务.priority)
+            self._带宽预算.设置优先级(任务ID, 任务.priority)
+            self._同步限速()
+            return 任务
+
+    def _更新排队位置(self, 排队顺序: List[str]):
+        """调度器排队变化时同步各任务的 queue_position（仅内存状态，不触发落盘）"""
+        新排队 = set(排队顺序)
+        for 任务ID in self._排队中任务ID - 新排队:
+            任务 = self._任务表.get(任务ID)
+            if 任务:
+                任务.queue_position = None
+                self._记录修改(任务ID)
+        for 位置, 任务ID in enumerate(排队顺序, start=1):
+            任务 = self._任务表.get(任务ID)
+            if 任务 and 任务.queue_position != 位置:
+                任务.queue_position = 位置
+                self._记录修改(任务ID)
+        self._排队中任务ID = 新排队
+        # 排队任务会占用空闲名额，为其预留带宽，避免拿到名额时挤占已在运行的外部进程
+        self._同步带宽名额()
+        self._同步限速()
+
+    async def 批量创建任务(self, 条目列表: List[tuple[str, str, int]]) -> List[Task]:
+        """
+        先校验全部条目（链接、保存名称、与已有任务及本批内部的重名），任一不合法则一个都不创建
+        全部合法时在一次加锁内创建，只发布一条 task.created 批量事件
+        """
+        错误列表: List[Dict[str, Any]] = []
+        本批名称: set[str] = set()
+        待创建: List[tuple[int, str, str, int]] = []
+        for 序号, (链接, 保存名称, 优先级) in enumerate(条目列表):
+            保存名称 = (保存名称 or "").strip()
+            try:
+                self._检查保存名称(保存名称)
+                if 保存名称 in 本批名称:
+                    raise ValueError("保存名称在本批中重复")
+            except ValueError as 异常:
+                错误列表.append({"index": 序号, "error": str(异常)})
+                continue
+            本批名称.add(保存名称)
+            待创建.append((序号, 链接, 保存名称, int(优先级)))
+        if 错误列表:
+            raise 批量校验错误(错误列表)
+
+        现在 = datetime.now(timezone.utc)
+        async with self._锁:
+            错误列表 = [
+                {"index": 序号, "error": "保存名称已存在，请换一个名称"}
+                for 序号, _, 保存名称, _ in 待创建
+                if 保存名称 in self._名称索引
+            ]
+            if 错误列表:
+                raise 批量校验错误(错误列表)
+            结果 = []
+            for _, 链接, 保存名称, 优先级 in 待创建:
+                任务 = Task(id=str(uuid.uuid4()), url=链接, name=保存名称, created_at=现在, priority=优先级)
+                self._加入任务(任务)
+                self._标记待保存(任务.id)
+                结果.append(任务)
+        if 结果:
+            await self._事件总线.发布("task.created", {"tasks": [任务.model_dump(mode="json") for 任务 in 结果]})
+        return 结果
+
+    def _检查批量任务ID(self, 任务ID列表: List[str]) -> List[str]:
+        """返回去重后的 ID 列表，有不存在的任务时整批拒绝"""
+        错误列表 = [
+            {"index": 序号, "id": 任务ID, "error": "任务不存在"}
+            for 序号, 任务ID in enumerate(任务ID列表)
+            if 任务ID not in self._任务表
+        ]
+        if 错误列表:
+            raise 批量校验错误(错误列表)
+        return list(dict.fromkeys(任务ID列表))
+
+    async def 批量开始任务(self, 任务ID列表: List[str]) -> List[Task]:
+        任务ID列表 = self._检查批量任务ID(任务ID列表)
+        async with self._任务锁.多个(任务ID列表) as 已加锁:
+            已加锁 = set(已加锁)
+            结果 = [self._开始(任务ID) for 任务ID in 任务ID列表 if 任务ID in 已加锁]
+        await self._事件总线.发布("task.batch", {"action": "start", "task_ids": 任务ID列表})
+        return 结果
+
+    async def 批量暂停任务(self, 任务ID列表: List[str]) -> List[Task]:
+        任务ID列表 = self._检查批量任务ID(任务ID列表)
+        async with self._任务锁.多个(任务ID列表) as 已加锁:
+            待停止 = [任务ID for 任务ID in 已加锁 if self._任务表[任务ID].status == "running"]
+            for 任务ID in 待停止:
+                self._停止原因[任务ID] = "paused"
+            停止目标 = [(self._运行中下载器.get(任务ID), self._运行中任务.get(任务ID)) for 任务ID in 待停止]
+
+        await self._停止下载(停止目标)
+
+        async with self._任务锁.多个(待停止) as 已加锁:
+            for 任务ID in 已加锁:
+                self._设置状态(self._任务表[任务ID], "paused")
+                self._标记待保存(任务ID)
+        结果 = [self._任务表[任务ID] for 任务ID in 任务ID列表 if 任务ID in self._任务表]
+        await self._事件总线.发布("task.batch", {"action": "pause", "task_ids": 任务ID列表})
+        return 结果
+
+    async def 批量删除任务(self, 任务ID列表: List[str]) -> int:
+        任务ID列表 = self._检查批量任务ID(任务ID列表)
+        async with self._任务锁.多个(任务ID列表) as 已加锁:
+            待清理名称 = [self._任务表[任务ID].name for 任务ID in 已加锁 if self._任务表[任务ID].status != "completed"]
+            待停止 = [任务ID for 任务ID in 已加锁 if self._任务表[任务ID].status in ("running", "pending", "paused")]
+            for 任务ID in 待停止:
+                self._停止原因[任务ID] = "deleting"
+            停止目标 = [(self._运行中下载器.get(任务ID), self._运行中任务.get(任务ID)) for 任务ID in 待停止]
+
+        await self._停止下载(停止目标)
+        _ = await asyncio.gather(
+            *(self._清理临时目录(保存名称) for 保存名称 in 待清理名称),
+            *(self._删除任务日志(任务ID) for 任务ID in 任务ID列表),
+            return_exceptions=True,
+        )
+
+        async with self._锁:
+            for 任务ID in 任务ID列表:
+                if 任务ID in self._任务表:
+                    self._移除任务(任务ID)
+                    self._标记已删除(任务ID)
+        await self._事件总线.发布("task.batch", {"action": "delete", "task_ids": 任务ID列表})
+        return len(任务ID列表)
+
+    async def _停止下载(self, 停止目标: List[tuple[Optional[M3U8下载器], Optional[asyncio.Task]]]):
+        """并发取消多个下载（下载器先取消，再取消协程）"""
+        取消列表 = [下载器.取消() for 下载器, _ in 停止目标 if 下载器]
+        if 取消列表:
+            _ = await asyncio.gather(*取消列表, return_exceptions=True)
+        for _, 运行任务 in 停止目标:
+            if 运行任务 and not 运行任务.done():
+                运行任务.cancel()
+
     async def _运行下载任务(self, 任务ID: str):
-        async with self._并发信号量:
+        任务 = self._任务表.get(任务ID)
+        任务锁 = self._任务锁.get(任务ID)
+        if not 任务 or 任务锁 is None:
+            return
+        async with self._调度器.占用(任务ID, 任务.priority):
             下载器 = None
             try:
-                下载器 = M3U8下载器()
+                下载器 = self._创建下载器(任务ID)
             except Exception as 异常:
-                async with self._锁:
+                async with 任务锁:
                     任务 = self._任务表.get(任务ID)
-                    if 任务 and 任务.status == "running":
-                        任务.status = "failed"
-                        任务.error = str(异常)
-                        await self._保存任务文件(需持锁=True)
-                        await self._事件总线.发布("task.failed", {"task": 任务.model_dump(mode="json")})
+                    if not 任务 or 任务.status != "running":
+                        return
+                    self._设置状态(任务, "failed")
+                    任务.error = str(异常)
+                    self._标记待保存(任务.id)
+                await self._事件总线.发布("task.failed", {"task": 任务.model_dump(mode="json")})
                 return
 
-            async with self._锁:
-                self._运行中下载器[任务ID] = 下载器
+            self._运行中下载器[任务ID] = 下载器
 
-            loop = asyncio.get_running_loop()
-
-            def 进度回调(进度: Dict[str, Any]):
-                loop.create_task(self._更新任务进度(任务ID, 进度))
+            进度回调 = self._创建进度回调(任务ID)
 
             ansi样式 = re.compile(r"\x1b\[[0-9;]*m")
 
             def 日志回调(消息: str):
+                self._看门狗.记录输出(任务ID)
                 清理后 = ansi样式.sub("", str(消息 or "")).strip()
                 if not 清理后:
                     return
                 if 清理后.startswith("命令:"):
                     return
-                loop.create_task(self._追加任务日志(任务ID, 清理后))
-                loop.create_task(
-                    self._事件总线.发布(
-                        "task.log",
-                        {"task_id": 任务ID, "line": 清理后, "ts": datetime.now(timezone.utc).isoformat()},
-                    )
+                self._追加任务日志(任务ID, 清理后)
+                self._事件总线.立即发布(
+                    "task.log",
+                    {"task_id": 任务ID, "line": 清理后, "ts": datetime.now(timezone.utc).isoformat()},
                 )
 
             try:
-                async with self._锁:
+                async with 任务锁:
                     任务 = self._任务表.get(任务ID)
                     if not 任务 or 任务.status != "running":
                         return
                     链接 = 任务.url
                     保存名称 = 任务.name
-
-                await self._追加任务日志(任务ID, f"=== 开始下载 {保存名称} ===")
-                成功 = await 下载器.下载(
-                    链接=链接,
-                    保存名称=保存名称,
-                    进度回调=进度回调,
-                    日志回调=日志回调,
-                )
-                await self._追加任务日志(任务ID, f"=== 结束下载 {保存名称}（{'成功' if 成功 else '失败'}） ===")
-
-                async with self._锁:
+                    优先级 = 任务.priority
+
+                self._同步带宽名额()
+                重启 = False
+                while True:
+                    下载参数: Dict[str, Any] = {}
+                    if getattr(下载器, "引擎", "external") == "native":
+                        下载参数["限速器"] = self._带宽预算.注册原生任务(任务ID, 优先级)
+                    else:
+                        份额 = self._带宽预算.注册外部任务(任务ID, 优先级)
+                        while 份额 == 0:
+                            # 预算已被其它外部进程分完：让超出目标的进程按新份额重启后再申请；等待期间不按卡死计时
+                            self._看门狗.结束跟踪(任务ID)
+                            self._同步限速()
+                            await self._带宽预算.等待份额释放()
+                            份额 = self._带宽预算.注册外部任务(任务ID, 优先级)
+                        if 份额 is not None:
+                            下载参数["max_speed"] = 格式化限速参数(份额)
+                    self._同步限速()
+                    if getattr(下载器, "引擎", "external") != "remote":
+                        # 分到份额、即将启动下载时才开始计时；remote 模式在工作节点租到作业时开始，见 _远程租用变化
+                        self._看门狗.开始跟踪(任务ID)
+
+                    if 重启:
+                        self._追加任务日志(任务ID, f"=== 带宽份额变化，按限速 {下载参数.get('max_speed') or '不限'} 重新启动 ===")
+                    else:
+                        self._追加任务日志(任务ID, f"=== 开始下载 {保存名称} ===")
+                    成功 = await 下载器.下载(
+                        链接=链接,
+                        保存名称=保存名称,
+                        线程数=self._自适应控制器.线程数 if self._自适应控制器 else None,
+                        进度回调=进度回调,
+                        日志回调=日志回调,
+                        **下载参数,
+                    )
+                    if not 成功 and self._停止原因.get(任务ID) == "rebalance":
+                        # 为调整限速而停止，在同一名额内按新份额重启
+                        self._停止原因.pop(任务ID, None)
+                        优先级 = 任务.priority
+                        重启 = True
+                        continue
+                    if self._停止原因.get(任务ID) == "rebalance":
+                        self._停止原因.pop(任务ID, None)
+                    break
+                self._追加任务日志(任务ID, f"=== 结束下载 {保存名称}（{'成功' if 成功 else '失败'}） ===")
+
+                async with 任务锁:
                     任务 = self._任务表.get(任务ID)
                     if not 任务:
                         return
 
                     停止原因 = self._停止原因.get(任务ID)
                     if 停止原因 == "paused":
-                        任务.status = "paused"
-                        await self._保存任务文件(需持锁=True)
+                        self._设置状态(任务, "paused")
+                        self._标记待保存(任务.id)
                         return
                     if 停止原因 == "deleting":
                         return
 
-                    if 成功:
-                        任务.status = "completed"
+                    if 停止原因 == "stalled" and not 成功:
+                        if self._卡死后处理(任务):
+                            return
+                    elif 成功:
+                        self._卡死重排次数.pop(任务.id, None)
+                        self._设置状态(任务, "completed")
                         任务.progress = 100.0
                         任务.completed_at = datetime.now(timezone.utc)
                         任务.error = None
-                        await self._保存任务文件(需持锁=True)
-                        await self._事件总线.发布("task.completed", {"task": 任务.model_dump(mode="json")})
                     else:
-                        任务.status = "failed"
+                        self._设置状态(任务, "failed")
                         任务.error = "下载失败"
-                        await self._保存任务文件(需持锁=True)
-                        await self._事件总线.发布("task.failed", {"task": 任务.model_dump(mode="json")})
+                    self._标记待保存(任务.id)
+                    事件数据 = {"task": 任务.model_dump(mode="json")}
+                # 事件在释放任务锁之后发布，订阅者慢时不会拖住该任务的其它操作
+                await self._事件总线.发布("task.completed" if 成功 else "task.failed", 事件数据)
 
             except asyncio.CancelledError:
-                async with self._锁:
+                卡死事件 = None
+                async with 任务锁:
                     任务 = self._任务表.get(任务ID)
                     if 任务 and 任务.status == "running":
                         停止原因 = self._停止原因.get(任务ID)
                         if 停止原因 in {"paused", "shutdown"}:
-                            任务.status = "paused"
+                            self._设置状态(任务, "paused")
                             if 停止原因 == "shutdown":
                                 任务.error = "服务关闭，任务已暂停"
-                            await self._保存任务文件(需持锁=True)
+                            self._标记待保存(任务.id)
                             return
                         if 停止原因 == "deleting":
                             return
+                        elif 停止原因 == "stalled":
+                            if not self._卡死后处理(任务):
+                                卡死事件 = {"task": 任务.model_dump(mode="json")}
                         else:
-                            任务.status = "failed"
+                            self._设置状态(任务, "failed")
                             任务.error = "下载失败"
-                        await self._保存任务文件(需持锁=True)
+                        self._标记待保存(任务.id)
+                if 卡死事件:
+                    await self._事件总线.发布("task.failed", 卡死事件)
                 return
             finally:
-                async with self._锁:
-                    self._运行中下载器.pop(任务ID, None)
-                    self._停止原因.pop(任务ID, None)
+                self._看门狗.结束跟踪(任务ID)
+                self._卡死原因.pop(任务ID, None)
+                self._最新进度.pop(任务ID, None)
+                self._任务速度.pop(任务ID, None)
+                self._结束遥测(任务ID)
+                self._带宽预算.注销(任务ID)
+                self._同步限速()
+                self._运行中下载器.pop(任务ID, None)
+                self._停止原因.pop(任务ID, None)
+                # 最后才有 await：日志落盘出错或被取消时，上面的状态也已清理干净
+                try:
+                    await self._日志写入器.关闭任务(任务ID)
+                except OSError:
+                    pass
 
-    async def _更新任务进度(self, 任务ID: str, 进度: Dict[str, Any]):
-        现在戳 = asyncio.get_running_loop().time()
-        async with self._锁:
+    async def _处理卡死(self, 任务ID: str, 原因: str):
+        """看门狗回调：停止下载进程以释放名额，后续的重新排队或失败在 _运行下载任务 中完成"""
+        任务锁 = self._任务锁.get(任务ID)
+        if 任务锁 is None:
+            return
+        async with 任务锁:
             任务 = self._任务表.get(任务ID)
-            if not 任务 or 任务.status != "running":
+            if not 任务 or 任务.status != "running" or 任务ID in self._停止原因:
                 return
-            if "percent" in 进度 and 进度["percent"] is not None:
+            self._停止原因[任务ID] = "stalled"
+            self._卡死原因[任务ID] = 原因
+            下载器 = self._运行中下载器.get(任务ID)
+            运行任务 = self._运行中任务.get(任务ID)
+
+        self._追加任务日志(任务ID, f"=== 卡死检测：{原因}，强制停止 ===")
+        if 下载器:
+            try:
+                await asyncio.wait_for(下载器.取消(), timeout=10.0)
+            except Exception:
+                pass
+        if 运行任务 and not 运行任务.done():
+            # 进程被终止后 下载() 通常很快返回并自行收尾；引擎不响应取消时才取消协程，避免打断收尾
+            _ = await asyncio.wait({运行任务}, timeout=5.0)
+            if not 运行任务.done():
+                运行任务.cancel()
+
+    def _卡死后处理(self, 任务: Task) -> bool:
+        """调用方持有该任务的锁；返回 True 表示任务将在释放名额后重新排队，False 表示已标记为失败"""
+        原因 = self._卡死原因.pop(任务.id, "长时间没有进展")
+        次数 = self._卡死重排次数.get(任务.id, 0)
+        if self._卡死处理 == "requeue" and 次数 < self._卡死最大重排次数:
+            self._卡死重排次数[任务.id] = 次数 + 1
+            任务.error = f"下载卡死（{原因}），已重新排队（第 {次数 + 1}/{self._卡死最大重排次数} 次）"
+            self._标记待保存(任务.id)
+            # 当前协程结束（名额已释放）后再排队，排在同优先级的等待任务之后
+            当前任务 = asyncio.current_task()
+            if 当前任务 is not None:
+                当前任务.add_done_callback(lambda _: self._重新排队(任务.id))
+            return True
+        self._卡死重排次数.pop(任务.id, None)
+        self._设置状态(任务, "failed")
+        任务.error = f"下载卡死（{原因}）" + (f"，重新排队 {次数} 次后仍无进展" if 次数 else "")
+        self._标记待保存(任务.id)
+        return False
+
+    def _重新排队(self, 任务ID: str):
+        任务 = self._任务表.get(任务ID)
+        if not 任务 or 任务.status != "running":
+            # 等待期间被暂停或删除
+            return
+        运行任务 = self._运行中任务.get(任务ID)
+        if 运行任务 is not None and not 运行任务.done():
+            return
+        self._追加任务日志(任务ID, "=== 卡死后重新排队 ===")
+        self._运行中任务[任务ID] = asyncio.create_task(self._运行下载任务(任务ID), name=f"download:{任务ID}")
+
+    def _远程租用变化(self, 任务ID: str, 已租出: bool):
+        """作业在协调器里等待工作节点时不算卡死；租约过期回到待分配后暂停计时，重新租出时重新开始"""
+        if not 已租出:
+            self._看门狗.结束跟踪(任务ID)
+        elif 任务ID in self._运行中下载器:
+            self._看门狗.开始跟踪(任务ID)
+
+    def _创建下载器(self, 任务ID: str):
+        if self._协调器 is not None:
+            return 远程下载器(self._协调器, 任务ID, 租用回调=lambda 已租出: self._远程租用变化(任务ID, 已租出))
+        return M3U8下载器()
+
+    def _取遥测(self, 任务ID: str) -> 任务遥测:
+        遥测 = self._任务遥测.get(任务ID)
+        if 遥测 is None:
+            # 暂停后重新开始的任务接着原来的序列记录
+            遥测 = self._已结束遥测.pop(任务ID, None) or 任务遥测(self._遥测容量, self._遥测采样间隔)
+            self._任务遥测[任务ID] = 遥测
+        return 遥测
+
+    def _结束遥测(self, 任务ID: str):
+        遥测 = self._任务遥测.pop(任务ID, None)
+        if 遥测 is None:
+            return
+        self._已结束遥测[任务ID] = 遥测
+        while len(self._已结束遥测) > self._已结束遥测上限:
+            _ = self._已结束遥测.popitem(last=False)
+
+    async def 获取任务指标(self, 任务ID: str, 点数: int = 120) -> Dict[str, Any]:
+        """任务的数值采样序列（降采样到最多 点数 个点）；从未运行过或遥测已淘汰时 samples 为空"""
+        任务 = self._任务表.get(任务ID)
+        if not 任务:
+            raise KeyError("任务不存在")
+        遥测 = self._任务遥测.get(任务ID) or self._已结束遥测.get(任务ID) or 任务遥测(self._遥测容量, self._遥测采样间隔)
+        return {"task_id": 任务ID, "status": 任务.status, **遥测.快照(点数)}
+
+    def _创建进度回调(self, 任务ID: str):
+        def 进度回调(进度: Dict[str, Any]):
+            # 只覆盖该任务的最新进度槽位，不创建协程，也不会积压
+            self._最新进度[任务ID] = 进度
+            self._进度待刷新.set()
+            self._看门狗.记录进度(任务ID, 进度)
+
+        return 进度回调
+
+    def _启动进度刷新(self):
+        if self._进度刷新任务 is None or self._进度刷新任务.done():
+            self._进度刷新任务 = asyncio.create_task(self._进度刷新循环(), name="progress-ticker")
+
+    async def _停止进度刷新(self):
+        任务 = self._进度刷新任务
+        self._进度刷新任务 = None
+        if 任务 and not 任务.done():
+            任务.cancel()
+            _ = await asyncio.gather(任务, return_exceptions=True)
+        self._最新进度.clear()
+
+    async def _进度刷新循环(self):
+        while True:
+            await self._进度待刷新.wait()
+            self._进度待刷新.clear()
+            try:
+                await self._刷新进度()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass
+            await asyncio.sleep(self._进度刷新间隔)
+
+    async def _刷新进度(self):
+        if not self._最新进度:
+            return
+        待刷新, self._最新进度 = self._最新进度, {}
+
+        事件项: List[Dict[str, Any]] = []
+        # 整段没有 await，不需要加锁，进度密集时也不会阻塞 API 请求
+        for 任务ID, 进度 in 待刷新.items():
+            任务 = self._任务表.get(任务ID)
+            if not 任务 or 任务.status != "running":
+                continue
+            if 进度.get("percent") is not None:
                 try:
                     任务.progress = float(进度["percent"])
                 except (ValueError, TypeError):
                     pass
-            if "speed" in 进度 and 进度["speed"] is not None:
+            if 进度.get("speed") is not None:
                 任务.speed = str(进度["speed"])
-            if "eta" in 进度 and 进度["eta"] is not None:
+            遥测 = self._取遥测(任务ID)
+            遥测.记录(进度)
+            剩余秒数 = 遥测.预计剩余秒数()
+            if 剩余秒数 is not None:
+                任务.eta = 格式化时长(剩余秒数)
+            elif 进度.get("eta") is not None:
                 任务.eta = str(进度["eta"])
-
-            上次 = self._上次落盘时间.get(任务ID, 0.0)
-            需要落盘 = (现在戳 - 上次) >= 1.0 or 任务.progress >= 100.0
-            if 需要落盘:
-                self._上次落盘时间[任务ID] = 现在戳
-                await self._保存任务文件(需持锁=True)
-
-            事件数据 = {
-                "task_id": 任务ID,
-                "percent": 任务.progress,
-                "speed": 任务.speed,
-                "eta": 任务.eta,
-            }
-
-        await self._事件总线.发布("task.progress", 事件数据)
+            if 进度.get("speed_bps") is not None:
+                try:
+                    self._任务速度[任务ID] = float(进度["speed_bps"])
+                except (ValueError, TypeError):
+                    pass
+            if 进度.get("cache_hits") is not None:
+                self._任务缓存统计[任务ID] = {
+                    "hits": int(进度["cache_hits"]),
+                    "misses": int(进度.get("cache_misses") or 0),
+                    "bytes_served": int(进度.get("cache_bytes") or 0),
+                }
+            self._标记待保存(任务ID)
+            事件项.append(
+                {
+                    "task_id": 任务ID,
+                    "percent": 任务.progress,
+                    "speed": 任务.speed,
+                    "eta": 任务.eta,
+                }
+            )
+
+        if 事件项:
+            await self._事件总线.发布("task.progress", {"items": 事件项})
 
     async def _加载任务文件(self):
-        if not self._任务文件路径.exists():
-            async with aiofiles.open(self._任务文件路径, "w", encoding="utf-8") as f:
-                await f.write("[]")
-            return
-
-        async with aiofiles.open(self._任务文件路径, "r", encoding="utf-8") as f:
-            文本 = await f.read()
-        try:
-            数据 = json.loads(文本) if 文本.strip() else []
-        except json.JSONDecodeError:
-            数据 = []
+        if self._存储 is None:
+            self._存储 = JSON任务存储(self._任务文件路径)
+        数据 = await asyncio.to_thread(self._存储.加载)
 
         async with self._锁:
-            self._任务表 = {项["id"]: Task.model_validate(项) for 项 in 数据 if isinstance(项, dict) and "id" in 项}
-
-    async def _保存任务文件(self, 需持锁: bool = False):
-        if not 需持锁:
-            async with self._锁:
-                return await self._保存任务文件(需持锁=True)
+            self._任务表 = {项["id"]: Task.model_validate({**项, "queue_position": None, "speed_limit": None}) for 项 in 数据}
+            self._重建索引()
+
+    def _标记待保存(self, 任务ID: str):
+        self._脏任务ID.add(任务ID)
+        self._待落盘.set()
+        self._记录修改(任务ID)
+
+    def _标记已删除(self, 任务ID: str):
+        self._脏任务ID.discard(任务ID)
+        self._已删除任务ID.add(任务ID)
+        self._待落盘.set()
+        self._修订号 += 1
+        self._任务修订.pop(任务ID, None)
+        if len(self._删除记录) == self._删除记录.maxlen:
+            self._删除记录截断修订 = self._删除记录[0][0]
+        self._删除记录.append((self._修订号, 任务ID))
+        for 回调 in self._变更回调:
+            回调(任务ID, self._修订号)
+
+    def _记录修改(self, 任务ID: str):
+        self._修订号 += 1
+        self._任务修订[任务ID] = self._修订号
+        for 回调 in self._变更回调:
+            回调(任务ID, self._修订号)
+
+    def _启动落盘(self):
+        if self._落盘任务 is None or self._落盘任务.done():
+            self._落盘任务 = asyncio.create_task(self._落盘循环(), name="tasks-persister")
+
+    async def _停止落盘(self):
+        任务 = self._落盘任务
+        self._落盘任务 = None
+        if 任务 and not 任务.done():
+            任务.cancel()
+            _ = await asyncio.gather(任务, return_exceptions=True)
+        if self._待落盘.is_set() or self._脏任务ID or self._已删除任务ID:
+            self._待落盘.clear()
+            await self._提交存储()
+
+    async def _落盘循环(self):
+        while True:
+            await self._待落盘.wait()
+            self._待落盘.clear()
+            try:
+                await self._提交存储()
+            except asyncio.CancelledError:
+                self._待落盘.set()
+                raise
+            except Exception:
+                self._待落盘.set()
+            await asyncio.sleep(self._落盘间隔)
 
-        数据 = [任务.model_dump(mode="json") for 任务 in self._任务表.values()]
-        文本 = json.dumps(数据, ensure_ascii=False, indent=2)
-        async with aiofiles.open(self._任务文件路径, "w", encoding="utf-8") as f:
-            await f.write(文本)
+    async def _提交存储(self):
+        if self._存储 is None:
+            return
+        # 快照在事件循环内同步生成（中间没有 await），无需持有全局锁；序列化与写入放到线程中
+        脏任务ID, self._脏任务ID = self._脏任务ID, set()
+        已删除, self._已删除任务ID = self._已删除任务ID, set()
+        变更 = [self._任务表[任务ID].model_dump(mode="json") for 任务ID in 脏任务ID if 任务ID in self._任务表]
+        全量 = [任务.model_dump(mode="json") for 任务 in list(self._任务表.values())] if self._存储.需要全量快照 else None
+
+        async with self._落盘锁:
+            开始 = time.perf_counter()
+            写入 = asyncio.ensure_future(asyncio.to_thread(self._存储.提交, 变更, list(已删除), 全量))
+            try:
+                await asyncio.shield(写入)
+                self._落盘耗时.观测(time.perf_counter() - 开始)
+            except asyncio.CancelledError:
+                # 线程中的写入无法中断，等它结束后再释放落盘锁
+                await 写入
+                raise
+            except Exception:
+                self._脏任务ID |= 脏任务ID
+                self._已删除任务ID |= 已删除 - set(self._任务表)
+                raise
 
     async def _停止任务用于删除(self, 任务ID: str):
-        async with self._锁:
+        async with self._取任务锁(任务ID):
             任务 = self._任务表.get(任务ID)
             if not 任务:
                 raise KeyError("任务不存在")
@@ -424,19 +1271,16 @@ class 任务管理器:
     def _获取任务日志路径(self, 任务ID: str) -> Path:
         return self._数据根目录 / "logs" / f"{任务ID}.log"
 
-    async def _追加任务日志(self, 任务ID: str, 行文本: str):
-        日志路径 = self._获取任务日志路径(任务ID)
-        日志路径.parent.mkdir(parents=True, exist_ok=True)
-        内容 = (行文本 or "").rstrip("\r\n") + "\n"
-
-        def _写入():
-            with open(日志路径, "a", encoding="utf-8", errors="ignore") as f:
-                f.write(内容)
+    def _追加任务日志(self, 任务ID: str, 行文本: str):
+        self._日志写入器.写入(任务ID, 行文本)
 
-        await asyncio.to_thread(_写入)
+    async def 刷新任务日志(self, 任务ID: str):
+        """把该任务缓冲中的日志写入文件，读取日志文件前调用"""
+        await self._日志写入器.刷新(任务ID)
 
     async def 获取任务日志(self, 任务ID: str, tail: int = 400, 最大字节数: int = 512_000) -> dict:
         日志路径 = self._获取任务日志路径(任务ID)
+        await self.刷新任务日志(任务ID)
         if tail <= 0:
             return {"task_id": 任务ID, "lines": [], "truncated": False}
         tail = min(int(tail), 2000)
@@ -459,6 +1303,7 @@ class 任务管理器:
 
     async def 获取任务日志原文(self, 任务ID: str, 最大字节数: int = 2_000_000) -> tuple[str, bool]:
         日志路径 = self._获取任务日志路径(任务ID)
+        await self.刷新任务日志(任务ID)
 
         def _读取() -> tuple[str, bool]:
             if not 日志路径.exists():
@@ -475,9 +1320,11 @@ class 任务管理器:
 
     async def _删除任务日志(self, 任务ID: str):
         日志路径 = self._获取任务日志路径(任务ID)
+        await self._日志写入器.丢弃任务(任务ID)
         try:
             await asyncio.to_thread(日志路径.unlink)
         except FileNotFoundError:
             return
         except Exception:
             return
+
@@ -0,0 +1,189 @@
+"""
+任务存储
+任务管理器在内存中保存全部任务，只把变更交给存储落盘；存储方法均为同步实现，由调用方放到线程中执行
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+
+class 任务存储:
+    """任务存储接口"""
+
+    # 为 True 时每次提交都需要全部任务的快照（整文件重写类的实现）
+    需要全量快照: bool = False
+
+    def 加载(self) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def 提交(
+        self,
+        变更: List[Dict[str, Any]],
+        删除: List[str],
+        全量: Optional[List[Dict[str, Any]]] = None,
+    ):
+        raise NotImplementedError
+
+    def 关闭(self):
+        return
+
+
+class JSON任务存储(任务存储):
+    """单个 JSON 文件，每次提交整文件原子替换"""
+
+    需要全量快照 = True
+
+    def __init__(self, 路径: Union[str, Path]):
+        self.路径 = Path(路径)
+
+    def 加载(self) -> List[Dict[str, Any]]:
+        if not self.路径.exists():
+            self.路径.parent.mkdir(parents=True, exist_ok=True)
+            self.路径.write_text("[]", encoding="utf-8")
+            return []
+
+        文本 = self.路径.read_text(encoding="utf-8")
+        try:
+            数据 = json.loads(文本) if 文本.strip() else []
+        except json.JSONDecodeError:
+            # 保留损坏的文件，避免下一次落盘用空列表把它覆盖掉
+            备份路径 = self.路径.with_name(f"{self.路径.name}.corrupt-{datetime.now().strftime('%Y%m%d%H%M%S')}")
+            os.replace(self.路径, 备份路径)
+            数据 = []
+        return [项 for 项 in 数据 if isinstance(项, dict) and "id" in 项] if isinstance(数据, list) else []
+
+    def 提交(
+        self,
+        变更: List[Dict[str, Any]],
+        删除: List[str],
+        全量: Optional[List[Dict[str, Any]]] = None,
+    ):
+        if 全量 is None:
+            raise ValueError("JSON 存储需要全量快照")
+        _原子写入JSON(self.路径, 全量)
+
+
+class SQLite任务存储(任务存储):
+    """SQLite（WAL 模式）存储，按行 upsert / delete，单个任务的变更不会重写整个历史"""
+
+    _固定列 = (
+        "id",
+        "url",
+        "name",
+        "status",
+        "progress",
+        "speed",
+        "eta",
+        "created_at",
+        "started_at",
+        "completed_at",
+        "error",
+    )
+
+    def __init__(self, 路径: Union[str, Path]):
+        self.路径 = Path(路径)
+        self.路径.parent.mkdir(parents=True, exist_ok=True)
+        self._连接锁 = threading.Lock()
+        self._连接 = sqlite3.connect(str(self.路径), check_same_thread=False, isolation_level=None)
+        self._连接.execute("PRAGMA journal_mode=WAL")
+        self._连接.execute("PRAGMA synchronous=NORMAL")
+        self._连接.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tasks (
+                id TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                name TEXT NOT NULL,
+                status TEXT NOT NULL,
+                progress REAL NOT NULL DEFAULT 0,
+                speed TEXT,
+                eta TEXT,
+                created_at TEXT NOT NULL,
+                started_at TEXT,
+                completed_at TEXT,
+                error TEXT,
+                extra TEXT
+            )
+            """
+        )
+        self._连接.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status)")
+        self._连接.execute("CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks(created_at)")
+
+        占位符 = ", ".join("?" for _ in range(len(self._固定列) + 1))
+        更新列 = ", ".join(f"{列}=excluded.{列}" for 列 in self._固定列[1:] + ("extra",))
+        self._upsert语句 = (
+            f"INSERT INTO tasks ({', '.join(self._固定列)}, extra) VALUES ({占位符}) "
+            f"ON CONFLICT(id) DO UPDATE SET {更新列}"
+        )
+
+    def _转行(self, 项: Dict[str, Any]) -> tuple:
+        额外 = {键: 值 for 键, 值 in 项.items() if 键 not in self._固定列}
+        return tuple(项.get(列) for 列 in self._固定列) + (json.dumps(额外, ensure_ascii=False) if 额外 else None,)
+
+    def 加载(self) -> List[Dict[str, Any]]:
+        with self._连接锁:
+            游标 = self._连接.execute(f"SELECT {', '.join(self._固定列)}, extra FROM tasks ORDER BY created_at, id")
+            行列表 = 游标.fetchall()
+        结果: List[Dict[str, Any]] = []
+        for 行 in 行列表:
+            项 = dict(zip(self._固定列, 行[:-1]))
+            if 行[-1]:
+                try:
+                    项.update(json.loads(行[-1]))
+                except json.JSONDecodeError:
+                    pass
+            结果.append(项)
+        return 结果
+
+    def 提交(
+        self,
+        变更: List[Dict[str, Any]],
+        删除: List[str],
+        全量: Optional[List[Dict[str, Any]]] = None,
+    ):
+        行列表 = [self._转行(项) for 项 in (全量 if 全量 is not None else 变更)]
+        with self._连接锁:
+            self._连接.execute("BEGIN")
+            try:
+                if 行列表:
+                    self._连接.executemany(self._upsert语句, 行列表)
+                if 删除:
+                    self._连接.executemany("DELETE FROM tasks WHERE id = ?", [(任务ID,) for 任务ID in 删除])
+                self._连接.execute("COMMIT")
+            except BaseException:
+                self._连接.execute("ROLLBACK")
+                raise
+
+    def 关闭(self):
+        with self._连接锁:
+            self._连接.close()
+
+
+def _原子写入JSON(路径: Path, 数据: Any):
+    文本 = json.dumps(数据, ensure_ascii=False, indent=2)
+    临时路径 = 路径.with_name(f".{路径.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(临时路径, "w", encoding="utf-8") as f:
+            f.write(文本)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(临时路径, 路径)
+    finally:
+        if 临时路径.exists():
+            try:
+                临时路径.unlink()
+            except OSError:
+                pass
+    if os.name != "nt":
+        目录描述符 = os.open(路径.parent, os.O_RDONLY)
+        try:
+            os.fsync(目录描述符)
+        finally:
+            os.close(目录描述符)
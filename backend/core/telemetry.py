@@ -0,0 +1,139 @@
+"""
+任务遥测
+每个任务一个有界环形缓冲，按固定间隔记录数值采样（速度、百分比、分片、已下载字节），供 GET /api/tasks/{id}/metrics 降采样后返回；
+ETA 由速度的指数加权滑动平均（EWMA）推算，不再照搬引擎输出的字符串，速度短暂抖动时不会忽长忽短
+"""
+
+from __future__ import annotations
+
+import math
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional
+
+
+@dataclass(frozen=True, slots=True)
+class 遥测采样:
+    时间: float
+    速度: Optional[float]
+    百分比: Optional[float]
+    已完成分片: Optional[int]
+    分片总数: Optional[int]
+    已下载字节: Optional[int]
+    总字节: Optional[int]
+
+    def 描述(self) -> Dict[str, Any]:
+        return {
+            "t": round(self.时间, 3),
+            "speed_bps": self.速度,
+            "percent": self.百分比,
+            "segments_done": self.已完成分片,
+            "segments_total": self.分片总数,
+            "bytes_done": self.已下载字节,
+            "bytes_total": self.总字节,
+        }
+
+
+def _取数值(进度: Dict[str, Any], 键: str, 类型=float):
+    值 = 进度.get(键)
+    if 值 is None:
+        return None
+    try:
+        return 类型(值)
+    except (TypeError, ValueError):
+        return None
+
+
+class 任务遥测:
+    def __init__(self, 容量: int = 3600, 采样间隔: float = 1.0, 平滑秒数: float = 10.0):
+        self._采样: Deque[遥测采样] = deque(maxlen=max(1, int(容量)))
+        self._采样间隔 = max(0.0, float(采样间隔))
+        self._平滑秒数 = max(0.1, float(平滑秒数))
+        self._上次采样时间: Optional[float] = None
+        # EWMA 按两次更新之间的实际间隔计算权重（1 - e^(-Δt/τ)），与进度上报频率无关
+        self._上次更新时间: Optional[float] = None
+        self._速度均值: Optional[float] = None
+        self._百分比速率均值: Optional[float] = None
+        self._上次百分比: Optional[float] = None
+        self._最新: Optional[遥测采样] = None
+
+    @property
+    def 采样数(self) -> int:
+        return len(self._采样)
+
+    @property
+    def 速度均值(self) -> Optional[float]:
+        return self._速度均值
+
+    def 记录(self, 进度: Dict[str, Any], 现在: Optional[float] = None):
+        """应用一条进度（与 task.progress 同频），满一个采样间隔时写入环形缓冲"""
+        现在 = time.monotonic() if 现在 is None else 现在
+        采样 = 遥测采样(
+            时间=time.time(),
+            速度=_取数值(进度, "speed_bps"),
+            百分比=_取数值(进度, "percent"),
+            已完成分片=_取数值(进度, "segments_done", int),
+            分片总数=_取数值(进度, "segments_total", int),
+            已下载字节=_取数值(进度, "bytes_done", int),
+            总字节=_取数值(进度, "bytes_total", int),
+        )
+
+        间隔 = 现在 - self._上次更新时间 if self._上次更新时间 is not None else None
+        if 采样.速度 is not None:
+            self._速度均值 = self._平滑(self._速度均值, 采样.速度, 间隔)
+        # 没有字节信息的旧格式输出只能按百分比的推进速度估算
+        if 采样.百分比 is not None:
+            if self._上次百分比 is not None and 间隔:
+                self._百分比速率均值 = self._平滑(
+                    self._百分比速率均值, max(0.0, 采样.百分比 - self._上次百分比) / 间隔, 间隔
+                )
+            self._上次百分比 = 采样.百分比
+        self._上次更新时间 = 现在
+        self._最新 = 采样
+
+        if self._上次采样时间 is None or 现在 - self._上次采样时间 >= self._采样间隔:
+            self._采样.append(采样)
+            self._上次采样时间 = 现在
+
+    def _平滑(self, 均值: Optional[float], 新值: float, 间隔: Optional[float]) -> float:
+        if 均值 is None or not 间隔 or 间隔 <= 0:
+            return 新值 if 均值 is None else 均值
+        权重 = 1.0 - math.exp(-间隔 / self._平滑秒数)
+        return 均值 + 权重 * (新值 - 均值)
+
+    def 预计剩余秒数(self) -> Optional[float]:
+        最新 = self._最新
+        if 最新 is None:
+            return None
+        if 最新.总字节 and 最新.已下载字节 is not None and self._速度均值:
+            return max(0, 最新.总字节 - 最新.已下载字节) / self._速度均值
+        if 最新.百分比 is not None and self._百分比速率均值:
+            return max(0.0, 100.0 - 最新.百分比) / self._百分比速率均值
+        return None
+
+    def 降采样(self, 点数: int) -> List[Dict[str, Any]]:
+        """最多返回 点数 个点：按顺序分桶，速度取桶内平均，其余字段取桶内最后一个采样"""
+        采样列表 = list(self._采样)
+        点数 = max(1, int(点数))
+        if len(采样列表) <= 点数:
+            return [采样.描述() for 采样 in 采样列表]
+        结果 = []
+        for 序号 in range(点数):
+            桶 = 采样列表[序号 * len(采样列表) // 点数 : (序号 + 1) * len(采样列表) // 点数]
+            速度列表 = [采样.速度 for 采样 in 桶 if 采样.速度 is not None]
+            项 = 桶[-1].描述()
+            项["speed_bps"] = sum(速度列表) / len(速度列表) if 速度列表 else None
+            结果.append(项)
+        return 结果
+
+    def 快照(self, 点数: int = 120) -> Dict[str, Any]:
+        剩余 = self.预计剩余秒数()
+        return {
+            "interval": self._采样间隔,
+            "capacity": self._采样.maxlen,
+            "sample_count": len(self._采样),
+            "speed_ewma_bps": self._速度均值,
+            "eta_seconds": round(剩余, 1) if 剩余 is not None else None,
+            "samples": self.降采样(点数),
+        }
@@ -0,0 +1,25 @@
+"""
+链接规范化
+任务的链接索引与分片缓存共用，保证同一资源的不同写法得到同一个键
+"""
+
+from __future__ import annotations
+
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+
+def 规范化链接(链接: str) -> str:
+    """协议与主机小写、去掉默认端口和片段、查询参数排序"""
+    try:
+        拆分 = urlsplit((链接 or "").strip())
+        端口 = 拆分.port
+    except ValueError:
+        return (链接 or "").strip()
+    协议 = 拆分.scheme.lower()
+    主机 = (拆分.hostname or "").lower()
+    if 端口 and not ((协议 == "http" and 端口 == 80) or (协议 == "https" and 端口 == 443)):
+        主机 = f"{主机}:{端口}"
+    if 拆分.username or 拆分.password:
+        主机 = f"{拆分.username or ''}{':' + 拆分.password if 拆分.password else ''}@{主机}"
+    查询 = urlencode(sorted(parse_qsl(拆分.query, keep_blank_values=True)))
+    return urlunsplit((协议, 主机, 拆分.path or "/", 查询, ""))
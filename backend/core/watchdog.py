@@ -0,0 +1,130 @@
+"""
+卡死看门狗
+CDN 挂起或某个分片反复重试时，N_m3u8DL-RE 可能长时间没有进展却不退出，一直占着下载名额。
+看门狗记录每个占用名额的任务最近一次输出与最近一次进度推进的时间，超过空闲窗口后回调任务管理器停止该任务
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+
+@dataclass
+class _活动记录:
+    最近输出: float
+    最近进展: float
+    进度标记: Optional[tuple] = None
+    百分比: float = 0.0
+
+
+class 卡死看门狗:
+    def __init__(
+        self,
+        处理回调: Callable[[str, str], Awaitable[None]],
+        无输出超时: float = 300.0,
+        无进展超时: float = 900.0,
+        检查间隔: Optional[float] = None,
+    ):
+        self._处理回调 = 处理回调
+        self._无输出超时 = max(0.0, float(无输出超时))
+        self._无进展超时 = max(0.0, float(无进展超时))
+        启用的窗口 = [窗口 for 窗口 in (self._无输出超时, self._无进展超时) if 窗口 > 0]
+        self._检查间隔 = 检查间隔 or min(5.0, max(0.05, min(启用的窗口, default=5.0) / 4))
+        self._记录: Dict[str, _活动记录] = {}
+        self._处理中: Set[asyncio.Task] = set()
+        self._后台任务: Optional[asyncio.Task] = None
+        self.卡死次数 = 0
+
+    @property
+    def 已启用(self) -> bool:
+        return self._无输出超时 > 0 or self._无进展超时 > 0
+
+    def 启动(self):
+        if not self.已启用:
+            return
+        if self._后台任务 is None or self._后台任务.done():
+            self._后台任务 = asyncio.create_task(self._检查循环(), name="stall-watchdog")
+
+    async def 关闭(self):
+        任务 = self._后台任务
+        self._后台任务 = None
+        if 任务 and not 任务.done():
+            任务.cancel()
+            _ = await asyncio.gather(任务, return_exceptions=True)
+        if self._处理中:
+            _ = await asyncio.gather(*self._处理中, return_exceptions=True)
+
+    def 开始跟踪(self, 任务ID: str, 现在: Optional[float] = None):
+        """任务拿到下载名额、即将启动下载时调用；排队中的任务不计时"""
+        现在 = time.monotonic() if 现在 is None else 现在
+        self._记录[任务ID] = _活动记录(最近输出=现在, 最近进展=现在)
+
+    def 结束跟踪(self, 任务ID: str):
+        self._记录.pop(任务ID, None)
+
+    def 记录输出(self, 任务ID: str, 现在: Optional[float] = None):
+        记录 = self._记录.get(任务ID)
+        if 记录 is not None:
+            记录.最近输出 = time.monotonic() if 现在 is None else 现在
+
+    def 记录进度(self, 任务ID: str, 进度: Dict[str, Any], 现在: Optional[float] = None):
+        """进度上报也算输出；百分比、分片数或已下载字节变化才算推进"""
+        记录 = self._记录.get(任务ID)
+        if 记录 is None:
+            return
+        现在 = time.monotonic() if 现在 is None else 现在
+        记录.最近输出 = 现在
+        标记 = (进度.get("percent"), 进度.get("segments_done"), 进度.get("bytes_done"))
+        if 标记 != 记录.进度标记:
+            记录.进度标记 = 标记
+            记录.最近进展 = 现在
+            try:
+                记录.百分比 = float(进度.get("percent") or 0.0)
+            except (TypeError, ValueError):
+                pass
+
+    def 检查(self, 现在: Optional[float] = None) -> List[Tuple[str, str]]:
+        """返回超过空闲窗口的 (任务ID, 原因)，并停止跟踪这些任务（每次卡死只报告一次）"""
+        现在 = time.monotonic() if 现在 is None else 现在
+        卡死列表 = []
+        for 任务ID, 记录 in self._记录.items():
+            if 记录.百分比 >= 100.0:
+                # 下载完成后的合并阶段可能长时间没有输出，不算卡死
+                continue
+            无输出 = 现在 - 记录.最近输出
+            无进展 = 现在 - 记录.最近进展
+            if self._无输出超时 and 无输出 >= self._无输出超时:
+                卡死列表.append((任务ID, f"超过 {self._无输出超时:g} 秒没有任何输出"))
+            elif self._无进展超时 and 无进展 >= self._无进展超时:
+                卡死列表.append((任务ID, f"超过 {self._无进展超时:g} 秒进度没有推进"))
+        for 任务ID, _ in 卡死列表:
+            del self._记录[任务ID]
+        self.卡死次数 += len(卡死列表)
+        return 卡死列表
+
+    def 状态(self) -> Dict[str, Any]:
+        现在 = time.monotonic()
+        return {
+            "enabled": self.已启用,
+            "idle_timeout": self._无输出超时,
+            "progress_timeout": self._无进展超时,
+            "stalled_total": self.卡死次数,
+            "tasks": {
+                任务ID: {
+                    "idle_seconds": round(现在 - 记录.最近输出, 1),
+                    "no_progress_seconds": round(现在 - 记录.最近进展, 1),
+                }
+                for 任务ID, 记录 in self._记录.items()
+            },
+        }
+
+    async def _检查循环(self):
+        while True:
+            await asyncio.sleep(self._检查间隔)
+            for 任务ID, 原因 in self.检查():
+                处理 = asyncio.create_task(self._处理回调(任务ID, 原因), name=f"stall:{任务ID}")
+                self._处理中.add(处理)
+                处理.add_done_callback(self._处理中.discard)
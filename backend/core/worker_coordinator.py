@@ -0,0 +1,281 @@
+"""
+远程工作节点的租约协调
+任务管理器照常按调度器发放名额；拿到名额的任务不在本机启动下载，而是作为作业交给协调器，
+由工作节点（backend/worker.py）租用后在自己的机器上运行 M3U8下载器，并定期心跳回报进度与日志。
+租约到期未续约（节点宕机或断网）时作业重新排队，由其它节点接手
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+
+class 租约无效(KeyError):
+    """租约不存在、已过期被回收，或不属于该工作节点"""
+
+
+@dataclass(eq=False)
+class _远程作业:
+    任务ID: str
+    链接: str
+    保存名称: str
+    参数: Dict[str, Any]
+    结果: asyncio.Future
+    进度回调: Optional[Callable[[Dict[str, Any]], None]] = None
+    日志回调: Optional[Callable[[str], None]] = None
+    # 租出时以 True、租约过期回到待分配时以 False 调用；等待工作节点期间不应按卡死计时
+    租用回调: Optional[Callable[[bool], None]] = None
+    租约ID: Optional[str] = None
+    工作节点: Optional[str] = None
+    到期时间: float = 0.0
+    尝试次数: int = 0
+    已取消: bool = False
+    提交时间: float = field(default_factory=time.monotonic)
+
+    def 描述(self, 租约秒数: float) -> Dict[str, Any]:
+        return {
+            "task_id": self.任务ID,
+            "lease_id": self.租约ID,
+            "url": self.链接,
+            "name": self.保存名称,
+            "options": self.参数,
+            "attempt": self.尝试次数,
+            "lease_seconds": 租约秒数,
+        }
+
+
+class 租约协调器:
+    def __init__(self, 租约秒数: float = 30.0, 最大尝试次数: int = 3):
+        self._租约秒数 = max(1.0, float(租约秒数))
+        # 同一作业最多租出几次；节点一租到就崩溃时不会无限地重新排队
+        self._最大尝试次数 = max(1, int(最大尝试次数))
+        self._待分配: Deque[_远程作业] = deque()
+        self._租约: Dict[str, _远程作业] = {}
+        self._有作业 = asyncio.Event()
+        # 工作节点 ID -> 最近一次租用/心跳的时间（time.time()）
+        self._节点最近联系: Dict[str, float] = {}
+        self._回收任务: Optional[asyncio.Task] = None
+        self.重新分配次数 = 0
+
+    @property
+    def 租约秒数(self) -> float:
+        return self._租约秒数
+
+    def 启动(self):
+        if self._回收任务 is None or self._回收任务.done():
+            self._回收任务 = asyncio.create_task(self._回收循环(), name="worker-lease-reaper")
+
+    async def 关闭(self):
+        任务 = self._回收任务
+        self._回收任务 = None
+        if 任务 and not 任务.done():
+            任务.cancel()
+            _ = await asyncio.gather(任务, return_exceptions=True)
+        for 作业 in [*self._待分配, *self._租约.values()]:
+            if not 作业.结果.done():
+                作业.结果.set_result(False)
+        self._待分配.clear()
+        self._租约.clear()
+
+    async def 提交(
+        self,
+        任务ID: str,
+        链接: str,
+        保存名称: str,
+        参数: Dict[str, Any],
+        进度回调: Optional[Callable[[Dict[str, Any]], None]] = None,
+        日志回调: Optional[Callable[[str], None]] = None,
+        租用回调: Optional[Callable[[bool], None]] = None,
+    ) -> bool:
+        """排队等待工作节点执行，返回下载是否成功；被取消时通知持有租约的节点停止"""
+        作业 = _远程作业(
+            任务ID=任务ID,
+            链接=链接,
+            保存名称=保存名称,
+            参数=参数,
+            结果=asyncio.get_running_loop().create_future(),
+            进度回调=进度回调,
+            日志回调=日志回调,
+            租用回调=租用回调,
+        )
+        self._待分配.append(作业)
+        self._有作业.set()
+        try:
+            return await asyncio.shield(作业.结果)
+        except asyncio.CancelledError:
+            self.取消(作业)
+            raise
+
+    def 取消(self, 作业: _远程作业):
+        作业.已取消 = True
+        if 作业 in self._待分配:
+            self._待分配.remove(作业)
+            if not 作业.结果.done():
+                作业.结果.set_result(False)
+        # 已租出的作业在节点下次心跳时收到 cancel，节点停止后调用 完成()
+
+    async def 租用(self, 工作节点: str, 数量: int = 1, 等待秒数: float = 0.0) -> List[Dict[str, Any]]:
+        """取出最多 数量 个作业；没有作业时最多等待 等待秒数（长轮询）"""
+        self._节点最近联系[工作节点] = time.time()
+        self.回收过期()
+        截止 = time.monotonic() + max(0.0, float(等待秒数))
+        while not self._待分配:
+            剩余 = 截止 - time.monotonic()
+            if 剩余 <= 0:
+                return []
+            self._有作业.clear()
+            try:
+                await asyncio.wait_for(self._有作业.wait(), timeout=剩余)
+            except asyncio.TimeoutError:
+                return []
+
+        结果 = []
+        while self._待分配 and len(结果) < max(1, int(数量)):
+            作业 = self._待分配.popleft()
+            作业.租约ID = uuid.uuid4().hex
+            作业.工作节点 = 工作节点
+            作业.尝试次数 += 1
+            作业.到期时间 = time.monotonic() + self._租约秒数
+            self._租约[作业.租约ID] = 作业
+            if 作业.租用回调:
+                作业.租用回调(True)
+            self._记录日志(作业, f"=== 已分配给工作节点 {工作节点}（第 {作业.尝试次数} 次） ===")
+            结果.append(作业.描述(self._租约秒数))
+        return 结果
+
+    async def 心跳(
+        self,
+        租约ID: str,
+        工作节点: str,
+        进度: Optional[Dict[str, Any]] = None,
+        日志行: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """续约并转发进度/日志；返回 cancel=True 时节点应停止下载并调用 完成()"""
+        作业 = self._取租约(租约ID, 工作节点)
+        self._节点最近联系[工作节点] = time.time()
+        作业.到期时间 = time.monotonic() + self._租约秒数
+        for 行 in 日志行 or []:
+            self._记录日志(作业, 行)
+        if 进度 and 作业.进度回调 and not 作业.已取消:
+            作业.进度回调(进度)
+        return {"cancel": 作业.已取消, "lease_seconds": self._租约秒数}
+
+    async def 完成(self, 租约ID: str, 工作节点: str, 成功: bool, 错误: Optional[str] = None):
+        作业 = self._取租约(租约ID, 工作节点)
+        self._节点最近联系[工作节点] = time.time()
+        del self._租约[租约ID]
+        if 错误:
+            self._记录日志(作业, f"工作节点 {工作节点} 报告错误: {错误}")
+        if not 作业.结果.done():
+            作业.结果.set_result(bool(成功) and not 作业.已取消)
+
+    def 回收过期(self) -> int:
+        """把过期租约的作业放回队首（已取消或租出次数达到上限的直接结束），返回回收数量"""
+        现在 = time.monotonic()
+        过期 = [作业 for 作业 in self._租约.values() if 作业.到期时间 <= 现在]
+        for 作业 in 过期:
+            del self._租约[作业.租约ID]
+            self._记录日志(作业, f"=== 工作节点 {作业.工作节点} 租约过期，任务重新排队 ===")
+            作业.租约ID = None
+            作业.工作节点 = None
+            if 作业.已取消:
+                if not 作业.结果.done():
+                    作业.结果.set_result(False)
+                continue
+            if 作业.尝试次数 >= self._最大尝试次数:
+                self._记录日志(作业, f"=== 已租出 {作业.尝试次数} 次均未完成，任务失败 ===")
+                if not 作业.结果.done():
+                    作业.结果.set_result(False)
+                continue
+            self.重新分配次数 += 1
+            if 作业.租用回调:
+                作业.租用回调(False)
+            self._待分配.appendleft(作业)
+        if 过期 and self._待分配:
+            self._有作业.set()
+        return len(过期)
+
+    async def 状态(self) -> Dict[str, Any]:
+        现在 = time.monotonic()
+        各节点: Dict[str, Dict[str, Any]] = {
+            节点: {"last_seen": 时间, "leases": []} for 节点, 时间 in self._节点最近联系.items()
+        }
+        for 作业 in self._租约.values():
+            各节点.setdefault(作业.工作节点, {"last_seen": None, "leases": []})["leases"].append(
+                {
+                    "task_id": 作业.任务ID,
+                    "lease_id": 作业.租约ID,
+                    "attempt": 作业.尝试次数,
+                    "expires_in": round(max(0.0, 作业.到期时间 - 现在), 3),
+                    "cancelling": 作业.已取消,
+                }
+            )
+        return {
+            "lease_seconds": self._租约秒数,
+            "max_attempts": self._最大尝试次数,
+            "pending": [作业.任务ID for 作业 in self._待分配],
+            "reassigned": self.重新分配次数,
+            "workers": 各节点,
+        }
+
+    def _取租约(self, 租约ID: str, 工作节点: str) -> _远程作业:
+        作业 = self._租约.get(租约ID)
+        if 作业 is None or 作业.工作节点 != 工作节点:
+            raise 租约无效("租约不存在或已过期")
+        return 作业
+
+    def _记录日志(self, 作业: _远程作业, 行: str):
+        if 作业.日志回调:
+            作业.日志回调(行)
+
+    async def _回收循环(self):
+        while True:
+            await asyncio.sleep(max(0.2, self._租约秒数 / 3))
+            self.回收过期()
+
+
+class 远程下载器:
+    """与 M3U8下载器 接口一致，下载交给租用作业的工作节点执行"""
+
+    引擎 = "remote"
+
+    def __init__(self, 协调器: 租约协调器, 任务ID: str, 租用回调: Optional[Callable[[bool], None]] = None):
+        self._协调器 = 协调器
+        self._任务ID = 任务ID
+        self._租用回调 = 租用回调
+        self._执行任务: Optional[asyncio.Task] = None
+
+    async def 下载(
+        self,
+        链接: str,
+        保存名称: str,
+        线程数: Optional[int] = None,
+        进度回调: Optional[Callable[[Dict[str, Any]], None]] = None,
+        日志回调: Optional[Callable[[str], None]] = None,
+        **其他参数,
+    ) -> bool:
+        # 只转发可以 JSON 序列化的覆盖参数（如 max_speed），令牌桶等本机对象不能跨机器
+        参数 = {键: 值 for 键, 值 in 其他参数.items() if isinstance(值, (str, int, float, bool)) or 值 is None}
+        if 线程数 is not None:
+            参数["thread_count"] = int(线程数)
+        self._执行任务 = asyncio.ensure_future(
+            self._协调器.提交(self._任务ID, 链接, 保存名称, 参数, 进度回调, 日志回调, self._租用回调)
+        )
+        try:
+            return await self._执行任务
+        except asyncio.CancelledError:
+            当前任务 = asyncio.current_task()
+            if self._执行任务.cancelled() and not (当前任务 and 当前任务.cancelling()):
+                return False
+            raise
+        finally:
+            self._执行任务 = None
+
+    async def 取消(self):
+        if self._执行任务 and not self._执行任务.done():
+            self._执行任务.cancel()
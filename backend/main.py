@@ -12,23 +12,69 @@ if str(项目根目录) not in sys.path:
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from backend.api import tasks_router, config_router, stream_router, status_router
+from backend.api import (
+    tasks_router,
+    config_router,
+    stream_router,
+    status_router,
+    scheduler_router,
+    cache_router,
+    metrics_router,
+    workers_router,
+)
+from backend.core.cluster import 加入集群
+from backend.core.config import get_config
 from backend.core.task_manager import 任务管理器
+from backend.core.task_store import SQLite任务存储
 
 
 @asynccontextmanager
 async def 生命周期(app: FastAPI):
-    任务管理 = 任务管理器()
-    await 任务管理.初始化()
+    配置 = get_config()
+
+    def 创建任务管理器() -> 任务管理器:
+        存储 = SQLite任务存储(配置.sqlite_path) if 配置.storage_backend == "sqlite" else None
+        return 任务管理器(
+            最大并发数=配置.max_concurrency,
+            进度刷新频率=配置.progress_flush_hz,
+            最大落盘频率=配置.tasks_save_max_hz,
+            存储=存储,
+            日志队列上限=配置.log_queue_size,
+            事件回放容量=配置.event_replay_size,
+            自适应并发=配置.adaptive_concurrency,
+            自适应最大并发=配置.adaptive_max_concurrency,
+            自适应最大线程数=配置.adaptive_max_threads,
+            自适应调整间隔=配置.adaptive_interval,
+            带宽上限=配置.bandwidth_limit,
+            工作节点模式=配置.worker_mode,
+            租约秒数=配置.worker_lease_seconds,
+            租约最大尝试次数=配置.worker_max_attempts,
+            遥测采样间隔=配置.telemetry_interval,
+            遥测容量=配置.telemetry_samples,
+            卡死无输出超时=配置.stall_timeout,
+            卡死无进展超时=配置.stall_progress_timeout,
+            卡死处理=配置.stall_action,
+            卡死最大重排次数=配置.stall_max_requeues,
+        )
+
+    集群 = None
+    if 配置.cluster_enabled:
+        # 只有一个进程（主进程）创建真正的任务管理器，其余进程得到与之同步的副本
+        集群 = await 加入集群(Path(配置.cluster_socket_path), 创建任务管理器, 事件回放容量=配置.event_replay_size)
+        任务管理 = 集群.管理器
+    else:
+        任务管理 = 创建任务管理器()
+        await 任务管理.初始化()
     app.state.task_manager = 任务管理
     app.state.shutdown_event = asyncio.Event()
     yield
     try:
         try:
             app.state.shutdown_event.set()
+            任务管理.事件总线.关闭()
         except Exception:
             pass
-        await asyncio.shield(任务管理.关闭())
+        await asyncio.shield(集群.关闭() if 集群 is not None else 任务管理.关闭())
     except Exception:
         pass
 
@@ -47,6 +93,10 @@ app.include_router(status_router)
 app.include_router(config_router)
 app.include_router(tasks_router)
 app.include_router(stream_router)
+app.include_router(scheduler_router)
+app.include_router(cache_router)
+app.include_router(metrics_router)
+app.include_router(workers_router)
 
 
 if __name__ == "__main__":
@@ -55,10 +105,15 @@ if __name__ == "__main__":
 
     host = os.environ.get("M3U8_AGENT_HOST", "0.0.0.0")
     port = int(os.environ.get("M3U8_AGENT_PORT", "8000"))
+    workers = int(os.environ.get("M3U8_AGENT_WORKERS", "1"))
+    if workers > 1 and not get_config().cluster_enabled:
+        # 各进程各自加载并写回同一份任务数据会互相覆盖
+        raise SystemExit("M3U8_AGENT_WORKERS > 1 需要在 config.toml 中开启 [cluster] enabled = true")
     uvicorn.run(
         "backend.main:app",
         host=host,
         port=port,
         reload=False,
+        workers=workers,
         timeout_graceful_shutdown=5,
     )
@@ -21,9 +21,25 @@ class Task(BaseModel):
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
     error: Optional[str] = None
+    # 数值越大越先获得下载名额；queue_position 为等待名额时的排队位置（从 1 开始），未排队为 None
+    priority: int = 0
+    queue_position: Optional[int] = None
+    # 全局带宽预算分给该任务的当前限速（如 "2.50 MB/s"），未启用预算或未运行时为 None
+    speed_limit: Optional[str] = None
 
 
 
 class TaskCreateRequest(BaseModel):
     url: str = Field(min_length=1)
     name: str = Field(min_length=1)
+    priority: int = 0
+
+
+class TaskPriorityRequest(BaseModel):
+    priority: int
+
+
+class SchedulerUpdateRequest(BaseModel):
+    max_concurrency: Optional[int] = Field(default=None, ge=1)
+    # 全局限速，如 "20M"；空串表示不限速，不传则不修改
+    bandwidth_limit: Optional[str] = None
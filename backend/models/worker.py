@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class WorkerLeaseRequest(BaseModel):
+    worker_id: str = Field(min_length=1)
+    capacity: int = Field(default=1, ge=1)
+    # 没有可分配作业时最多等待的秒数（长轮询）
+    wait: float = Field(default=0.0, ge=0.0, le=60.0)
+
+
+class WorkerHeartbeatRequest(BaseModel):
+    worker_id: str = Field(min_length=1)
+    lease_id: str = Field(min_length=1)
+    # 与本地进度回调相同的字段（progress、speed、eta 等），不传表示无新进度
+    progress: Optional[Dict[str, Any]] = None
+    logs: List[str] = Field(default_factory=list)
+
+
+class WorkerCompleteRequest(BaseModel):
+    worker_id: str = Field(min_length=1)
+    lease_id: str = Field(min_length=1)
+    success: bool
+    error: Optional[str] = None
+    # 最后一次心跳之后产生的日志
+    logs: List[str] = Field(default_factory=list)
@@ -0,0 +1,96 @@
+"""
+进度解析基准测试
+对比逐行多编码试探 + 多条正则（旧实现）与一次判定编码 + 预筛 + 单条组合正则（新实现）的每行耗时
+
+用法:
+    python backend/test/bench_progress_parse.py [行数]
+"""
+
+import re
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from backend.core.progress_parser import 输出解码器, 解析进度行
+
+
+_速度单位倍率 = {"B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+
+
+def _旧解码(行: bytes) -> str:
+    for 编码 in ['gbk', 'utf-8', 'cp936']:
+        try:
+            return 行.decode(编码).strip()
+        except (UnicodeDecodeError, LookupError):
+            continue
+    return 行.decode('utf-8', errors='ignore').strip()
+
+
+def _旧解析(输出行: str):
+    百分比匹配 = re.search(r'(\d+\.?\d*)%', 输出行)
+    速度列表 = re.findall(r'(\d+(?:\.\d+)?)\s*([KMG]?B)\s*(?:/s|ps)\b', 输出行)
+    速度 = None
+    速度字节数 = None
+    if 速度列表:
+        数值, 单位 = 速度列表[-1]
+        速度 = f"{数值} {单位}/s"
+        速度字节数 = float(数值) * _速度单位倍率[单位]
+    eta匹配 = re.search(r'ETA[:\s]+(\d{2}:\d{2}:\d{2})', 输出行)
+    if not eta匹配:
+        eta匹配 = re.search(r'(\d{2}:\d{2}:\d{2})(?=\s*(?:/|$))', 输出行)
+    if 百分比匹配:
+        return {
+            "percent": float(百分比匹配.group(1)),
+            "speed": 速度,
+            "speed_bps": 速度字节数,
+            "eta": eta匹配.group(1) if eta匹配 else None,
+            "timestamp": datetime.now().isoformat()
+        }
+    return None
+
+
+def _生成输出(行数: int) -> list:
+    """约 3/4 是进度条重绘，其余是 GBK 编码的中文日志行"""
+    行列表 = []
+    for 序号 in range(行数):
+        if 序号 % 4 == 3:
+            行列表.append(f"12:34:{序号 % 60:02d}.123 INFO : 正在下载分片 {序号}，保存名称: 测试视频".encode("gbk"))
+        else:
+            百分比 = 序号 * 100.0 / 行数
+            行列表.append(
+                f"Vid 1280x720 | 0 Kbps ------------------------------ {序号}/{行数} {百分比:.2f}% "
+                f"153.99MB/228.51MB 15.76MBps 00:00:03".encode("gbk")
+            )
+    return 行列表
+
+
+def _测量(名称: str, 行列表: list, 处理) -> float:
+    开始 = time.perf_counter()
+    进度数 = 处理(行列表)
+    耗时 = time.perf_counter() - 开始
+    print(f"{名称}: {耗时 * 1e6 / len(行列表):.2f} µs/行 | 进度 {进度数} 条")
+    return 耗时
+
+
+def main():
+    行数 = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    行列表 = _生成输出(行数)
+
+    def 旧(行列表):
+        return sum(1 for 行 in 行列表 if _旧解析(_旧解码(行)))
+
+    def 新(行列表):
+        解码器 = 输出解码器()
+        return sum(1 for 行 in 行列表 if 解析进度行(解码器.解码(行).strip()))
+
+    print(f"{行数} 行输出")
+    旧耗时 = _测量("逐行试探 + 多条正则（旧）", 行列表, 旧)
+    新耗时 = _测量("一次判定 + 组合正则（新）", 行列表, 新)
+    print(f"加速 {旧耗时 / 新耗时:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
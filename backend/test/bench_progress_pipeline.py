@@ -0,0 +1,120 @@
+"""
+进度管道基准测试
+50 个高频输出进度的任务同时运行时，对比逐行创建协程（旧实现）与合并刷新（新实现）下的事件循环延迟
+
+用法:
+    python backend/test/bench_progress_pipeline.py [任务数] [秒数]
+"""
+
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import backend.core.task_manager as task_manager_mod
+from backend.core.task_manager import 任务管理器
+
+
+每秒进度行数 = 200
+运行秒数 = 3.0
+
+
+class _话痨下载器:
+    async def 下载(self, 链接, 保存名称, 进度回调=None, **kwargs):
+        结束时间 = time.monotonic() + 运行秒数
+        百分比 = 0.0
+        while time.monotonic() < 结束时间:
+            for _ in range(10):
+                百分比 = min(99.0, 百分比 + 0.01)
+                进度回调({"percent": 百分比, "speed": "1.00 MB/s", "eta": "00:00:10"})
+            await asyncio.sleep(10 / 每秒进度行数)
+        return True
+
+    async def 取消(self):
+        return
+
+
+class _逐行任务管理器(任务管理器):
+    """复现旧实现：每行进度创建一个协程，抢全局锁并按任务节流重写 tasks.json"""
+
+    def _创建进度回调(self, 任务ID):
+        loop = asyncio.get_running_loop()
+        上次落盘 = {"时间": 0.0}
+
+        async def 更新(进度):
+            async with self._锁:
+                任务 = self._任务表.get(任务ID)
+                if not 任务 or 任务.status != "running":
+                    return
+                任务.progress = float(进度["percent"])
+                任务.speed = 进度["speed"]
+                任务.eta = 进度["eta"]
+                现在 = loop.time()
+                if 现在 - 上次落盘["时间"] >= 1.0:
+                    上次落盘["时间"] = 现在
+                    self._标记待保存(任务ID)
+                    await self._提交存储()
+                数据 = {"task_id": 任务ID, "percent": 任务.progress, "speed": 任务.speed, "eta": 任务.eta}
+            await self._事件总线.发布("task.progress", 数据)
+
+        return lambda 进度: loop.create_task(更新(进度))
+
+
+async def _测量(管理器类, 任务数: int) -> dict:
+    with tempfile.TemporaryDirectory() as 临时目录:
+        管理器 = 管理器类(最大并发数=任务数)
+        管理器._任务文件路径 = Path(临时目录) / "tasks.json"
+        管理器._获取任务日志路径 = lambda 任务ID: Path(临时目录) / "logs" / f"{任务ID}.log"
+        await 管理器.初始化()
+        订阅队列 = await 管理器.事件总线.订阅()
+        for 序号 in range(任务数):
+            任务 = await 管理器.创建任务("https://example.com/a.m3u8", f"bench{序号}")
+            await 管理器.开始任务(任务.id)
+
+        loop = asyncio.get_running_loop()
+        延迟列表 = []
+        事件数 = 0
+        结束时间 = loop.time() + 运行秒数
+        while loop.time() < 结束时间:
+            开始 = loop.time()
+            await asyncio.sleep(0.005)
+            延迟列表.append((loop.time() - 开始 - 0.005) * 1000)
+            事件数 += sum(1 for 事件对象 in 订阅队列.取出全部() if 事件对象.event == "task.progress")
+
+        await asyncio.gather(*list(管理器._运行中任务.values()), return_exceptions=True)
+        await 管理器.关闭()
+
+    延迟列表.sort()
+    return {
+        "平均延迟ms": statistics.mean(延迟列表),
+        "p99延迟ms": 延迟列表[int(len(延迟列表) * 0.99) - 1],
+        "最大延迟ms": 延迟列表[-1],
+        "进度事件数": 事件数,
+    }
+
+
+def main():
+    任务数 = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    global 运行秒数
+    运行秒数 = float(sys.argv[2]) if len(sys.argv) > 2 else 运行秒数
+
+    原下载器类 = task_manager_mod.M3U8下载器
+    task_manager_mod.M3U8下载器 = _话痨下载器
+    try:
+        print(f"{任务数} 个任务，每任务 {每秒进度行数} 行/秒，持续 {运行秒数:.0f} 秒")
+        for 名称, 管理器类 in (("逐行协程（旧）", _逐行任务管理器), ("合并刷新（新）", 任务管理器)):
+            结果 = asyncio.run(_测量(管理器类, 任务数))
+            print(
+                f"{名称}: 平均 {结果['平均延迟ms']:.2f} ms | p99 {结果['p99延迟ms']:.2f} ms | "
+                f"最大 {结果['最大延迟ms']:.2f} ms | 进度事件 {结果['进度事件数']}"
+            )
+    finally:
+        task_manager_mod.M3U8下载器 = 原下载器类
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+import asyncio
+import tempfile
+import time
+import unittest
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import backend.core.task_manager as task_manager_mod
+from backend.core.bandwidth import 令牌桶, 带宽预算, 格式化限速参数, 解析速率
+from backend.core.task_manager import 任务管理器
+
+M = 1024 * 1024
+
+
+class TestBandwidthBudget(unittest.TestCase):
+    def test_parse_rate(self):
+        self.assertEqual(解析速率("15M"), 15 * M)
+        self.assertEqual(解析速率("100k"), 100 * 1024)
+        self.assertEqual(解析速率("2.5MB"), 2.5 * M)
+        self.assertIsNone(解析速率(""))
+        with self.assertRaises(ValueError):
+            解析速率("fast")
+        self.assertEqual(格式化限速参数(1.5 * M), "1536K")
+
+    def test_weighted_split_and_rebalance(self):
+        预算 = 带宽预算(12 * M)
+        甲 = 预算.注册原生任务("甲", 0)
+        self.assertEqual(甲.速率, 12 * M)
+        乙 = 预算.注册原生任务("乙", 1)
+        self.assertEqual((甲.速率, 乙.速率), (4 * M, 8 * M))
+
+        预算.设置优先级("甲", 1)
+        self.assertEqual((甲.速率, 乙.速率), (6 * M, 6 * M))
+
+        # 外部进程按当时份额固定（按 K 取整，与 -R 一致），原生任务分剩下的部分
+        外部份额 = 预算.注册外部任务("丙", 0)
+        self.assertEqual(外部份额, (12 * M / 5) // 1024 * 1024)
+        self.assertAlmostEqual(甲.速率 + 乙.速率 + 外部份额, 12 * M)
+
+        预算.注销("乙")
+        self.assertAlmostEqual(甲.速率, 12 * M - 外部份额)
+        self.assertEqual(预算.各任务限速(), {"甲": 甲.速率, "丙": 外部份额})
+
+        预算.设置总速率(None)
+        self.assertIsNone(甲.速率)
+
+    def test_external_shares_reserve_queued_slots_and_never_exceed_budget(self):
+        预算 = 带宽预算(12 * M, 并发上限=3)
+        # 另外两个任务在排队，第一个进程只拿三分之一，后来者不必挤占它
+        预算.设置调度状态(3, 2)
+        self.assertEqual(预算.注册外部任务("甲"), 4 * M)
+        预算.设置调度状态(3, 1)
+        self.assertEqual(预算.注册外部任务("乙"), 4 * M)
+        预算.设置调度状态(3, 0)
+        self.assertEqual(预算.注册外部任务("丙"), 4 * M)
+        self.assertEqual(预算.待调整外部任务(), [])
+
+        # 结束一个且没有排队任务时，其余两个应按新份额重启
+        预算.注销("甲")
+        self.assertEqual(sorted(预算.待调整外部任务()), ["丙", "乙"])
+        self.assertEqual(预算.注册外部任务("乙"), 6 * M)
+        self.assertEqual(预算.注册外部任务("丙"), 6 * M)
+        self.assertEqual(预算.待调整外部任务(), [])
+
+        # 高优先级任务加入时预算已分完：先得到 0，等其它进程按更小的份额重启后再申请
+        self.assertEqual(预算.注册外部任务("丁", 1), 0)
+        self.assertEqual(sorted(预算.待调整外部任务()), ["丙", "乙"])
+        self.assertEqual(预算.注册外部任务("乙"), 3 * M)
+        self.assertEqual(预算.注册外部任务("丙"), 3 * M)
+        self.assertEqual(预算.注册外部任务("丁", 1), 6 * M)
+        self.assertEqual(sum(预算.各任务限速().values()), 12 * M)
+
+        with self.assertRaises(ValueError):
+            解析速率("512")
+
+    def test_waiting_low_priority_process_is_not_starved(self):
+        预算 = 带宽预算(4 * M, 并发上限=2)
+        self.assertEqual(预算.注册外部任务("hi", 5), 4 * M)
+        # hi 只比目标多出几十 K，低于 1/8 的调整阈值，但 lo 分到 0 在等，hi 仍要让出
+        self.assertEqual(预算.注册外部任务("lo", 0), 0)
+        self.assertEqual(预算.待调整外部任务(), ["hi"])
+        hi = 预算.注册外部任务("hi", 5)
+        lo = 预算.注册外部任务("lo", 0)
+        self.assertGreater(lo, 0)
+        self.assertLessEqual(hi + lo, 4 * M)
+        self.assertEqual(预算.待调整外部任务(), [])
+
+        # 优先级差到目标不足 1K 时按 1K 分配，仍计入总预算
+        预算 = 带宽预算(512 * 1024, 并发上限=2)
+        预算.注册外部任务("hi", 10)
+        self.assertEqual(预算.注册外部任务("lo", 0), 0)
+        self.assertEqual(预算.待调整外部任务(), ["hi"])
+        hi = 预算.注册外部任务("hi", 10)
+        self.assertEqual(预算.注册外部任务("lo", 0), 1024)
+        self.assertEqual(hi + 1024, 512 * 1024)
+        self.assertEqual(预算.待调整外部任务(), [])
+
+    def test_token_bucket_limits_rate(self):
+        async def 运行():
+            桶 = 令牌桶(速率=2 * M, 突发秒数=0.05)
+            开始 = time.monotonic()
+            for _ in range(16):
+                await 桶.消耗(64 * 1024)
+            return time.monotonic() - 开始
+
+        耗时 = asyncio.run(运行())
+        # 1MB / 2MB/s ≈ 0.5s
+        self.assertGreater(耗时, 0.4)
+        self.assertLess(耗时, 1.0)
+
+
+class _外部进程:
+    """模拟 N_m3u8DL-RE：记录每次启动的 -R，直到被取消或测试让它完成"""
+
+    运行中: dict = {}
+    峰值 = 0
+    完成: dict = {}
+
+    引擎 = "external"
+
+    async def 下载(self, 链接, 保存名称, max_speed=None, **kwargs):
+        类 = type(self)
+        self._停止 = asyncio.Event()
+        完成 = 类.完成.setdefault(保存名称, asyncio.Event())
+        类.运行中[保存名称] = int(max_speed[:-1]) * 1024
+        类.峰值 = max(类.峰值, sum(类.运行中.values()))
+        try:
+            await asyncio.wait(
+                {asyncio.ensure_future(self._停止.wait()), asyncio.ensure_future(完成.wait())},
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+        finally:
+            类.运行中.pop(保存名称, None)
+        return 完成.is_set()
+
+    async def 取消(self):
+        self._停止.set()
+
+
+class TestExternalRebalance(unittest.TestCase):
+    def test_external_processes_split_budget_and_restart_when_one_ends(self):
+        _外部进程.运行中, _外部进程.峰值, _外部进程.完成 = {}, 0, {}
+        原下载器类 = task_manager_mod.M3U8下载器
+        task_manager_mod.M3U8下载器 = _外部进程
+
+        async def 等到(条件):
+            截止 = time.monotonic() + 5.0
+            while not 条件():
+                self.assertLess(time.monotonic(), 截止, f"未达到预期份额: {_外部进程.运行中}")
+                await asyncio.sleep(0.01)
+
+        try:
+            with tempfile.TemporaryDirectory() as 临时目录:
+                async def 运行():
+                    管理器 = 任务管理器(最大并发数=3, 带宽上限="12M")
+                    管理器._任务文件路径 = Path(临时目录) / "tasks.json"
+                    管理器._获取任务日志路径 = lambda 任务ID: Path(临时目录) / "logs" / f"{任务ID}.log"
+                    await 管理器.初始化()
+                    try:
+                        任务列表 = [await 管理器.创建任务(f"https://example.com/{名称}.m3u8", 名称) for 名称 in ("甲", "乙", "丙")]
+                        for 任务 in 任务列表:
+                            await 管理器.开始任务(任务.id)
+                        await 等到(lambda: sorted(_外部进程.运行中.values()) == [4 * M] * 3)
+                        三个 = dict(_外部进程.运行中)
+                        各任务限速 = [(await 管理器.获取任务(任务.id)).speed_limit for 任务 in 任务列表]
+
+                        _外部进程.完成["甲"].set()
+                        await 等到(lambda: sorted(_外部进程.运行中.items()) == [("丙", 6 * M), ("乙", 6 * M)])
+                        日志 = await 管理器.获取任务日志(任务列表[1].id)
+                        for 名称 in ("乙", "丙"):
+                            _外部进程.完成[名称].set()
+                        await 等到(lambda: not _外部进程.运行中)
+                        return 三个, 各任务限速, 日志["lines"]
+                    finally:
+                        await 管理器.关闭()
+
+                三个, 各任务限速, 日志行 = asyncio.run(运行())
+        finally:
+            task_manager_mod.M3U8下载器 = 原下载器类
+
+        self.assertEqual(sum(三个.values()), 12 * M)
+        self.assertEqual(各任务限速, ["4.00 MB/s"] * 3)
+        # 任何时刻各进程的 -R 合计都不超过总预算
+        self.assertLessEqual(_外部进程.峰值, 12 * M)
+        self.assertTrue(any("按限速 6144K 重新启动" in 行 for 行 in 日志行))
+
+
+    def test_low_priority_process_starts_without_waiting_for_high_priority_to_finish(self):
+        _外部进程.运行中, _外部进程.峰值, _外部进程.完成 = {}, 0, {}
+        原下载器类 = task_manager_mod.M3U8下载器
+        task_manager_mod.M3U8下载器 = _外部进程
+        try:
+            with tempfile.TemporaryDirectory() as 临时目录:
+                async def 运行():
+                    管理器 = 任务管理器(最大并发数=2, 带宽上限="4M")
+                    管理器._任务文件路径 = Path(临时目录) / "tasks.json"
+                    管理器._获取任务日志路径 = lambda 任务ID: Path(临时目录) / "logs" / f"{任务ID}.log"
+                    await 管理器.初始化()
+                    try:
+                        高 = await 管理器.创建任务("https://example.com/hi.m3u8", "hi", 优先级=5)
+                        低 = await 管理器.创建任务("https://example.com/lo.m3u8", "lo")
+                        await 管理器.开始任务(高.id)
+                        截止 = time.monotonic() + 5.0
+                        while "hi" not in _外部进程.运行中:
+                            await asyncio.sleep(0.01)
+                        await 管理器.开始任务(低.id)
+                        while set(_外部进程.运行中) != {"hi", "lo"}:
+                            self.assertLess(time.monotonic(), 截止, f"lo 一直在等份额: {_外部进程.运行中}")
+                            await asyncio.sleep(0.01)
+                        运行中 = dict(_外部进程.运行中)
+                        for 名称 in ("hi", "lo"):
+                            _外部进程.完成[名称].set()
+                        return 运行中
+                    finally:
+                        await 管理器.关闭()
+
+                运行中 = asyncio.run(运行())
+        finally:
+            task_manager_mod.M3U8下载器 = 原下载器类
+
+        self.assertGreater(运行中["hi"], 运行中["lo"])
+        self.assertLessEqual(_外部进程.峰值, 4 * M)
+
+
+if __name__ == "__main__":
+    unittest.main()
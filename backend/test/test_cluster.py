@@ -0,0 +1,128 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import backend.core.task_manager as task_manager_mod
+from backend.core.cluster import 加入集群, 集群中继
+from backend.core.task_manager import 任务管理器
+
+
+class _假下载器:
+    async def 下载(self, 链接, 保存名称, 进度回调=None, 日志回调=None, **kwargs):
+        日志回调("假下载器输出")
+        进度回调({"percent": 50.0, "speed": "1.00 MB/s", "eta": "00:01"})
+        await asyncio.sleep(0.3)
+        return True
+
+    async def 取消(self):
+        return
+
+
+async def 等待(条件, 超时=5.0):
+    截止 = asyncio.get_running_loop().time() + 超时
+    while not 条件():
+        if asyncio.get_running_loop().time() > 截止:
+            raise AssertionError("等待超时")
+        await asyncio.sleep(0.02)
+
+
+async def 收集事件(订阅, 终止类型, 超时=5.0):
+    事件列表 = []
+    async with asyncio.timeout(超时):
+        while not any(事件对象.event == 终止类型 for 事件对象 in 事件列表):
+            await 订阅.等待()
+            事件列表.extend(订阅.取出全部())
+    return 事件列表
+
+
+class TestCluster(unittest.TestCase):
+    def test_replica_forwards_writes_and_mirrors_state_and_events(self):
+        原下载器类 = task_manager_mod.M3U8下载器
+        task_manager_mod.M3U8下载器 = _假下载器
+        try:
+            with tempfile.TemporaryDirectory() as 临时目录:
+                日志路径 = lambda 任务ID: Path(临时目录) / "logs" / f"{任务ID}.log"
+
+                def 创建管理器():
+                    管理器 = 任务管理器(进度刷新频率=20)
+                    管理器._任务文件路径 = Path(临时目录) / "tasks.json"
+                    管理器._获取任务日志路径 = 日志路径
+                    return 管理器
+
+                async def 运行():
+                    套接字 = Path(临时目录) / "cluster.sock"
+                    主节点 = await 加入集群(套接字, 创建管理器)
+                    副节点 = await 加入集群(套接字, 创建管理器)
+                    主, 副本 = 主节点.管理器, 副节点.管理器
+                    副本._获取任务日志路径 = 日志路径
+                    结果 = {"角色": (主节点.是主进程, 副节点.是主进程)}
+
+                    主订阅 = await 主.事件总线.订阅(["task.created", "task.completed"])
+                    副订阅 = await 副本.事件总线.订阅(["task.created", "task.completed"])
+                    任务 = await 副本.创建任务("https://example.com/a.m3u8", "甲")
+                    结果["主进程可见"] = 任务.id in 主._任务表
+                    await 副本.开始任务(任务.id)
+                    主事件 = await 收集事件(主订阅, "task.completed")
+                    副事件 = await 收集事件(副订阅, "task.completed")
+                    结果["事件"] = ([(e.event, e.id) for e in 主事件], [(e.event, e.id) for e in 副事件])
+                    结果["副本状态"] = 副本._任务表[任务.id].status
+                    结果["副本进度"] = 副本._任务表[任务.id].progress
+                    await 等待(lambda: 副本.修订号 == 主.修订号)
+                    结果["日志"] = (await 副本.获取任务日志(任务.id))["lines"]
+
+                    for 名称, 调用 in (
+                        ("不存在", 副本.开始任务("不存在")),
+                        ("重名", 副本.创建任务("https://example.com/b.m3u8", "甲")),
+                    ):
+                        try:
+                            await 调用
+                        except Exception as 异常:
+                            结果[名称] = type(异常)
+                    结果["调度"] = await 副本.更新调度设置(并发上限=5)
+                    结果["主进程并发"] = 主.调度器状态()["max_concurrency"]
+
+                    修订 = 副本.修订号
+                    await 副本.删除任务(任务.id)
+                    结果["增量"] = await 副本.查询任务(since=修订)
+
+                    # 中继重启（主进程换了）后副本重连，拿到完整快照
+                    await 主节点._中继.关闭()
+                    await 主.创建任务("https://example.com/c.m3u8", "丙")
+                    新中继 = 集群中继(主, 套接字)
+                    主节点._中继 = 新中继
+                    await 新中继.启动()
+                    await 等待(lambda: 副本.已连接 and {t.name for t in 副本._任务表.values()} == {"丙"})
+                    await 等待(lambda: 副本.修订号 == 主.修订号)
+                    结果["重连后修订号"] = (副本.修订号, 主.修订号)
+
+                    await 副节点.关闭()
+                    await 主节点.关闭()
+                    return 任务, 结果
+
+                任务, 结果 = asyncio.run(运行())
+        finally:
+            task_manager_mod.M3U8下载器 = 原下载器类
+
+        self.assertEqual(结果["角色"], (True, False))
+        self.assertTrue(结果["主进程可见"])
+        # 副本上的事件沿用主进程的编号，客户端换进程重连时 Last-Event-ID 依然有效
+        self.assertEqual(结果["事件"][0], 结果["事件"][1])
+        self.assertEqual([类型 for 类型, _ in 结果["事件"][1]], ["task.created", "task.completed"])
+        self.assertEqual(结果["副本状态"], "completed")
+        self.assertEqual(结果["副本进度"], 100.0)
+        self.assertIn("假下载器输出", 结果["日志"])
+        self.assertIs(结果["不存在"], KeyError)
+        self.assertIs(结果["重名"], ValueError)
+        self.assertEqual(结果["调度"]["max_concurrency"], 5)
+        self.assertEqual(结果["主进程并发"], 5)
+        self.assertEqual(结果["增量"]["deleted"], [任务.id])
+        self.assertFalse(结果["增量"]["full"])
+        self.assertEqual(结果["重连后修订号"][0], 结果["重连后修订号"][1])
+
+
+if __name__ == "__main__":
+    unittest.main()
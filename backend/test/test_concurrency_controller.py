@@ -0,0 +1,57 @@
+import unittest
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from backend.core.concurrency_controller import 自适应并发控制器
+
+
+class _假调度器:
+    """并发上限始终被用满且有任务排队"""
+
+    def __init__(self, 并发上限: int):
+        self.并发上限 = 并发上限
+        self.排队数 = 10
+
+    @property
+    def 运行数(self) -> int:
+        return self.并发上限
+
+    def 设置并发上限(self, 并发上限: int):
+        self.并发上限 = 并发上限
+
+
+def _模拟吞吐(并发: int, 线程数: int) -> float:
+    # 单任务吞吐在 24 线程饱和；超过 4 个并发任务后链路拥塞，总吞吐下降
+    单任务 = min(线程数, 24) * 1.0
+    return 单任务 * min(并发, 4) - 10.0 * max(0, 并发 - 4)
+
+
+class TestAdaptiveController(unittest.TestCase):
+    def test_climbs_to_peak_and_records_decisions(self):
+        调度器 = _假调度器(1)
+        控制器 = 自适应并发控制器(调度器, lambda: 0.0, 初始线程数=4, 最大并发=8, 最大线程数=64)
+        for _ in range(60):
+            控制器.评估(_模拟吞吐(调度器.并发上限, 控制器.线程数))
+
+        self.assertIn(调度器.并发上限, (3, 4, 5))
+        self.assertTrue(24 <= 控制器.线程数 <= 40)
+        决策 = 控制器.决策记录()
+        self.assertEqual(len(决策), 60)
+        self.assertTrue({"increase", "revert"} <= {项["action"] for 项 in 决策})
+        self.assertEqual(决策[0]["dimension"], "concurrency")
+        self.assertEqual((决策[0]["from"], 决策[0]["to"]), (1, 2))
+
+    def test_does_not_raise_concurrency_without_queue(self):
+        调度器 = _假调度器(2)
+        调度器.排队数 = 0
+        控制器 = 自适应并发控制器(调度器, lambda: 0.0, 初始线程数=8)
+        决策 = 控制器.评估(50.0)
+        self.assertEqual(决策["action"], "hold")
+        self.assertEqual(调度器.并发上限, 2)
+        self.assertEqual(控制器.评估(60.0)["dimension"], "threads")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+import asyncio
+import unittest
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from backend.core.event_bus import 事件总线
+
+
+class TestEventBusFilter(unittest.TestCase):
+    def test_filter_by_event_type_and_task(self):
+        async def 运行():
+            总线 = 事件总线()
+            全部 = await 总线.订阅()
+            仪表盘 = await 总线.订阅(事件类型=["task.progress", "task.completed"])
+            详情 = await 总线.订阅(事件类型=["task.log"], 任务ID="t1")
+            单任务全部 = await 总线.订阅(任务ID="t2")
+
+            await 总线.发布("task.log", {"task_id": "t1", "line": "a"})
+            await 总线.发布("task.log", {"task_id": "t2", "line": "b"})
+            await 总线.发布("task.completed", {"task": {"id": "t2"}})
+            await 总线.发布(
+                "task.progress",
+                {"items": [{"task_id": "t1", "percent": 1.0}, {"task_id": "t2", "percent": 2.0}]},
+            )
+            return [队列.取出全部() for 队列 in (全部, 仪表盘, 详情, 单任务全部)]
+
+        全部, 仪表盘, 详情, 单任务全部 = asyncio.run(运行())
+
+        self.assertEqual([e.event for e in 全部], ["task.log", "task.log", "task.completed", "task.progress"])
+        self.assertEqual([e.event for e in 仪表盘], ["task.completed", "task.progress"])
+        self.assertEqual(len(仪表盘[1].data["items"]), 2)
+        self.assertEqual([e.data["line"] for e in 详情], ["a"])
+        self.assertEqual([e.event for e in 单任务全部], ["task.log", "task.completed", "task.progress"])
+        # 批量进度只保留属于该任务的条目
+        self.assertEqual(单任务全部[2].data["items"], [{"task_id": "t2", "percent": 2.0}])
+
+    def test_unsubscribe_removes_index(self):
+        async def 运行():
+            总线 = 事件总线()
+            队列 = await 总线.订阅(事件类型=["task.log"], 任务ID="t1")
+            await 总线.取消订阅(队列)
+            await 总线.发布("task.log", {"task_id": "t1", "line": "a"})
+            return 总线, 队列
+
+        总线, 队列 = asyncio.run(运行())
+        self.assertEqual(总线.订阅者数量, 0)
+        self.assertEqual(总线._索引, {})
+        self.assertTrue(队列.empty())
+
+    def test_encoded_once_and_drained_in_batch(self):
+        async def 运行():
+            总线 = 事件总线()
+            甲 = await 总线.订阅()
+            乙 = await 总线.订阅(事件类型=["task.log"])
+            for 序号 in range(3):
+                总线.立即发布("task.log", {"task_id": "t1", "line": f"行{序号}"})
+            self.assertTrue(await 甲.等待(超时=0.1))
+            甲批次, 乙批次 = 甲.取出全部(), 乙.取出全部()
+            self.assertFalse(await 甲.等待(超时=0.01))
+
+            等待 = asyncio.ensure_future(乙.等待(超时=5.0))
+            await asyncio.sleep(0)
+            总线.关闭()
+            self.assertTrue(await 等待)
+            return 甲批次, 乙批次, 乙
+
+        甲批次, 乙批次, 乙 = asyncio.run(运行())
+        self.assertEqual(len(甲批次), 3)
+        self.assertIs(甲批次[0], 乙批次[0])
+        self.assertIs(甲批次[0].编码, 乙批次[0].编码)
+        self.assertEqual(甲批次[0].编码, 'id: 1\nevent: task.log\ndata: {"task_id": "t1", "line": "行0"}\n\n'.encode("utf-8"))
+        self.assertTrue(乙.已关闭)
+
+
+class TestEventBusConflation(unittest.TestCase):
+    def test_slow_subscriber_keeps_lifecycle_and_latest_progress(self):
+        async def 运行():
+            总线 = 事件总线(日志积压上限=3)
+            订阅 = await 总线.订阅()
+            总线.立即发布("task.progress", {"items": [{"task_id": "t1", "percent": 1.0}, {"task_id": "t2", "percent": 1.0}]})
+            for 序号 in range(5):
+                总线.立即发布("task.log", {"task_id": "t1", "line": str(序号)})
+            总线.立即发布("task.completed", {"task_id": "t2"})
+            for 序号 in range(2, 2000):
+                总线.立即发布("task.progress", {"items": [{"task_id": "t1", "percent": float(序号)}]})
+            统计 = 总线.订阅者统计()[0]
+            return 订阅.取出全部(), 统计, 总线.订阅者统计()[0]
+
+        事件列表, 统计, 取出后 = asyncio.run(运行())
+        self.assertEqual([e.event for e in 事件列表], ["task.progress", "task.log", "task.log", "task.log", "task.completed"])
+        self.assertEqual([e.id for e in 事件列表], sorted(e.id for e in 事件列表))
+        self.assertEqual(
+            事件列表[0].data["items"],
+            [{"task_id": "t1", "percent": 1999.0}, {"task_id": "t2", "percent": 1.0}],
+        )
+        self.assertEqual([e.data["line"] for e in 事件列表[1:4]], ["2", "3", "4"])
+        self.assertEqual(统计["dropped"], 2)
+        self.assertEqual(统计["conflated"], 1998)
+        self.assertEqual(统计["depth"], 5)
+        self.assertEqual(统计["lag_events"], 2005)
+        self.assertEqual(取出后["depth"], 0)
+        self.assertEqual(取出后["lag_events"], 0)
+        self.assertEqual(取出后["delivered"], 5)
+
+
+class TestEventBusReplay(unittest.TestCase):
+    def test_replay_from_last_event_id(self):
+        async def 运行():
+            总线 = 事件总线(回放容量=10)
+            总线.立即发布("task.created", {"task": {"id": "t1"}})
+            总线.立即发布("task.log", {"task_id": "t1", "line": "a"})
+            总线.立即发布("task.progress", {"items": [{"task_id": "t1", "percent": 1.0}, {"task_id": "t2", "percent": 2.0}]})
+            总线.立即发布("task.completed", {"task_id": "t2"})
+            列表页 = await 总线.订阅(事件类型=["task.progress", "task.completed"], 上次事件ID=1)
+            单任务 = await 总线.订阅(任务ID="t1", 上次事件ID=1)
+            已最新 = await 总线.订阅(上次事件ID=总线.最新事件ID)
+            return 列表页.取出全部(), 单任务.取出全部(), 已最新.取出全部()
+
+        列表页, 单任务, 已最新 = asyncio.run(运行())
+        self.assertEqual([e.id for e in 列表页], [3, 4])
+        self.assertEqual([e.id for e in 单任务], [2, 3])
+        self.assertEqual(单任务[1].data["items"], [{"task_id": "t1", "percent": 1.0}])
+        self.assertTrue(单任务[1].编码.startswith(b"id: 3\n"))
+        self.assertEqual(已最新, [])
+
+    def test_snapshot_when_gap_too_old_or_unknown(self):
+        async def 运行():
+            总线 = 事件总线(回放容量=2)
+            总线.设置快照提供者(lambda 任务ID: {"tasks": [{"id": 任务ID or "全部"}]})
+            for 序号 in range(5):
+                总线.立即发布("task.log", {"task_id": "t1", "line": str(序号)})
+            过旧 = await 总线.订阅(事件类型=["task.progress"], 上次事件ID=1)
+            边界 = await 总线.订阅(上次事件ID=3)
+            重启后 = await 总线.订阅(任务ID="t1", 上次事件ID=99)
+            return 过旧.取出全部(), 边界.取出全部(), 重启后.取出全部()
+
+        过旧, 边界, 重启后 = asyncio.run(运行())
+        self.assertEqual([(e.event, e.id) for e in 过旧], [("task.snapshot", 5)])
+        self.assertEqual(过旧[0].data, {"tasks": [{"id": "全部"}]})
+        self.assertEqual([e.id for e in 边界], [4, 5])
+        self.assertEqual(重启后[0].data, {"tasks": [{"id": "t1"}]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import asyncio
+import os
+import stat
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from backend.core.config import Config, read_config_toml, write_config_toml, deep_merge_dict
+from backend.core.downloader import M3U8下载器
+
+# 模拟 N_m3u8DL-RE：首次运行写出 4 个分片中的 2 个后失败退出；再次运行时跳过已有分片并完成
+_假引擎脚本 = """
+import sys
+from pathlib import Path
+
+参数 = sys.argv[2:]
+临时目录 = Path(参数[参数.index("--tmp-dir") + 1]) / 参数[参数.index("--save-name") + 1] / "0____"
+临时目录.mkdir(parents=True, exist_ok=True)
+已有 = len(list(临时目录.glob("*.ts")))
+if 已有 < 2:
+    for 序号 in range(2):
+        (临时目录 / f"{序号:05d}.ts").write_bytes(b"x" * 1024)
+    print("Vid 1280x720 | 0 Kbps ------------------------------ 2/4 50.00% 2.00KB/4.00KB 1.00KBps 00:00:02", flush=True)
+    sys.exit(1)
+print(f"跳过 {已有} 个已下载的分片", flush=True)
+print("Vid 1280x720 | 0 Kbps ------------------------------ 4/4 100.00% 4.00KB/4.00KB 1.00KBps 00:00:00", flush=True)
+"""
+
+
+@unittest.skipIf(os.name == "nt", "假引擎依赖 shebang 脚本")
+class TestExternalResume(unittest.TestCase):
+    def test_restart_reports_progress_from_segments_in_tmp_dir(self):
+        with tempfile.TemporaryDirectory() as 临时目录:
+            根目录 = Path(临时目录)
+            引擎 = 根目录 / "N_m3u8DL-RE"
+            引擎.write_text(f"#!{sys.executable}\n{_假引擎脚本}", encoding="utf-8")
+            引擎.chmod(引擎.stat().st_mode | stat.S_IXUSR)
+            配置数据 = deep_merge_dict(
+                read_config_toml(),
+                {
+                    "downloader": {
+                        "engine": "external",
+                        "m3u8d_path": str(引擎),
+                        "save_dir": str(根目录 / "downloads"),
+                        "tmp_dir": str(根目录 / "downloads_tmp"),
+                        "max_speed": "",
+                    }
+                },
+            )
+            write_config_toml(配置数据, 根目录 / "config.toml")
+            配置 = Config(str(根目录 / "config.toml"))
+
+            async def 下载一次():
+                进度列表, 日志 = [], []
+                成功 = await M3U8下载器(配置=配置).下载(
+                    链接="https://example.com/index.m3u8",
+                    保存名称="resume",
+                    进度回调=进度列表.append,
+                    日志回调=日志.append,
+                )
+                return 成功, 进度列表, 日志
+
+            第一次 = asyncio.run(下载一次())
+            记录文件存在 = (Path(配置.tmp_dir) / "resume.resume.json").exists()
+            第二次 = asyncio.run(下载一次())
+            记录文件已删除 = not (Path(配置.tmp_dir) / "resume.resume.json").exists()
+
+        self.assertFalse(第一次[0])
+        self.assertEqual(第一次[1][0]["percent"], 50.0)
+        self.assertTrue(记录文件存在)
+
+        self.assertTrue(第二次[0])
+        # 引擎输出进度之前先按临时目录里的分片报告真实进度，而不是从 0% 开始
+        self.assertEqual(第二次[1][0]["percent"], 50.0)
+        self.assertEqual(第二次[1][0]["segments_done"], 2)
+        self.assertEqual(第二次[1][0]["bytes_done"], 2048)
+        self.assertTrue(any("续传：临时目录中已有 2 个分片" in 行 for 行 in 第二次[2]))
+        self.assertTrue(记录文件已删除)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from backend.core.log_writer import 任务日志写入器
+
+
+class TestLogWriter(unittest.TestCase):
+    def test_lines_are_batched_per_task_and_handles_closed(self):
+        with tempfile.TemporaryDirectory() as 临时目录:
+            async def 运行():
+                写入器 = 任务日志写入器(lambda 任务ID: Path(临时目录) / f"{任务ID}.log", 刷新间隔=0.05)
+                写入器.启动()
+                for 序号 in range(500):
+                    写入器.写入("a", f"a-{序号}")
+                    写入器.写入("b", f"b-{序号}\r\n")
+                await asyncio.sleep(0.15)
+                句柄数 = len(写入器._句柄)
+                await 写入器.关闭任务("a")
+                剩余句柄 = set(写入器._句柄)
+                await 写入器.关闭()
+                return 句柄数, 剩余句柄, 写入器
+
+            句柄数, 剩余句柄, 写入器 = asyncio.run(运行())
+
+            self.assertEqual(句柄数, 2)
+            self.assertEqual(剩余句柄, {"b"})
+            self.assertEqual(写入器._句柄, {})
+            for 前缀 in ("a", "b"):
+                行列表 = (Path(临时目录) / f"{前缀}.log").read_text(encoding="utf-8").splitlines()
+                self.assertEqual(行列表, [f"{前缀}-{序号}" for 序号 in range(500)])
+
+    def test_flush_makes_queued_lines_visible(self):
+        with tempfile.TemporaryDirectory() as 临时目录:
+            async def 运行():
+                写入器 = 任务日志写入器(lambda 任务ID: Path(临时目录) / f"{任务ID}.log", 刷新间隔=60)
+                写入器.启动()
+                写入器.写入("t", "hello")
+                await 写入器.刷新("t")
+                文本 = (Path(临时目录) / "t.log").read_text(encoding="utf-8")
+                await 写入器.关闭()
+                return 文本
+
+            self.assertEqual(asyncio.run(运行()), "hello\n")
+
+    def test_write_error_on_one_task_keeps_other_tasks_lines(self):
+        with tempfile.TemporaryDirectory() as 临时目录:
+            根目录 = Path(临时目录)
+            # 日志目录的位置被一个普通文件占着，mkdir 失败（与磁盘满、没有权限一样是 OSError）
+            (根目录 / "坏").write_text("", encoding="utf-8")
+
+            def 路径解析(任务ID):
+                return 根目录 / "坏" / f"{任务ID}.log" if 任务ID == "坏" else 根目录 / f"{任务ID}.log"
+
+            async def 运行():
+                写入器 = 任务日志写入器(路径解析, 刷新间隔=60)
+                写入器.写入("好", "first")
+                await 写入器.刷新()
+                写入器.写入("坏", "lost")
+                写入器.写入("好", "second")
+                await 写入器.关闭任务("坏")
+                await 写入器.关闭()
+                return 写入器
+
+            写入器 = asyncio.run(运行())
+            self.assertEqual((根目录 / "好.log").read_text(encoding="utf-8"), "first\nsecond\n")
+            self.assertEqual(写入器.已丢弃行数, 1)
+            self.assertEqual(写入器.写盘错误数, 1)
+            self.assertEqual(写入器._句柄, {})
+
+    def test_full_queue_drops_and_records_count(self):
+        with tempfile.TemporaryDirectory() as 临时目录:
+            async def 运行():
+                写入器 = 任务日志写入器(lambda 任务ID: Path(临时目录) / f"{任务ID}.log", 队列上限=10)
+                for 序号 in range(25):
+                    写入器.写入("t", f"line-{序号}")
+                await 写入器.关闭()
+                return 写入器
+
+            写入器 = asyncio.run(运行())
+            self.assertEqual(写入器.已丢弃行数, 15)
+            行列表 = (Path(临时目录) / "t.log").read_text(encoding="utf-8").splitlines()
+            self.assertEqual(行列表[:10], [f"line-{序号}" for 序号 in range(10)])
+            self.assertIn("丢弃 15 行", 行列表[-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import asyncio
+import re
+import tempfile
+import unittest
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import httpx
+from fastapi import FastAPI
+
+from backend.api import metrics_router
+from backend.core.metrics import 直方图, 指标文本
+from backend.core.task_manager import 任务管理器
+
+_样本行 = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*"(,[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*")*\})? [-+0-9.eEInfa]+$')
+
+
+class TestMetricsText(unittest.TestCase):
+    def test_histogram_and_label_escaping(self):
+        分布 = 直方图((0.1, 1.0))
+        for 值 in (0.05, 0.5, 3.0):
+            分布.观测(值)
+        输出 = 指标文本()
+        输出.直方图("x_seconds", "说明", 分布, {"k": 'a"b'})
+        输出.仪表("g", "说明", [({}, 2.5)])
+        行列表 = 输出.文本().splitlines()
+
+        self.assertIn('m3u8_x_seconds_bucket{k="a\\"b",le="0.1"} 1', 行列表)
+        self.assertIn('m3u8_x_seconds_bucket{k="a\\"b",le="+Inf"} 3', 行列表)
+        self.assertIn('m3u8_x_seconds_sum{k="a\\"b"} 3.55', 行列表)
+        self.assertIn("m3u8_g 2.5", 行列表)
+
+
+class TestMetricsEndpoint(unittest.TestCase):
+    def test_exposition_covers_hot_paths(self):
+        with tempfile.TemporaryDirectory() as 临时目录:
+            async def 运行():
+                管理器 = 任务管理器(最大落盘频率=50)
+                管理器._任务文件路径 = Path(临时目录) / "tasks.json"
+                管理器._获取任务日志路径 = lambda 任务ID: Path(临时目录) / "logs" / f"{任务ID}.log"
+                await 管理器.初始化()
+                甲 = await 管理器.创建任务("https://example.com/a.m3u8", "甲")
+                await 管理器.创建任务("https://example.com/b.m3u8", "乙")
+                async with 管理器._锁:
+                    管理器._设置状态(甲, "running")
+                管理器._创建进度回调(甲.id)({"percent": 10.0, "speed_bps": 2048.0})
+                await 管理器._刷新进度()
+                await asyncio.sleep(0.1)
+
+                应用 = FastAPI()
+                应用.include_router(metrics_router)
+                应用.state.task_manager = 管理器
+                async with httpx.AsyncClient(transport=httpx.ASGITransport(app=应用), base_url="http://test") as 客户端:
+                    响应 = await 客户端.get("/metrics")
+                await 管理器.关闭()
+                return 甲.id, 响应
+
+            甲ID, 响应 = asyncio.run(运行())
+
+        self.assertEqual(响应.status_code, 200)
+        self.assertTrue(响应.headers["content-type"].startswith("text/plain; version=0.0.4"))
+        行列表 = 响应.text.splitlines()
+        for 行 in 行列表:
+            if not 行.startswith("#"):
+                self.assertRegex(行, _样本行)
+
+        self.assertIn('m3u8_tasks{status="pending"} 1', 行列表)
+        self.assertIn('m3u8_tasks{status="running"} 1', 行列表)
+        self.assertIn('m3u8_events_published_total{event="task.created"} 2', 行列表)
+        self.assertIn(f'm3u8_task_download_bytes_per_second{{task_id="{甲ID}"}} 2048', 行列表)
+        self.assertIn("m3u8_download_bytes_per_second 2048", 行列表)
+        for 名称 in (
+            "scheduler_wait_seconds",
+            "lock_wait_seconds",
+            "store_commit_seconds",
+            "subprocess_spawn_seconds",
+            "event_loop_lag_seconds",
+        ):
+            self.assertIn(f"# TYPE m3u8_{名称} histogram", 行列表)
+        提交次数 = int(next(行 for 行 in 行列表 if 行.startswith("m3u8_store_commit_seconds_count")).split()[-1])
+        self.assertGreaterEqual(提交次数, 1)
+        self.assertIn("m3u8_sse_dropped_events_total 0", 行列表)
+
+
+if __name__ == "__main__":
+    unittest.main()
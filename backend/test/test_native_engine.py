@@ -0,0 +1,379 @@
+import asyncio
+import functools
+import hashlib
+import tempfile
+import threading
+import unittest
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from backend.core.config import Config, read_config_toml, write_config_toml, deep_merge_dict
+from backend.core.downloader import M3U8下载器
+from backend.core.native_engine import 解析播放列表, 关闭共享客户端
+from backend.core.segment_cache import 分片缓存, 共享缓存统计
+from backend.core.segment_ledger import 分片账本
+
+
+class _静默处理器(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        return
+
+
+class _记录请求处理器(_静默处理器):
+    def __init__(self, *args, 请求记录: list, **kwargs):
+        self.请求记录 = 请求记录
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        self.请求记录.append(self.path)
+        super().do_GET()
+
+
+class _本地源站:
+    def __init__(self, 根目录: Path, 请求记录: Optional[list] = None):
+        if 请求记录 is None:
+            处理器 = functools.partial(_静默处理器, directory=str(根目录))
+        else:
+            处理器 = functools.partial(_记录请求处理器, directory=str(根目录), 请求记录=请求记录)
+        self.服务器 = ThreadingHTTPServer(("127.0.0.1", 0), 处理器)
+        self.线程 = threading.Thread(target=self.服务器.serve_forever, daemon=True)
+
+    @property
+    def 地址(self) -> str:
+        return f"http://127.0.0.1:{self.服务器.server_address[1]}"
+
+    def __enter__(self):
+        self.线程.start()
+        return self
+
+    def __exit__(self, *args):
+        self.服务器.shutdown()
+        self.服务器.server_close()
+
+
+def _写入测试流(根目录: Path, 分片数: int, 分片大小: int) -> bytes:
+    媒体目录 = 根目录 / "hd"
+    媒体目录.mkdir(parents=True, exist_ok=True)
+    行列表 = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:2"]
+    全部内容 = b""
+    for 序号 in range(分片数):
+        内容 = bytes([序号 % 256]) * 分片大小
+        (媒体目录 / f"seg{序号}.ts").write_bytes(内容)
+        全部内容 += 内容
+        行列表 += ["#EXTINF:2.0,", f"seg{序号}.ts"]
+    行列表.append("#EXT-X-ENDLIST")
+    (媒体目录 / "index.m3u8").write_text("\n".join(行列表), encoding="utf-8")
+    (根目录 / "master.m3u8").write_text(
+        "\n".join(
+            [
+                "#EXTM3U",
+                '#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=640x360,CODECS="avc1.4d401e,mp4a.40.2"',
+                "missing/index.m3u8",
+                "#EXT-X-STREAM-INF:BANDWIDTH=2400000,RESOLUTION=1280x720",
+                "hd/index.m3u8",
+            ]
+        ),
+        encoding="utf-8",
+    )
+    return 全部内容
+
+
+def _创建原生配置(临时目录: Path, **覆盖项) -> Config:
+    配置数据 = deep_merge_dict(
+        read_config_toml(),
+        {
+            "downloader": {
+                "engine": "native",
+                "save_dir": str(临时目录 / "downloads"),
+                "tmp_dir": str(临时目录 / "downloads_tmp"),
+                "thread_count": 4,
+                "download_retry_count": 1,
+                "http_request_timeout": 5,
+                "use_system_proxy": False,
+                "custom_proxy": "",
+                **覆盖项,
+            }
+        },
+    )
+    配置路径 = 临时目录 / "config.toml"
+    write_config_toml(配置数据, 配置路径)
+    return Config(str(配置路径))
+
+
+class TestPlaylistParse(unittest.TestCase):
+    def test_master_playlist_variants(self):
+        文本 = "#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=1000,CODECS=\"a,b\"\nlow.m3u8\n#EXT-X-STREAM-INF:BANDWIDTH=5000\nhigh.m3u8\n"
+        结果 = 解析播放列表(文本, "https://example.com/v/master.m3u8")
+        self.assertTrue(结果.是主播放列表)
+        self.assertEqual(max(结果.变体列表)[1], "https://example.com/v/high.m3u8")
+
+    def test_media_playlist_segments_and_key(self):
+        文本 = "#EXTM3U\n#EXT-X-KEY:METHOD=AES-128,URI=\"k.key\"\n#EXTINF:4.0,\na.ts\n#EXTINF:3.5,\n/abs/b.ts\n"
+        结果 = 解析播放列表(文本, "https://example.com/v/index.m3u8")
+        self.assertEqual([分片.链接 for 分片 in 结果.分片列表], ["https://example.com/v/a.ts", "https://example.com/abs/b.ts"])
+        self.assertAlmostEqual(结果.分片列表[1].时长, 3.5)
+        self.assertEqual(结果.加密方式, "AES-128")
+
+    def test_byterange_and_live_flags(self):
+        点播 = 解析播放列表("#EXTM3U\n#EXTINF:4.0,\na.ts\n#EXT-X-ENDLIST\n", "https://example.com/v/index.m3u8")
+        self.assertTrue(点播.已结束)
+        self.assertFalse(点播.字节范围)
+
+        文本 = "#EXTM3U\n#EXTINF:4.0,\n#EXT-X-BYTERANGE:1000@0\nmain.ts\n#EXTINF:4.0,\n#EXT-X-BYTERANGE:1000\nmain.ts\n"
+        结果 = 解析播放列表(文本, "https://example.com/v/index.m3u8")
+        self.assertTrue(结果.字节范围)
+        self.assertFalse(结果.已结束)
+
+    def test_invalid_playlist_raises(self):
+        with self.assertRaises(ValueError):
+            解析播放列表("<html></html>", "https://example.com/")
+
+
+class TestNativeEngine(unittest.TestCase):
+    def test_rejects_byterange_and_live_playlists(self):
+        with tempfile.TemporaryDirectory() as 临时目录:
+            根目录 = Path(临时目录)
+            源目录 = 根目录 / "origin"
+            源目录.mkdir()
+            (源目录 / "main.ts").write_bytes(b"x" * 2000)
+            (源目录 / "range.m3u8").write_text(
+                "#EXTM3U\n#EXTINF:2.0,\n#EXT-X-BYTERANGE:1000@0\nmain.ts\n"
+                "#EXTINF:2.0,\n#EXT-X-BYTERANGE:1000\nmain.ts\n#EXT-X-ENDLIST\n",
+                encoding="utf-8",
+            )
+            (源目录 / "live.m3u8").write_text("#EXTM3U\n#EXTINF:2.0,\nmain.ts\n", encoding="utf-8")
+            配置 = _创建原生配置(根目录)
+
+            with _本地源站(源目录) as 源站:
+                async def 运行(名称):
+                    日志 = []
+                    try:
+                        下载器 = M3U8下载器(配置=配置)
+                        成功 = await 下载器.下载(链接=f"{源站.地址}/{名称}.m3u8", 保存名称=名称, 日志回调=日志.append)
+                        return 成功, 日志
+                    finally:
+                        await 关闭共享客户端()
+
+                字节范围结果 = asyncio.run(运行("range"))
+                直播结果 = asyncio.run(运行("live"))
+
+            self.assertFalse(字节范围结果[0])
+            self.assertTrue(any("EXT-X-BYTERANGE" in 行 for 行 in 字节范围结果[1]))
+            self.assertFalse(直播结果[0])
+            self.assertTrue(any("直播流" in 行 for 行 in 直播结果[1]))
+            self.assertFalse((Path(配置.save_dir) / "range.ts").exists())
+
+    def test_download_from_local_origin(self):
+        with tempfile.TemporaryDirectory() as 临时目录:
+            根目录 = Path(临时目录)
+            源目录 = 根目录 / "origin"
+            期望内容 = _写入测试流(源目录, 分片数=12, 分片大小=4096)
+            配置 = _创建原生配置(根目录)
+
+            with _本地源站(源目录) as 源站:
+                进度列表 = []
+
+                async def 运行():
+                    try:
+                        下载器 = M3U8下载器(配置=配置)
+                        return await 下载器.下载(
+                            链接=f"{源站.地址}/master.m3u8",
+                            保存名称="native1",
+                            进度回调=进度列表.append,
+                        )
+                    finally:
+                        await 关闭共享客户端()
+
+                成功 = asyncio.run(运行())
+
+            self.assertTrue(成功)
+            输出文件 = Path(配置.save_dir) / "native1.ts"
+            self.assertEqual(输出文件.read_bytes(), 期望内容)
+            self.assertFalse((Path(配置.tmp_dir) / "native1").exists())
+
+            最后 = 进度列表[-1]
+            self.assertEqual(最后["segments_done"], 12)
+            self.assertEqual(最后["segments_total"], 12)
+            self.assertEqual(最后["bytes_done"], len(期望内容))
+            self.assertAlmostEqual(最后["percent"], 100.0)
+            self.assertEqual(len(进度列表), 12)
+
+    def test_missing_segment_fails(self):
+        with tempfile.TemporaryDirectory() as 临时目录:
+            根目录 = Path(临时目录)
+            源目录 = 根目录 / "origin"
+            _写入测试流(源目录, 分片数=3, 分片大小=128)
+            (源目录 / "hd" / "seg1.ts").unlink()
+            配置 = _创建原生配置(根目录)
+            日志 = []
+
+            with _本地源站(源目录) as 源站:
+                async def 运行():
+                    try:
+                        下载器 = M3U8下载器(配置=配置)
+                        return await 下载器.下载(
+                            链接=f"{源站.地址}/hd/index.m3u8", 保存名称="native2", 日志回调=日志.append
+                        )
+                    finally:
+                        await 关闭共享客户端()
+
+                成功 = asyncio.run(运行())
+
+            self.assertFalse(成功)
+            self.assertTrue(any("分片下载失败" in 行 for 行 in 日志))
+
+
+class TestSegmentLedger(unittest.TestCase):
+    def test_resume_skips_completed_segments(self):
+        with tempfile.TemporaryDirectory() as 临时目录:
+            根目录 = Path(临时目录)
+            源目录 = 根目录 / "origin"
+            期望内容 = _写入测试流(源目录, 分片数=8, 分片大小=1024)
+            缺失分片 = 源目录 / "hd" / "seg5.ts"
+            缺失内容 = 缺失分片.read_bytes()
+            缺失分片.unlink()
+            配置 = _创建原生配置(根目录, download_retry_count=0, thread_count=1, segment_cache_max_mb=0)
+            请求记录 = []
+
+            with _本地源站(源目录, 请求记录) as 源站:
+                async def 下载一次(进度列表):
+                    try:
+                        下载器 = M3U8下载器(配置=配置)
+                        return await 下载器.下载(
+                            链接=f"{源站.地址}/hd/index.m3u8", 保存名称="resume", 进度回调=进度列表.append
+                        )
+                    finally:
+                        await 关闭共享客户端()
+
+                第一次成功 = asyncio.run(下载一次([]))
+                # 单线程按顺序下载，seg5 失败时 0-4 已完成；再把 3 号改坏，账本里有记录但大小不符，续传时应重下
+                (Path(配置.tmp_dir) / "resume" / "000003.ts").write_bytes(b"x" * 10)
+                缺失分片.write_bytes(缺失内容)
+                请求记录.clear()
+                进度列表 = []
+                第二次成功 = asyncio.run(下载一次(进度列表))
+
+            self.assertFalse(第一次成功)
+            self.assertTrue(第二次成功)
+            self.assertEqual(sorted(路径 for 路径 in 请求记录 if 路径.endswith(".ts")), ["/hd/seg3.ts", "/hd/seg5.ts", "/hd/seg6.ts", "/hd/seg7.ts"])
+            self.assertEqual((Path(配置.save_dir) / "resume.ts").read_bytes(), 期望内容)
+            # 第一条进度就是真实完成比例，而不是从 0 开始
+            self.assertEqual(进度列表[0]["segments_done"], 4)
+            self.assertAlmostEqual(进度列表[0]["percent"], 50.0)
+            self.assertEqual(进度列表[0]["bytes_done"], 4 * 1024)
+            self.assertEqual(进度列表[-1]["segments_done"], 8)
+
+    def test_fingerprint_change_discards_ledger(self):
+        with tempfile.TemporaryDirectory() as 临时目录:
+            目录 = Path(临时目录)
+            (目录 / "000000.ts").write_bytes(b"abc")
+            账本 = 分片账本(目录, 分片账本.计算指纹(["https://a/x/0.ts?token=1"]))
+            账本.加载()
+            账本.记录("000000.ts", 3, hashlib.sha256(b"abc").hexdigest())
+            账本.关闭()
+
+            同一个流 = 分片账本(目录, 分片账本.计算指纹(["https://a/x/0.ts?token=2"]))
+            同一个流.加载()
+            同一个流.关闭()
+            换了流 = 分片账本(目录, 分片账本.计算指纹(["https://a/y/0.ts"]))
+            换了流.加载()
+            换了流.关闭()
+
+        self.assertTrue(同一个流.已完成("000000.ts"))
+        self.assertEqual(同一个流.已完成字节, 3)
+        self.assertEqual(换了流.已完成数, 0)
+
+    def test_same_size_corrupt_segment_is_not_trusted(self):
+        with tempfile.TemporaryDirectory() as 临时目录:
+            目录 = Path(临时目录)
+            指纹 = 分片账本.计算指纹(["https://a/x/0.ts", "https://a/x/1.ts"])
+            账本 = 分片账本(目录, 指纹)
+            账本.加载()
+            for 名称, 内容 in (("000000.ts", b"abcd"), ("000001.ts", b"efgh")):
+                (目录 / 名称).write_bytes(内容)
+                账本.记录(名称, len(内容), hashlib.sha256(内容).hexdigest())
+            账本.关闭()
+            # 大小不变但内容坏了（写到一半或位翻转）
+            (目录 / "000001.ts").write_bytes(b"efgX")
+
+            续传 = 分片账本(目录, 指纹)
+            续传.加载()
+            续传.关闭()
+            重新加载 = 分片账本(目录, 指纹)
+            重新加载.加载()
+            重新加载.关闭()
+
+        self.assertTrue(续传.已完成("000000.ts"))
+        self.assertFalse(续传.已完成("000001.ts"))
+        # 作废的条目不会留在重写后的账本里
+        self.assertEqual(重新加载.已完成数, 1)
+
+
+class TestSegmentCache(unittest.TestCase):
+    def test_second_task_served_from_cache(self):
+        with tempfile.TemporaryDirectory() as 临时目录:
+            根目录 = Path(临时目录)
+            源目录 = 根目录 / "origin"
+            期望内容 = _写入测试流(源目录, 分片数=6, 分片大小=2048)
+            配置 = _创建原生配置(根目录, segment_cache_max_mb=16)
+            请求记录 = []
+
+            with _本地源站(源目录, 请求记录) as 源站:
+                async def 下载(保存名称, 进度列表):
+                    try:
+                        下载器 = M3U8下载器(配置=配置)
+                        return await 下载器.下载(
+                            链接=f"{源站.地址}/hd/index.m3u8", 保存名称=保存名称, 进度回调=进度列表.append
+                        )
+                    finally:
+                        await 关闭共享客户端()
+
+                首次进度, 二次进度 = [], []
+                self.assertTrue(asyncio.run(下载("first", 首次进度)))
+                首次请求数 = sum(1 for 路径 in 请求记录 if 路径.endswith(".ts"))
+                请求记录.clear()
+                self.assertTrue(asyncio.run(下载("second", 二次进度)))
+
+            self.assertEqual(首次请求数, 6)
+            self.assertEqual([路径 for 路径 in 请求记录 if 路径.endswith(".ts")], [])
+            self.assertEqual((Path(配置.save_dir) / "second.ts").read_bytes(), 期望内容)
+            self.assertEqual((首次进度[-1]["cache_hits"], 首次进度[-1]["cache_misses"]), (0, 6))
+            self.assertEqual((二次进度[-1]["cache_hits"], 二次进度[-1]["cache_misses"]), (6, 0))
+            self.assertEqual(二次进度[-1]["bytes_done"], len(期望内容))
+            全局 = 共享缓存统计()
+            self.assertEqual((全局["hits"], 全局["misses"], 全局["entries"]), (6, 6, 6))
+            self.assertEqual(全局["hit_rate"], 0.5)
+
+    def test_lru_eviction_and_content_dedup(self):
+        with tempfile.TemporaryDirectory() as 临时目录:
+            目录 = Path(临时目录)
+            缓存 = 分片缓存(目录 / "cache", 容量字节=250)
+
+            def 放入(链接, 内容):
+                文件 = 目录 / "src.ts"
+                文件.write_bytes(内容)
+                缓存.放入(链接, 文件, hashlib.sha256(内容).hexdigest(), len(内容))
+
+            放入("https://a/1.ts", b"1" * 100)
+            放入("https://mirror/1.ts?x=1", b"1" * 100)
+            放入("https://a/2.ts", b"2" * 100)
+            # 访问 1 之后再放入 3，被淘汰的应是最久未用的 2
+            self.assertIsNotNone(缓存.取出到("HTTPS://A:443/1.ts", 目录 / "got1.ts"))
+            放入("https://a/3.ts", b"3" * 100)
+
+            统计 = 缓存.统计()
+            self.assertEqual((统计["entries"], 统计["size_bytes"], 统计["evictions"]), (2, 200, 1))
+            self.assertIsNone(缓存.取出到("https://a/2.ts", 目录 / "got2.ts"))
+            self.assertEqual(缓存.取出到("https://mirror/1.ts?x=1", 目录 / "got3.ts")[0], 100)
+            self.assertEqual((目录 / "got3.ts").read_bytes(), b"1" * 100)
+
+            # 重新打开时从磁盘恢复
+            self.assertEqual(分片缓存(目录 / "cache", 容量字节=250).统计()["entries"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import asyncio
+import sys
+import time
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from backend.core.downloader import M3U8下载器
+from backend.core.output_reader import 输出行读取器
+
+
+async def _读完(读取器: 输出行读取器):
+    return [行 async for 行 in 读取器]
+
+
+def _喂入(块列表):
+    流 = asyncio.StreamReader()
+    for 块 in 块列表:
+        流.feed_data(块)
+    流.feed_eof()
+    return 流
+
+
+# 以 \r 原地重绘的进度条，每行开头是写出时的时间戳；1 秒内尽量快地重绘
+_重绘脚本 = r"""
+import sys, time
+截止 = time.time() + 1.0
+次数 = 0
+while time.time() < 截止:
+    次数 += 1
+    百分比 = min(99.0, 次数 / 100.0)
+    sys.stdout.write(f"{time.time():.6f} Vid 1280x720 ---- {次数}/99999 {百分比:.2f}% 1.00MB/9.00MB 1.00MBps 00:00:03\r")
+    sys.stdout.flush()
+sys.stdout.write(f"{time.time():.6f} done {次数}\n")
+"""
+
+
+class TestOutputReader(unittest.TestCase):
+    def test_splits_on_cr_and_lf_across_chunks(self):
+        async def 运行():
+            # 每块 3 字节：ab\r | \ncd | \n\ne | f\rg | h\nt | ail
+            读取器 = 输出行读取器(_喂入([b"ab\r\ncd\n\nef\rgh\ntail"]), 块大小=3)
+            return await _读完(读取器)
+
+        # 跨块的 \r\n 只算一次分隔，空行丢弃，末尾无分隔符的残行也会产出
+        self.assertEqual(asyncio.run(运行()), [b"ab", b"cd", b"ef", b"gh", b"tail"])
+
+    def test_keeps_only_latest_pending_redraw(self):
+        async def 运行():
+            读取器 = 输出行读取器(_喂入([b"log1\n1%\r2%\r3%\rlog2\n4%\r5%\r"]))
+            async for _ in 读取器:
+                break
+            # 第一行取走时后台已读完全部输出；未消费的连续重绘合并为最新一条，日志行全部保留
+            剩余 = await _读完(读取器)
+            return 剩余, 读取器.合并重绘数
+
+        剩余, 合并数 = asyncio.run(运行())
+        self.assertEqual(剩余, [b"3%", b"log2", b"5%"])
+        self.assertEqual(合并数, 3)
+
+    def test_memory_is_capped(self):
+        async def 运行():
+            超长 = b"x" * 300_000
+            日志 = b"".join(f"line{序号}\n".encode() for 序号 in range(100))
+            读取器 = 输出行读取器(_喂入([超长[:100_000], 超长[100_000:], b"\n", 日志]), 行长度上限=1024, 积压上限=10)
+            行列表 = await _读完(读取器)
+            return 行列表, 读取器
+
+        行列表, 读取器 = asyncio.run(运行())
+        # readline() 遇到这种无换行的超长输出会抛出 LimitOverrunError；这里截断并丢弃最旧的积压
+        self.assertTrue(all(len(行) <= 1024 for 行 in 行列表))
+        self.assertEqual(读取器.截断行数, 1)
+        self.assertEqual(len(行列表), 10)
+        self.assertEqual(行列表[-1], b"line99")
+        self.assertGreater(读取器.丢弃行数, 0)
+
+    def test_progress_latency_under_fast_redraw(self):
+        下载器 = object.__new__(M3U8下载器)
+        下载器._当前进程 = None
+        延迟列表 = []
+        进度次数 = []
+        首次送达 = []
+
+        def 日志回调(行: str):
+            if not 首次送达:
+                首次送达.append(time.time())
+            写出时间 = float(行.split()[0])
+            延迟列表.append(time.time() - 写出时间)
+            # 模拟较慢的消费方（日志落盘、事件发布），让输出积压
+            time.sleep(0.002)
+
+        async def 运行():
+            return await 下载器._执行下载(
+                [sys.executable, "-c", _重绘脚本],
+                lambda 进度: 进度次数.append(进度["percent"]),
+                日志回调,
+            )
+
+        开始 = time.time()
+        self.assertTrue(asyncio.run(运行()))
+        self.assertGreater(len(延迟列表), 20)
+        # 进度在进程运行期间持续送达，而不是结束时一次性出现
+        self.assertLess(首次送达[0] - 开始, 0.5)
+        self.assertLess(max(延迟列表), 0.5)
+        self.assertEqual(len(进度次数), len(延迟列表) - 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
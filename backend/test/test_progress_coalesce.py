@@ -0,0 +1,65 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import backend.core.task_manager as task_manager_mod
+from backend.core.task_manager import 任务管理器
+
+
+class _话痨下载器:
+    async def 下载(self, 链接, 保存名称, 进度回调=None, **kwargs):
+        for 次数 in range(1, 2001):
+            进度回调({"percent": 次数 / 20.0, "speed": f"{次数} KB/s", "eta": "00:00:01"})
+            if 次数 % 200 == 0:
+                await asyncio.sleep(0.03)
+        await asyncio.sleep(0.3)
+        return True
+
+    async def 取消(self):
+        return
+
+
+class TestProgressCoalesce(unittest.TestCase):
+    def test_many_updates_become_few_batched_events(self):
+        原下载器类 = task_manager_mod.M3U8下载器
+        task_manager_mod.M3U8下载器 = _话痨下载器
+        try:
+            with tempfile.TemporaryDirectory() as 临时目录:
+                async def 运行():
+                    管理器 = 任务管理器(最大并发数=3, 进度刷新频率=20)
+                    管理器._任务文件路径 = Path(临时目录) / "tasks.json"
+                    管理器._获取任务日志路径 = lambda 任务ID: Path(临时目录) / "logs" / f"{任务ID}.log"
+                    await 管理器.初始化()
+                    订阅队列 = await 管理器.事件总线.订阅()
+
+                    任务列表 = [await 管理器.创建任务("https://example.com/a.m3u8", f"c{序号}") for 序号 in range(3)]
+                    for 任务 in 任务列表:
+                        await 管理器.开始任务(任务.id)
+                    await asyncio.sleep(0.1)
+                    中途任务 = await 管理器.获取任务(任务列表[0].id)
+                    await asyncio.gather(*list(管理器._运行中任务.values()))
+
+                    进度事件 = [事件对象 for 事件对象 in 订阅队列.取出全部() if 事件对象.event == "task.progress"]
+                    await 管理器.关闭()
+                    return 中途任务, 进度事件
+
+                中途任务, 进度事件 = asyncio.run(运行())
+
+            self.assertGreater(中途任务.progress, 0.0)
+            # 3 个任务共 6000 次回调，合并后只应产生少量批量事件
+            self.assertLess(len(进度事件), 60)
+            任务ID集合 = {项["task_id"] for 事件对象 in 进度事件 for 项 in 事件对象.data["items"]}
+            self.assertEqual(len(任务ID集合), 3)
+            self.assertTrue(any(len(事件对象.data["items"]) > 1 for 事件对象 in 进度事件))
+            最后百分比 = {项["task_id"]: 项["percent"] for 事件对象 in 进度事件 for 项 in 事件对象.data["items"]}
+            self.assertTrue(all(百分比 == 100.0 for 百分比 in 最后百分比.values()))
+        finally:
+            task_manager_mod.M3U8下载器 = 原下载器类
+
+
+if __name__ == "__main__":
+    unittest.main()
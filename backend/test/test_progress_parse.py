@@ -5,6 +5,7 @@ import unittest
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
 
 from backend.core.downloader import M3U8下载器
+from backend.core.progress_parser import 输出解码器, 解析进度行
 
 
 class TestProgressParse(unittest.TestCase):
@@ -17,6 +18,7 @@ class TestProgressParse(unittest.TestCase):
         self.assertIsNotNone(结果)
         self.assertAlmostEqual(结果["percent"], 70.77, places=2)
         self.assertEqual(结果["speed"], "15.76 MB/s")
+        self.assertAlmostEqual(结果["speed_bps"], 15.76 * 1024 * 1024)
         self.assertEqual(结果["eta"], "00:00:03")
 
     def test_parse_new_format_with_trailing_slash(self):
@@ -40,6 +42,42 @@ class TestProgressParse(unittest.TestCase):
         结果 = self.下载器._解析进度(行)
         self.assertIsNone(结果)
 
+    def test_structured_fields(self):
+        结果 = 解析进度行(
+            "Vid 1280x720 | 0 Kbps ------------------------------ 523/739 70.77% 153.99MB/228.51MB 15.76MBps 00:00:03"
+        )
+        self.assertEqual((结果["segments_done"], 结果["segments_total"]), (523, 739))
+        self.assertEqual(结果["bytes_done"], int(153.99 * 1024 ** 2))
+        self.assertEqual(结果["bytes_total"], int(228.51 * 1024 ** 2))
+        # 旧格式没有分片与大小信息
+        结果 = 解析进度行("[12:34:56] 45.5% | 2.5 MB/s | ETA: 00:02:30")
+        self.assertIsNone(结果["segments_done"])
+        self.assertIsNone(结果["bytes_total"])
+        # 刚开始时大小未知，显示为 -/-
+        结果 = 解析进度行("Vid 1920x1080 ---------- 0/10 0.00% -/- 0Bps --:--:--")
+        self.assertEqual(结果["speed_bps"], 0.0)
+        self.assertEqual(结果["segments_total"], 10)
+        self.assertIsNone(结果["eta"])
+
+    def test_non_progress_lines(self):
+        self.assertIsNone(解析进度行("12:01:02.345 INFO : Save Name: 测试视频"))
+        self.assertIsNone(解析进度行("Vid 1280x720 | 0 Kbps ---------- 523/739 --%"))
+
+    def test_decoder_detects_encoding_once(self):
+        解码器 = 输出解码器()
+        self.assertEqual(解码器.解码(b"Vid 1280x720 1.00%"), "Vid 1280x720 1.00%")
+        self.assertIsNone(解码器.编码)
+        self.assertEqual(解码器.解码("保存名称".encode("gbk")), "保存名称")
+        self.assertEqual(解码器.编码, "gbk")
+        # 选定后不再逐行试探
+        self.assertEqual(解码器.解码("完成".encode("gbk")), "完成")
+
+        解码器 = 输出解码器()
+        self.assertEqual(解码器.解码("下载完成".encode("utf-8")), "下载完成")
+        self.assertEqual(解码器.编码, "utf-8")
+        # 被长度上限截断的残缺字符不会抛出
+        self.assertEqual(解码器.解码("完成".encode("utf-8")[:-1]), "完\ufffd")
+
 
 if __name__ == "__main__":
     unittest.main()
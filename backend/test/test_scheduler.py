@@ -0,0 +1,121 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import backend.core.task_manager as task_manager_mod
+from backend.core.scheduler import 任务调度器
+from backend.core.task_manager import 任务管理器
+
+
+class TestScheduler(unittest.TestCase):
+    def test_priority_then_fifo_and_live_limit(self):
+        async def 运行():
+            调度器 = 任务调度器(并发上限=1)
+            顺序 = []
+            await 调度器.获取("占位")
+
+            async def 等待名额(任务ID, 优先级):
+                await 调度器.获取(任务ID, 优先级)
+                顺序.append(任务ID)
+
+            协程列表 = []
+            for 任务ID, 优先级 in [("低1", 0), ("低2", 0), ("高", 5), ("低3", 0)]:
+                协程列表.append(asyncio.create_task(等待名额(任务ID, 优先级)))
+                await asyncio.sleep(0)
+            位置 = {任务ID: 调度器.排队位置(任务ID) for 任务ID in ["高", "低1", "低2", "低3"]}
+
+            调度器.设置优先级("低3", 1)
+            调度器.释放("占位")
+            await asyncio.sleep(0)
+            调度器.释放("高")
+            await asyncio.sleep(0)
+            首批 = list(顺序)
+
+            调度器.设置并发上限(3)
+            await asyncio.gather(*协程列表)
+            return 位置, 首批, 顺序, 调度器.运行数
+
+        位置, 首批, 顺序, 运行数 = asyncio.run(运行())
+        self.assertEqual(位置, {"高": 1, "低1": 2, "低2": 3, "低3": 4})
+        self.assertEqual(首批, ["高", "低3"])
+        self.assertEqual(顺序, ["高", "低3", "低1", "低2"])
+        self.assertEqual(运行数, 3)
+
+    def test_cancel_while_queued_leaves_queue(self):
+        async def 运行():
+            调度器 = 任务调度器(并发上限=1)
+            await 调度器.获取("a")
+            等待 = asyncio.create_task(调度器.获取("b"))
+            await asyncio.sleep(0)
+            排队数 = 调度器.排队数
+            等待.cancel()
+            _ = await asyncio.gather(等待, return_exceptions=True)
+            调度器.释放("a")
+            return 排队数, 调度器.排队数, 调度器.运行数
+
+        self.assertEqual(asyncio.run(运行()), (1, 0, 0))
+
+    def test_invalid_limit_rejected(self):
+        with self.assertRaises(ValueError):
+            任务调度器(并发上限=0)
+
+
+class _阻塞下载器:
+    放行: asyncio.Event
+
+    async def 下载(self, 链接, 保存名称, **kwargs):
+        await _阻塞下载器.放行.wait()
+        return True
+
+    async def 取消(self):
+        return
+
+
+class TestManagerScheduling(unittest.TestCase):
+    def test_queue_position_and_priority_in_task_model(self):
+        原下载器类 = task_manager_mod.M3U8下载器
+        task_manager_mod.M3U8下载器 = _阻塞下载器
+        try:
+            with tempfile.TemporaryDirectory() as 临时目录:
+                async def 运行():
+                    _阻塞下载器.放行 = asyncio.Event()
+                    管理器 = 任务管理器(最大并发数=1)
+                    管理器._任务文件路径 = Path(临时目录) / "tasks.json"
+                    管理器._获取任务日志路径 = lambda 任务ID: Path(临时目录) / "logs" / f"{任务ID}.log"
+                    await 管理器.初始化()
+                    甲 = await 管理器.创建任务("https://example.com/a.m3u8", "甲")
+                    乙 = await 管理器.创建任务("https://example.com/a.m3u8", "乙")
+                    丙 = await 管理器.创建任务("https://example.com/a.m3u8", "丙", 优先级=1)
+                    for 任务 in (甲, 乙, 丙):
+                        await 管理器.开始任务(任务.id)
+                    await asyncio.sleep(0.05)
+                    排队 = (甲.queue_position, 乙.queue_position, 丙.queue_position)
+
+                    await 管理器.设置任务优先级(乙.id, 3)
+                    调整后 = (乙.queue_position, 丙.queue_position)
+
+                    状态 = 管理器.设置并发上限(3)
+                    await asyncio.sleep(0.05)
+                    放开后 = (乙.queue_position, 丙.queue_position, 管理器.调度器状态()["running"])
+
+                    _阻塞下载器.放行.set()
+                    await asyncio.gather(*list(管理器._运行中任务.values()))
+                    await 管理器.关闭()
+                    return 排队, 调整后, 状态, 放开后
+
+                排队, 调整后, 状态, 放开后 = asyncio.run(运行())
+        finally:
+            task_manager_mod.M3U8下载器 = 原下载器类
+
+        self.assertEqual(排队, (None, 2, 1))
+        self.assertEqual(调整后, (1, 2))
+        self.assertEqual(状态["max_concurrency"], 3)
+        self.assertEqual(放开后, (None, None, 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import backend.core.task_manager as task_manager_mod
+from backend.core.task_manager import 任务管理器
+from backend.core.watchdog import 卡死看门狗
+
+
+class _可能卡住的下载器:
+    """名称以 "卡" 开头的任务报告一次进度后不再推进，直到被取消；"卡重试" 期间持续输出重试日志"""
+
+    async def 下载(self, 链接, 保存名称, 进度回调=None, 日志回调=None, **kwargs):
+        self._停止 = asyncio.Event()
+        if not 保存名称.startswith("卡"):
+            进度回调({"percent": 50.0})
+            await asyncio.sleep(0.05)
+            return True
+        进度回调({"percent": 10.0})
+        while not self._停止.is_set():
+            if 保存名称 == "卡重试":
+                日志回调("WARN: 分片 12 下载失败，重试中")
+            try:
+                await asyncio.wait_for(self._停止.wait(), timeout=0.05)
+            except asyncio.TimeoutError:
+                pass
+        return False
+
+    async def 取消(self):
+        self._停止.set()
+
+
+async def _无回调(任务ID, 原因):
+    return
+
+
+class TestStallWatchdog(unittest.TestCase):
+    def test_detects_idle_and_stuck_progress(self):
+        看门狗 = 卡死看门狗(_无回调, 无输出超时=10.0, 无进展超时=30.0)
+        for 任务ID in ("静默", "重试", "合并", "正常"):
+            看门狗.开始跟踪(任务ID, 现在=0.0)
+            看门狗.记录进度(任务ID, {"percent": 10.0}, 现在=0.0)
+        看门狗.记录进度("合并", {"percent": 100.0}, 现在=1.0)
+        for 秒 in range(1, 40):
+            看门狗.记录输出("重试", 现在=float(秒))
+            看门狗.记录进度("正常", {"percent": 10.0 + 秒}, 现在=float(秒))
+
+        self.assertEqual(看门狗.检查(现在=9.0), [])
+        卡死 = dict(看门狗.检查(现在=12.0))
+        self.assertEqual(list(卡死), ["静默"])
+        self.assertEqual(卡死["静默"], "超过 10 秒没有任何输出")
+        # 重试日志让输出不断，但进度不推进；合并阶段（100%）不算卡死；每个任务只报告一次
+        卡死 = dict(看门狗.检查(现在=39.0))
+        self.assertEqual(list(卡死), ["重试"])
+        self.assertEqual(卡死["重试"], "超过 30 秒进度没有推进")
+        self.assertEqual(看门狗.卡死次数, 2)
+
+    def _运行管理器(self, 场景, **参数):
+        原下载器类 = task_manager_mod.M3U8下载器
+        task_manager_mod.M3U8下载器 = _可能卡住的下载器
+        try:
+            with tempfile.TemporaryDirectory() as 临时目录:
+                async def 运行():
+                    管理器 = 任务管理器(最大并发数=1, **参数)
+                    管理器._任务文件路径 = Path(临时目录) / "tasks.json"
+                    管理器._获取任务日志路径 = lambda 任务ID: Path(临时目录) / "logs" / f"{任务ID}.log"
+                    await 管理器.初始化()
+                    try:
+                        return await 场景(管理器)
+                    finally:
+                        await 管理器.关闭()
+
+                return asyncio.run(运行())
+        finally:
+            task_manager_mod.M3U8下载器 = 原下载器类
+
+    async def _等待(self, 管理器, 任务ID, 状态, 超时=5.0):
+        截止 = asyncio.get_running_loop().time() + 超时
+        while (await 管理器.获取任务(任务ID)).status != 状态:
+            self.assertLess(asyncio.get_running_loop().time(), 截止, f"{任务ID} 未进入 {状态}")
+            await asyncio.sleep(0.02)
+        return await 管理器.获取任务(任务ID)
+
+    def test_stalled_task_releases_slot_and_is_requeued_then_failed(self):
+        async def 场景(管理器):
+            卡住 = await 管理器.创建任务("https://example.com/a.m3u8", "卡住")
+            正常 = await 管理器.创建任务("https://example.com/b.m3u8", "正常")
+            await 管理器.开始任务(卡住.id)
+            await asyncio.sleep(0.05)
+            await 管理器.开始任务(正常.id)
+            await asyncio.sleep(0.02)
+            self.assertEqual(管理器.调度器状态()["queued"], [正常.id])
+
+            # 唯一的名额被卡住的任务占着；看门狗停止它后排队的任务拿到名额完成
+            await self._等待(管理器, 正常.id, "completed")
+            # 重新排队后再次卡死，超过重排次数标记为失败
+            最终 = await self._等待(管理器, 卡住.id, "failed")
+            日志 = await 管理器.获取任务日志(卡住.id)
+            return 最终, 日志["lines"], 管理器.调度器状态()
+
+        最终, 日志行, 调度状态 = self._运行管理器(场景, 卡死无输出超时=0.2, 卡死最大重排次数=1)
+        self.assertIn("超过 0.2 秒没有任何输出", 最终.error)
+        self.assertIn("重新排队 1 次后仍无进展", 最终.error)
+        self.assertEqual(sum("卡死检测" in 行 for 行 in 日志行), 2)
+        self.assertEqual(sum("卡死后重新排队" in 行 for 行 in 日志行), 1)
+        self.assertEqual(调度状态["running"], 0)
+        self.assertEqual(调度状态["watchdog"]["stalled_total"], 2)
+
+    def test_fail_action_on_stuck_progress(self):
+        async def 场景(管理器):
+            任务 = await 管理器.创建任务("https://example.com/a.m3u8", "卡重试")
+            await 管理器.开始任务(任务.id)
+            return await self._等待(管理器, 任务.id, "failed")
+
+        结果 = self._运行管理器(场景, 卡死无输出超时=5.0, 卡死无进展超时=0.3, 卡死处理="fail")
+        self.assertTrue(结果.error.startswith("下载卡死"))
+        self.assertIn("超过 0.3 秒进度没有推进", 结果.error)
+
+    def test_remote_job_waiting_for_worker_is_not_stalled(self):
+        with tempfile.TemporaryDirectory() as 临时目录:
+            async def 运行():
+                管理器 = 任务管理器(工作节点模式="remote", 卡死无输出超时=0.3, 卡死处理="fail")
+                管理器._任务文件路径 = Path(临时目录) / "tasks.json"
+                管理器._获取任务日志路径 = lambda 任务ID: Path(临时目录) / "logs" / f"{任务ID}.log"
+                await 管理器.初始化()
+                try:
+                    任务 = await 管理器.创建任务("https://example.com/a.m3u8", "远程")
+                    await 管理器.开始任务(任务.id)
+                    # 没有工作节点：作业在协调器里等待，超过空闲窗口也不算卡死
+                    await asyncio.sleep(0.8)
+                    等待中 = (await 管理器.获取任务(任务.id)).model_copy()
+                    跟踪中 = dict(管理器.调度器状态()["watchdog"]["tasks"])
+
+                    # 节点租走作业后不再心跳，从租出时起计时
+                    await 管理器.协调器.租用("宕机节点", 1)
+                    租出后跟踪 = list(管理器.调度器状态()["watchdog"]["tasks"])
+                    return 等待中, 跟踪中, 租出后跟踪, await self._等待(管理器, 任务.id, "failed")
+                finally:
+                    await 管理器.关闭()
+
+            等待中, 跟踪中, 租出后跟踪, 结果 = asyncio.run(运行())
+
+        self.assertEqual(等待中.status, "running")
+        self.assertIsNone(等待中.error)
+        self.assertEqual(跟踪中, {})
+        self.assertEqual(租出后跟踪, [结果.id])
+        self.assertIn("超过 0.3 秒没有任何输出", 结果.error)
+
+
+if __name__ == "__main__":
+    unittest.main()
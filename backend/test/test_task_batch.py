@@ -0,0 +1,93 @@
+import asyncio
+import json
+import tempfile
+import unittest
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import httpx
+from fastapi import FastAPI
+
+import backend.core.task_manager as task_manager_mod
+from backend.api import tasks_router
+from backend.core.task_manager import 任务管理器
+
+
+class _阻塞下载器:
+    async def 下载(self, 链接, 保存名称, **kwargs):
+        await asyncio.sleep(30)
+        return True
+
+    async def 取消(self):
+        return
+
+
+class TestTaskBatch(unittest.TestCase):
+    def test_ndjson_create_and_bulk_control(self):
+        原下载器类 = task_manager_mod.M3U8下载器
+        task_manager_mod.M3U8下载器 = _阻塞下载器
+        try:
+            with tempfile.TemporaryDirectory() as 临时目录:
+                async def 运行():
+                    管理器 = 任务管理器()
+                    管理器._任务文件路径 = Path(临时目录) / "tasks.json"
+                    管理器._获取任务日志路径 = lambda 任务ID: Path(临时目录) / "logs" / f"{任务ID}.log"
+                    await 管理器.初始化()
+                    订阅 = await 管理器.事件总线.订阅()
+                    应用 = FastAPI()
+                    应用.include_router(tasks_router)
+                    应用.state.task_manager = 管理器
+
+                    async def 逐行发送():
+                        for 序号 in range(5):
+                            行 = json.dumps({"url": f"https://example.com/{序号}.m3u8", "name": f"批量{序号}"})
+                            # 故意把一行拆成两块发送
+                            yield 行[:10].encode()
+                            yield (行[10:] + "\n").encode()
+
+                    传输 = httpx.ASGITransport(app=应用)
+                    async with httpx.AsyncClient(transport=传输, base_url="http://test") as 客户端:
+                        创建 = await 客户端.post(
+                            "/api/tasks/batch", content=逐行发送(), headers={"Content-Type": "application/x-ndjson"}
+                        )
+                        重名 = await 客户端.post(
+                            "/api/tasks/batch",
+                            json=[{"url": "https://example.com/x.m3u8", "name": "新的"}, {"url": "u", "name": "批量1"}],
+                        )
+                        任务ID列表 = [任务["id"] for 任务 in 创建.json()["tasks"]]
+                        开始 = await 客户端.post("/api/tasks/batch/start", json={"ids": 任务ID列表[:3]})
+                        暂停 = await 客户端.post("/api/tasks/batch/pause", json=任务ID列表[:2])
+                        缺失 = await 客户端.post("/api/tasks/batch/delete", json=["不存在", 任务ID列表[0]])
+                        删除 = await 客户端.post("/api/tasks/batch/delete", json={"ids": 任务ID列表[:4]})
+
+                    剩余任务 = await 管理器.列出任务()
+                    事件列表 = 订阅.取出全部()
+                    await 管理器.关闭()
+                    return 创建, 重名, 开始, 暂停, 缺失, 删除, 剩余任务, 事件列表
+
+                创建, 重名, 开始, 暂停, 缺失, 删除, 剩余任务, 事件列表 = asyncio.run(运行())
+        finally:
+            task_manager_mod.M3U8下载器 = 原下载器类
+
+        self.assertEqual(创建.status_code, 200)
+        self.assertEqual(创建.json()["count"], 5)
+        self.assertEqual(重名.status_code, 400)
+        self.assertEqual(重名.json()["detail"], [{"index": 1, "error": "保存名称已存在，请换一个名称"}])
+        self.assertEqual([任务["status"] for 任务 in 开始.json()["tasks"]], ["running"] * 3)
+        self.assertEqual([任务["status"] for 任务 in 暂停.json()["tasks"]], ["paused"] * 2)
+        self.assertEqual(缺失.status_code, 404)
+        self.assertEqual(删除.json(), {"success": True, "count": 4})
+        self.assertEqual([任务.name for 任务 in 剩余任务], ["批量4"])
+
+        # 每次批量操作只发布一条事件
+        self.assertEqual(
+            [(事件.event, 事件.data.get("action")) for 事件 in 事件列表],
+            [("task.created", None), ("task.batch", "start"), ("task.batch", "pause"), ("task.batch", "delete")],
+        )
+        self.assertEqual(len(事件列表[0].data["tasks"]), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import backend.core.task_manager as task_manager_mod
+from backend.core.task_manager import 任务管理器, 规范化链接
+
+
+class _按名称结束下载器:
+    async def 下载(self, 链接, 保存名称, **kwargs):
+        await asyncio.sleep(0.01)
+        return not 保存名称.startswith("失败")
+
+    async def 取消(self):
+        return
+
+
+def _按扫描重算(管理器):
+    状态索引 = {}
+    for 任务 in 管理器._任务表.values():
+        状态索引.setdefault(任务.status, set()).add(任务.id)
+    return (
+        dict(管理器._名称索引),
+        {任务.name: 任务.id for 任务 in 管理器._任务表.values()},
+        {状态: 集合 for 状态, 集合 in 管理器._状态索引.items() if 集合},
+        状态索引,
+    )
+
+
+class TestTaskIndexes(unittest.TestCase):
+    def test_normalized_url(self):
+        self.assertEqual(
+            规范化链接("HTTPS://Example.COM:443/a.m3u8?b=2&a=1#frag"),
+            规范化链接("https://example.com/a.m3u8?a=1&b=2"),
+        )
+        self.assertNotEqual(规范化链接("https://example.com:8443/a.m3u8"), 规范化链接("https://example.com/a.m3u8"))
+
+    def test_indexes_follow_every_transition(self):
+        原下载器类 = task_manager_mod.M3U8下载器
+        task_manager_mod.M3U8下载器 = _按名称结束下载器
+        try:
+            with tempfile.TemporaryDirectory() as 临时目录:
+                async def 运行():
+                    管理器 = 任务管理器()
+                    管理器._任务文件路径 = Path(临时目录) / "tasks.json"
+                    管理器._获取任务日志路径 = lambda 任务ID: Path(临时目录) / "logs" / f"{任务ID}.log"
+                    await 管理器.初始化()
+                    成功 = await 管理器.创建任务("https://Example.com/a.m3u8?x=1", "成功")
+                    失败 = await 管理器.创建任务("https://example.com/a.m3u8?x=1#t", "失败")
+                    保留 = await 管理器.创建任务("https://example.com/b.m3u8", "保留")
+                    with self.assertRaises(ValueError):
+                        await 管理器.创建任务("https://example.com/c.m3u8", "保留")
+
+                    await 管理器.批量开始任务([成功.id, 失败.id])
+                    await asyncio.gather(*list(管理器._运行中任务.values()))
+                    同链接 = await 管理器.按链接查找任务("https://example.com/a.m3u8?x=1")
+                    统计 = 管理器.统计()
+                    await 管理器.删除任务(失败.id)
+                    结果 = (同链接, 统计, 管理器.统计(), _按扫描重算(管理器), 管理器._链接索引)
+                    await 管理器.关闭()
+                    return 成功, 失败, 保留, 结果
+
+                成功, 失败, 保留, (同链接, 统计, 删除后, 重算, 链接索引) = asyncio.run(运行())
+        finally:
+            task_manager_mod.M3U8下载器 = 原下载器类
+
+        self.assertEqual({任务.id for 任务 in 同链接}, {成功.id, 失败.id})
+        self.assertEqual(统计["tasks"], 3)
+        self.assertEqual((统计["by_status"]["completed"], 统计["by_status"]["failed"]), (1, 1))
+        self.assertEqual(删除后["by_status"]["failed"], 0)
+        名称索引, 期望名称索引, 状态索引, 期望状态索引 = 重算
+        self.assertEqual(名称索引, 期望名称索引)
+        self.assertEqual(名称索引, {"成功": 成功.id, "保留": 保留.id})
+        self.assertEqual(状态索引, 期望状态索引)
+        self.assertEqual(sorted(len(集合) for 集合 in 链接索引.values()), [1, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import backend.core.task_manager as task_manager_mod
+from backend.core.locks import 任务锁表
+from backend.core.task_manager import 任务管理器
+
+
+class _阻塞下载器:
+    async def 下载(self, 链接, 保存名称, **kwargs):
+        await asyncio.sleep(30)
+        return True
+
+    async def 取消(self):
+        return
+
+
+class TestTaskLocks(unittest.TestCase):
+    def test_held_task_lock_does_not_block_other_tasks(self):
+        原下载器类 = task_manager_mod.M3U8下载器
+        task_manager_mod.M3U8下载器 = _阻塞下载器
+        try:
+            with tempfile.TemporaryDirectory() as 临时目录:
+                async def 运行():
+                    管理器 = 任务管理器()
+                    管理器._任务文件路径 = Path(临时目录) / "tasks.json"
+                    管理器._获取任务日志路径 = lambda 任务ID: Path(临时目录) / "logs" / f"{任务ID}.log"
+                    await 管理器.初始化()
+                    甲 = await 管理器.创建任务("https://example.com/a.m3u8", "甲")
+                    乙 = await 管理器.创建任务("https://example.com/b.m3u8", "乙")
+
+                    放开 = asyncio.Event()
+
+                    async def 占住甲():
+                        async with 管理器._任务锁.get(甲.id):
+                            await 放开.wait()
+
+                    占用 = asyncio.create_task(占住甲())
+                    await asyncio.sleep(0)
+                    # 甲的锁被长时间持有时，乙的操作、查询和新建任务都不受影响
+                    await asyncio.wait_for(管理器.开始任务(乙.id), timeout=1.0)
+                    await asyncio.wait_for(管理器.暂停任务(乙.id), timeout=1.0)
+                    await asyncio.wait_for(管理器.获取任务(甲.id), timeout=1.0)
+                    await asyncio.wait_for(管理器.列出任务(), timeout=1.0)
+                    await asyncio.wait_for(管理器.创建任务("https://example.com/c.m3u8", "丙"), timeout=1.0)
+
+                    开始甲 = asyncio.create_task(管理器.开始任务(甲.id))
+                    await asyncio.sleep(0.05)
+                    被阻塞 = not 开始甲.done()
+                    放开.set()
+                    await 占用
+                    await 开始甲
+                    await 管理器.暂停任务(甲.id)
+                    统计 = 管理器.锁统计()
+                    await 管理器.关闭()
+                    return 被阻塞, 统计
+
+                被阻塞, 统计 = asyncio.run(运行())
+        finally:
+            task_manager_mod.M3U8下载器 = 原下载器类
+
+        self.assertTrue(被阻塞)
+        self.assertEqual(统计["task"]["contended"], 1)
+        self.assertGreaterEqual(统计["task"]["wait_seconds_max"], 0.04)
+        self.assertGreaterEqual(统计["task"]["hold_seconds_max"], 0.04)
+        self.assertEqual(统计["task"]["wait_buckets"]["+Inf"], 统计["task"]["acquisitions"])
+        self.assertEqual(统计["global"]["contended"], 0)
+
+    def test_multi_lock_skips_removed_tasks(self):
+        async def 运行():
+            锁表 = 任务锁表()
+            for 任务ID in ("b", "a", "c"):
+                锁表.创建(任务ID)
+            锁表.移除("c")
+            async with 锁表.多个(["c", "b", "a", "b"]) as 已加锁:
+                状态 = [锁表.get(任务ID).locked() for 任务ID in 已加锁]
+            return 已加锁, 状态, 锁表.get("a").locked()
+
+        self.assertEqual(asyncio.run(运行()), (["a", "b"], [True, True], False))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import asyncio
+import json
+import tempfile
+import unittest
+from pathlib import Path
+import sys
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import backend.core.task_store as task_store_mod
+from backend.core.task_manager import 任务管理器
+
+
+class TestTaskPersister(unittest.TestCase):
+    def test_many_changes_are_coalesced_into_few_writes(self):
+        with tempfile.TemporaryDirectory() as 临时目录:
+            写入次数 = []
+            原写入 = task_store_mod._原子写入JSON
+
+            def 计数写入(路径, 数据):
+                写入次数.append(len(数据))
+                原写入(路径, 数据)
+
+            async def 运行():
+                管理器 = 任务管理器(最大落盘频率=5)
+                管理器._任务文件路径 = Path(临时目录) / "tasks.json"
+                await 管理器.初始化()
+                for 序号 in range(50):
+                    await 管理器.创建任务("https://example.com/a.m3u8", f"p{序号}")
+                await asyncio.sleep(0.3)
+                await 管理器.关闭()
+
+            with mock.patch.object(task_store_mod, "_原子写入JSON", 计数写入):
+                asyncio.run(运行())
+
+            self.assertLessEqual(len(写入次数), 4)
+            self.assertEqual(写入次数[-1], 50)
+            数据 = json.loads((Path(临时目录) / "tasks.json").read_text(encoding="utf-8"))
+            self.assertEqual(len(数据), 50)
+
+    def test_failed_write_keeps_previous_file(self):
+        with tempfile.TemporaryDirectory() as 临时目录:
+            路径 = Path(临时目录) / "tasks.json"
+            路径.write_text('[{"id": "old"}]', encoding="utf-8")
+
+            with mock.patch.object(task_store_mod.os, "replace", side_effect=OSError("disk full")):
+                with self.assertRaises(OSError):
+                    task_store_mod._原子写入JSON(路径, [{"id": "new"}])
+
+            self.assertEqual(路径.read_text(encoding="utf-8"), '[{"id": "old"}]')
+            self.assertEqual(sorted(p.name for p in Path(临时目录).iterdir()), ["tasks.json"])
+
+    def test_corrupt_file_is_kept_aside_on_load(self):
+        with tempfile.TemporaryDirectory() as 临时目录:
+            路径 = Path(临时目录) / "tasks.json"
+            路径.write_text('[{"id": "t1", "url": "x"', encoding="utf-8")
+
+            async def 运行():
+                管理器 = 任务管理器()
+                管理器._任务文件路径 = 路径
+                await 管理器.初始化()
+                await 管理器.创建任务("https://example.com/a.m3u8", "after")
+                await 管理器.关闭()
+
+            asyncio.run(运行())
+
+            备份列表 = list(Path(临时目录).glob("tasks.json.corrupt-*"))
+            self.assertEqual(len(备份列表), 1)
+            self.assertEqual(备份列表[0].read_text(encoding="utf-8"), '[{"id": "t1", "url": "x"')
+            self.assertEqual([项["name"] for 项 in json.loads(路径.read_text(encoding="utf-8"))], ["after"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import httpx
+from fastapi import FastAPI
+
+from backend.api import tasks_router
+from backend.core.task_manager import 任务管理器
+
+
+class TestTaskQuery(unittest.TestCase):
+    def test_pagination_filters_fields_and_conditional_get(self):
+        with tempfile.TemporaryDirectory() as 临时目录:
+            async def 运行():
+                管理器 = 任务管理器()
+                管理器._任务文件路径 = Path(临时目录) / "tasks.json"
+                管理器._获取任务日志路径 = lambda 任务ID: Path(临时目录) / "logs" / f"{任务ID}.log"
+                await 管理器.初始化()
+                任务列表 = [await 管理器.创建任务(f"https://example.com/{序号}.m3u8", f"任务{序号}") for 序号 in range(7)]
+                async with 管理器._锁:
+                    管理器._设置状态(任务列表[1], "failed")
+                    管理器._设置状态(任务列表[4], "failed")
+                应用 = FastAPI()
+                应用.include_router(tasks_router)
+                应用.state.task_manager = 管理器
+                结果 = {}
+
+                传输 = httpx.ASGITransport(app=应用)
+                async with httpx.AsyncClient(transport=传输, base_url="http://test") as 客户端:
+                    全部 = await 客户端.get("/api/tasks")
+                    结果["全部"] = 全部
+                    结果["304"] = await 客户端.get("/api/tasks", headers={"If-None-Match": 全部.headers["etag"]})
+
+                    页码列表, 游标 = [], None
+                    while True:
+                        参数 = {"limit": 3, "fields": "name"}
+                        if 游标:
+                            参数["cursor"] = 游标
+                        页 = (await 客户端.get("/api/tasks", params=参数)).json()
+                        页码列表.append(页["items"])
+                        游标 = 页["next_cursor"]
+                        if not 游标:
+                            break
+                    结果["分页"] = 页码列表
+                    结果["失败"] = (await 客户端.get("/api/tasks", params={"status": "failed"})).json()
+                    结果["时间"] = (
+                        await 客户端.get(
+                            "/api/tasks", params={"created_after": 任务列表[5].created_at.isoformat()}
+                        )
+                    ).json()
+                    结果["坏游标"] = await 客户端.get("/api/tasks", params={"cursor": "!!"})
+
+                    修订号 = int(全部.headers["etag"][3:-1])
+                    await 管理器.删除任务(任务列表[0].id)
+                    await 管理器.设置任务优先级(任务列表[2].id, 2)
+                    结果["未命中"] = await 客户端.get("/api/tasks", headers={"If-None-Match": 全部.headers["etag"]})
+                    结果["增量"] = (await 客户端.get("/api/tasks", params={"since": 修订号})).json()
+                    结果["过旧"] = (await 客户端.get("/api/tasks", params={"since": 0, "limit": 100})).json()
+
+                await 管理器.关闭()
+                return 任务列表, 结果
+
+            任务列表, 结果 = asyncio.run(运行())
+
+        self.assertEqual(结果["全部"].status_code, 200)
+        self.assertEqual(len(结果["全部"].json()), 7)
+        self.assertEqual(结果["304"].status_code, 304)
+        self.assertEqual(结果["304"].content, b"")
+
+        self.assertEqual([len(页) for 页 in 结果["分页"]], [3, 3, 1])
+        self.assertEqual(
+            [项["name"] for 页 in 结果["分页"] for 项 in 页], [f"任务{序号}" for 序号 in range(7)]
+        )
+        self.assertEqual(set(结果["分页"][0][0]), {"id", "name"})
+        self.assertEqual([项["name"] for 项 in 结果["失败"]], ["任务1", "任务4"])
+        self.assertEqual([项["name"] for 项 in 结果["时间"]], ["任务5", "任务6"])
+        self.assertEqual(结果["坏游标"].status_code, 400)
+
+        self.assertEqual(结果["未命中"].status_code, 200)
+        self.assertEqual([项["name"] for 项 in 结果["增量"]["items"]], ["任务2"])
+        self.assertEqual(结果["增量"]["deleted"], [任务列表[0].id])
+        self.assertFalse(结果["增量"]["full"])
+        self.assertTrue(结果["过旧"]["full"])
+        self.assertEqual(len(结果["过旧"]["items"]), 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import asyncio
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from backend.core.task_manager import 任务管理器
+from backend.core.task_store import SQLite任务存储
+
+
+class _记录提交的SQLite存储(SQLite任务存储):
+    def __init__(self, 路径):
+        super().__init__(路径)
+        self.提交记录 = []
+
+    def 提交(self, 变更, 删除, 全量=None):
+        self.提交记录.append((len(变更), list(删除), 全量))
+        super().提交(变更, 删除, 全量)
+
+
+class TestSQLiteTaskStore(unittest.TestCase):
+    def test_roundtrip_and_row_level_updates(self):
+        with tempfile.TemporaryDirectory() as 临时目录:
+            数据库 = Path(临时目录) / "tasks.db"
+
+            async def 第一次运行():
+                存储 = _记录提交的SQLite存储(数据库)
+                管理器 = 任务管理器(存储=存储, 最大落盘频率=50)
+                管理器._获取任务日志路径 = lambda 任务ID: Path(临时目录) / "logs" / f"{任务ID}.log"
+                await 管理器.初始化()
+                任务列表 = [await 管理器.创建任务("https://example.com/a.m3u8", f"s{序号}") for 序号 in range(200)]
+                await asyncio.sleep(0.1)
+                存储.提交记录.clear()
+
+                管理器._创建进度回调(任务列表[5].id)({"percent": 42.0, "speed": "1 MB/s", "eta": "00:00:09"})
+                管理器._任务表[任务列表[5].id].status = "running"
+                await 管理器._刷新进度()
+                await asyncio.sleep(0.1)
+                await 管理器.删除任务(任务列表[7].id)
+                await 管理器.关闭()
+                return 存储.提交记录, 任务列表
+
+            提交记录, 任务列表 = asyncio.run(第一次运行())
+
+            # 每次提交只涉及变更的行，不会携带全量快照
+            self.assertTrue(all(全量 is None for _, _, 全量 in 提交记录))
+            self.assertEqual(sum(行数 for 行数, _, _ in 提交记录), 1 + 1)
+            self.assertEqual([删除 for _, 删除, _ in 提交记录 if 删除], [[任务列表[7].id]])
+
+            async def 第二次运行():
+                管理器 = 任务管理器(存储=SQLite任务存储(数据库))
+                await 管理器.初始化()
+                结果 = await 管理器.列出任务()
+                await 管理器.关闭()
+                return 结果
+
+            结果 = asyncio.run(第二次运行())
+            self.assertEqual(len(结果), 199)
+            按ID = {任务.id: 任务 for 任务 in 结果}
+            self.assertNotIn(任务列表[7].id, 按ID)
+            self.assertAlmostEqual(按ID[任务列表[5].id].progress, 42.0)
+            # 重启后 running 任务被置为 paused
+            self.assertEqual(按ID[任务列表[5].id].status, "paused")
+
+    def test_wal_mode_and_extra_fields(self):
+        with tempfile.TemporaryDirectory() as 临时目录:
+            数据库 = Path(临时目录) / "tasks.db"
+            存储 = SQLite任务存储(数据库)
+            存储.提交(
+                [
+                    {
+                        "id": "t1",
+                        "url": "https://example.com/a.m3u8",
+                        "name": "a",
+                        "status": "pending",
+                        "progress": 0.0,
+                        "created_at": "2026-01-01T00:00:00Z",
+                        "custom_field": {"k": 1},
+                    }
+                ],
+                [],
+            )
+            self.assertEqual(存储.加载()[0]["custom_field"], {"k": 1})
+            存储.关闭()
+
+            连接 = sqlite3.connect(str(数据库))
+            try:
+                self.assertEqual(连接.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            finally:
+                连接.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
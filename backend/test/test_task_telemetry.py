@@ -0,0 +1,108 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import httpx
+from fastapi import FastAPI
+
+from backend.api import tasks_router
+from backend.core.task_manager import 任务管理器
+from backend.core.telemetry import 任务遥测
+
+_MB = 1024 ** 2
+
+
+class TestTaskTelemetry(unittest.TestCase):
+    def test_ring_buffer_is_bounded_and_sampled_at_interval(self):
+        遥测 = 任务遥测(容量=10, 采样间隔=1.0)
+        for 序号 in range(100):
+            # 每 0.25 秒一条进度，采样间隔 1 秒
+            遥测.记录({"percent": 序号 * 0.5, "speed_bps": _MB}, 现在=序号 * 0.25)
+        self.assertEqual(遥测.采样数, 10)
+        self.assertEqual(遥测.降采样(120)[-1]["percent"], 48.0)
+
+    def test_eta_from_ewma_ignores_short_spikes(self):
+        遥测 = 任务遥测(平滑秒数=10.0)
+        已下载 = 0
+        for 秒 in range(30):
+            已下载 += _MB
+            遥测.记录({"percent": 1.0, "speed_bps": _MB, "bytes_done": 已下载, "bytes_total": 100 * _MB}, 现在=float(秒))
+        self.assertAlmostEqual(遥测.预计剩余秒数(), 70.0, delta=0.5)
+
+        # 一次 50 倍的瞬时速度只让 ETA 小幅变化，不会跳到 1-2 秒
+        遥测.记录({"percent": 1.0, "speed_bps": 50 * _MB, "bytes_done": 已下载, "bytes_total": 100 * _MB}, 现在=30.0)
+        self.assertGreater(遥测.预计剩余秒数(), 10.0)
+
+    def test_eta_falls_back_to_percent_rate(self):
+        遥测 = 任务遥测()
+        for 秒 in range(5):
+            遥测.记录({"percent": 秒 * 10.0}, 现在=float(秒))
+        # 每秒 10%，剩余 60%
+        self.assertAlmostEqual(遥测.预计剩余秒数(), 6.0, places=3)
+
+    def test_downsample_averages_speed(self):
+        遥测 = 任务遥测(采样间隔=0)
+        for 序号 in range(100):
+            遥测.记录({"percent": float(序号), "speed_bps": float(序号 % 2), "segments_done": 序号}, 现在=float(序号))
+        点列表 = 遥测.降采样(10)
+        self.assertEqual(len(点列表), 10)
+        self.assertTrue(all(点["speed_bps"] == 0.5 for 点 in 点列表))
+        self.assertEqual(点列表[-1]["segments_done"], 99)
+
+
+class TestTaskMetricsEndpoint(unittest.TestCase):
+    def test_metrics_endpoint_serves_series_and_ewma_eta(self):
+        with tempfile.TemporaryDirectory() as 临时目录:
+            async def 运行():
+                管理器 = 任务管理器(遥测采样间隔=0)
+                管理器._任务文件路径 = Path(临时目录) / "tasks.json"
+                管理器._获取任务日志路径 = lambda 任务ID: Path(临时目录) / "logs" / f"{任务ID}.log"
+                await 管理器.初始化()
+                任务 = await 管理器.创建任务("https://example.com/a.m3u8", "甲")
+                async with 管理器._锁:
+                    管理器._设置状态(任务, "running")
+                for 序号 in range(1, 6):
+                    管理器._创建进度回调(任务.id)(
+                        {
+                            "percent": 序号 * 10.0,
+                            "speed": "1.00 MB/s",
+                            "speed_bps": float(_MB),
+                            "eta": "99:99:99",
+                            "segments_done": 序号,
+                            "segments_total": 10,
+                            "bytes_done": 序号 * _MB,
+                            "bytes_total": 10 * _MB,
+                        }
+                    )
+                    await 管理器._刷新进度()
+
+                应用 = FastAPI()
+                应用.include_router(tasks_router)
+                应用.state.task_manager = 管理器
+                async with httpx.AsyncClient(transport=httpx.ASGITransport(app=应用), base_url="http://test") as 客户端:
+                    响应 = await 客户端.get(f"/api/tasks/{任务.id}/metrics", params={"points": 3})
+                    缺失 = await 客户端.get("/api/tasks/nope/metrics")
+                eta = 管理器._任务表[任务.id].eta
+                await 管理器.关闭()
+                return 响应, 缺失, eta
+
+            响应, 缺失, eta = asyncio.run(运行())
+
+        self.assertEqual(响应.status_code, 200)
+        数据 = 响应.json()
+        self.assertEqual(数据["sample_count"], 5)
+        self.assertEqual(len(数据["samples"]), 3)
+        self.assertEqual(数据["samples"][-1]["bytes_done"], 5 * _MB)
+        self.assertEqual(数据["samples"][-1]["segments_total"], 10)
+        self.assertAlmostEqual(数据["eta_seconds"], 5.0, places=1)
+        # Task.eta 由 EWMA 推算，不再照搬引擎的字符串
+        self.assertEqual(eta, "00:00:05")
+        self.assertEqual(缺失.status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
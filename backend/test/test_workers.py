@@ -0,0 +1,201 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import httpx
+from fastapi import FastAPI
+
+import backend.worker as worker_mod
+from backend.api import workers_router
+from backend.core.task_manager import 任务管理器
+from backend.core.worker_coordinator import 租约协调器
+from backend.worker import 工作节点
+
+
+class 假下载器:
+    实例 = []
+
+    def __init__(self):
+        self.已取消 = asyncio.Event()
+        self.保存名称 = None
+        self.节点 = None
+        假下载器.实例.append(self)
+
+    async def 下载(self, 链接, 保存名称, 线程数=None, 进度回调=None, 日志回调=None, **其他参数):
+        self.保存名称 = 保存名称
+        self.节点 = asyncio.current_task().get_name()
+        日志回调(f"节点开始 {保存名称}")
+        进度回调({"percent": 30.0, "speed": "1.00 MB/s", "eta": "00:10"})
+        if not 保存名称.startswith("慢"):
+            return True
+        await self.已取消.wait()
+        return False
+
+    async def 取消(self):
+        self.已取消.set()
+
+
+async def 等待(条件, 超时=5.0):
+    截止 = asyncio.get_running_loop().time() + 超时
+    while not 条件():
+        if asyncio.get_running_loop().time() > 截止:
+            raise AssertionError("等待超时")
+        await asyncio.sleep(0.02)
+
+
+class TestRemoteWorkers(unittest.TestCase):
+    def test_distribution_progress_expiry_and_cancel(self):
+        原下载器 = worker_mod.M3U8下载器
+        worker_mod.M3U8下载器 = 假下载器
+        假下载器.实例 = []
+        try:
+            with tempfile.TemporaryDirectory() as 临时目录:
+                async def 运行():
+                    管理器 = 任务管理器(工作节点模式="remote", 租约秒数=1.0)
+                    管理器._任务文件路径 = Path(临时目录) / "tasks.json"
+                    管理器._获取任务日志路径 = lambda 任务ID: Path(临时目录) / "logs" / f"{任务ID}.log"
+                    await 管理器.初始化()
+                    协调器 = 管理器.协调器
+                    应用 = FastAPI()
+                    应用.include_router(workers_router)
+                    应用.state.task_manager = 管理器
+                    结果 = {}
+
+                    # 宕机节点租走作业后不再心跳，租约过期后应由其它节点接手
+                    孤儿 = await 管理器.创建任务("https://example.com/orphan.m3u8", "孤儿")
+                    await 管理器.开始任务(孤儿.id)
+                    结果["宕机节点租用"] = await 协调器.租用("宕机节点", 1, 2.0)
+
+                    传输 = httpx.ASGITransport(app=应用)
+                    async with httpx.AsyncClient(transport=传输, base_url="http://test") as 客户端:
+                        节点列表 = [
+                            工作节点("http://test", 名称, 容量=1, 长轮询秒数=0.5, 进度间隔=0.05, 客户端=客户端)
+                            for 名称 in ("节点A", "节点B")
+                        ]
+                        运行任务 = [asyncio.create_task(节点.运行()) for 节点 in 节点列表]
+                        try:
+                            慢1 = await 管理器.创建任务("https://example.com/slow1.m3u8", "慢1")
+                            慢2 = await 管理器.创建任务("https://example.com/slow2.m3u8", "慢2")
+                            await 管理器.开始任务(慢1.id)
+                            await 管理器.开始任务(慢2.id)
+
+                            await 等待(lambda: 管理器._任务表[慢1.id].progress == 30.0 and 管理器._任务表[慢2.id].progress == 30.0)
+                            结果["分配"] = (await 客户端.get("/api/workers")).json()
+
+                            await 管理器.暂停任务(慢1.id)
+                            await 等待(lambda: 管理器._任务表[孤儿.id].status == "completed")
+                            await 管理器.暂停任务(慢2.id)
+                            结果["未知租约"] = await 客户端.post(
+                                "/api/workers/heartbeat", json={"worker_id": "节点A", "lease_id": "不存在"}
+                            )
+                        finally:
+                            for 任务 in 运行任务:
+                                任务.cancel()
+                            _ = await asyncio.gather(*运行任务, return_exceptions=True)
+
+                    结果["状态"] = {任务ID: 管理器._任务表[任务ID].status for 任务ID in (孤儿.id, 慢1.id, 慢2.id)}
+                    结果["重新分配"] = 协调器.重新分配次数
+                    await 管理器.关闭()
+                    结果["孤儿日志"] = 管理器._获取任务日志路径(孤儿.id).read_text(encoding="utf-8")
+
+                    未启用 = FastAPI()
+                    未启用.include_router(workers_router)
+                    未启用.state.task_manager = 任务管理器()
+                    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=未启用), base_url="http://test") as 客户端:
+                        结果["未启用"] = await 客户端.get("/api/workers")
+                    return 孤儿, 慢1, 慢2, 结果
+
+                孤儿, 慢1, 慢2, 结果 = asyncio.run(运行())
+        finally:
+            worker_mod.M3U8下载器 = 原下载器
+
+        self.assertEqual([作业["task_id"] for 作业 in 结果["宕机节点租用"]], [孤儿.id])
+
+        # 两个节点各承载一个慢任务，容量为 1 时不会集中到同一节点
+        各节点任务 = {
+            节点: {租约["task_id"] for 租约 in 信息["leases"]} for 节点, 信息 in 结果["分配"]["workers"].items()
+        }
+        self.assertEqual(各节点任务["节点A"] | 各节点任务["节点B"], {慢1.id, 慢2.id})
+        self.assertEqual(len(各节点任务["节点A"]), 1)
+        # 快照时宕机节点的租约可能已过期，作业在等待空闲节点
+        self.assertIn(孤儿.id, 各节点任务.get("宕机节点", set()) | set(结果["分配"]["pending"]))
+
+        # 暂停经心跳传到节点，节点停止本地下载后腾出的容量用来接手过期的作业
+        慢任务下载器 = [下载器 for 下载器 in 假下载器.实例 if 下载器.保存名称.startswith("慢")]
+        self.assertTrue(all(下载器.已取消.is_set() for 下载器 in 慢任务下载器))
+        self.assertEqual(结果["状态"], {孤儿.id: "completed", 慢1.id: "paused", 慢2.id: "paused"})
+        self.assertEqual(结果["重新分配"], 1)
+        self.assertIn("宕机节点 租约过期", 结果["孤儿日志"])
+        self.assertIn("节点开始 孤儿", 结果["孤儿日志"])
+
+        self.assertEqual(结果["未知租约"].status_code, 409)
+        self.assertEqual(结果["未启用"].status_code, 503)
+
+
+    def test_downloader_setup_failure_is_reported(self):
+        class 缺少引擎的下载器:
+            def __init__(self):
+                raise FileNotFoundError("找不到 N_m3u8DL-RE: /opt/N_m3u8DL-RE")
+
+        原下载器 = worker_mod.M3U8下载器
+        worker_mod.M3U8下载器 = 缺少引擎的下载器
+        try:
+            with tempfile.TemporaryDirectory() as 临时目录:
+                async def 运行():
+                    管理器 = 任务管理器(工作节点模式="remote", 租约秒数=30.0)
+                    管理器._任务文件路径 = Path(临时目录) / "tasks.json"
+                    管理器._获取任务日志路径 = lambda 任务ID: Path(临时目录) / "logs" / f"{任务ID}.log"
+                    await 管理器.初始化()
+                    应用 = FastAPI()
+                    应用.include_router(workers_router)
+                    应用.state.task_manager = 管理器
+                    任务 = await 管理器.创建任务("https://example.com/a.m3u8", "缺引擎")
+                    await 管理器.开始任务(任务.id)
+                    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=应用), base_url="http://test") as 客户端:
+                        节点 = 工作节点("http://test", "节点A", 容量=1, 长轮询秒数=0.2, 客户端=客户端)
+                        节点任务 = asyncio.create_task(节点.运行())
+                        try:
+                            # 不等 30 秒租约过期，节点立即报告失败
+                            await 等待(lambda: 管理器._任务表[任务.id].status == "failed", 超时=3.0)
+                        finally:
+                            节点任务.cancel()
+                            _ = await asyncio.gather(节点任务, return_exceptions=True)
+                    await 管理器.关闭()
+                    return 管理器._获取任务日志路径(任务.id).read_text(encoding="utf-8")
+
+                日志 = asyncio.run(运行())
+        finally:
+            worker_mod.M3U8下载器 = 原下载器
+
+        self.assertIn("找不到 N_m3u8DL-RE", 日志)
+
+    def test_expired_lease_fails_after_max_attempts(self):
+        async def 运行():
+            协调器 = 租约协调器(租约秒数=30.0, 最大尝试次数=2)
+            日志 = []
+            提交 = asyncio.create_task(协调器.提交("t1", "https://example.com/a.m3u8", "甲", {}, 日志回调=日志.append))
+            次数 = 0
+            while not 提交.done():
+                作业列表 = await 协调器.租用("宕机节点", 1, 0.5)
+                if not 作业列表:
+                    break
+                次数 += 1
+                # 节点租到后立刻崩溃，不心跳也不上报
+                协调器._租约[作业列表[0]["lease_id"]].到期时间 = 0.0
+                协调器.回收过期()
+                await asyncio.sleep(0)
+            return 次数, await 提交, 日志, 协调器.重新分配次数
+
+        次数, 成功, 日志, 重新分配 = asyncio.run(运行())
+        self.assertEqual(次数, 2)
+        self.assertFalse(成功)
+        self.assertEqual(重新分配, 1)
+        self.assertIn("已租出 2 次均未完成", 日志[-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
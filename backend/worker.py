@@ -0,0 +1,224 @@
+"""
+远程工作节点
+向协调服务（workers.mode = "remote" 的后端）长轮询租用作业，在本机用 M3U8下载器 下载，
+按固定间隔心跳回传进度与日志并续约；协调端要求取消或租约已失效时停止本地下载
+
+    python -m backend.worker --coordinator http://host:8000 --id node-1 --capacity 2
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import socket
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+项目根目录 = Path(__file__).resolve().parent.parent
+if str(项目根目录) not in sys.path:
+    sys.path.insert(0, str(项目根目录))
+
+import httpx
+
+from backend.core.downloader import M3U8下载器
+
+
+class 租约失效(Exception):
+    """协调端不再承认该租约（已过期被回收给其它节点，或服务已重启）"""
+
+
+class 工作节点:
+    def __init__(
+        self,
+        协调地址: str,
+        节点ID: str,
+        容量: int = 1,
+        令牌: str = "",
+        长轮询秒数: float = 20.0,
+        进度间隔: float = 1.0,
+        客户端: Optional[httpx.AsyncClient] = None,
+    ):
+        self.节点ID = 节点ID
+        self.容量 = max(1, int(容量))
+        self._长轮询秒数 = max(0.0, float(长轮询秒数))
+        self._进度间隔 = max(0.05, float(进度间隔))
+        请求头 = {"X-Worker-Token": 令牌} if 令牌 else {}
+        self._自建客户端 = 客户端 is None
+        self._客户端 = 客户端 or httpx.AsyncClient(
+            base_url=协调地址.rstrip("/"),
+            headers=请求头,
+            timeout=httpx.Timeout(10.0, read=self._长轮询秒数 + 10.0),
+        )
+        if 客户端 is not None and 请求头:
+            self._客户端.headers.update(请求头)
+        self._执行中: Set[asyncio.Task] = set()
+
+    async def 运行(self):
+        """持续租用并执行作业，直到被取消；取消时停止所有本地下载（租约随后在协调端过期）"""
+        try:
+            while True:
+                空闲 = self.容量 - len(self._执行中)
+                if 空闲 <= 0:
+                    _ = await asyncio.wait(self._执行中, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+                try:
+                    作业列表 = await self._租用(空闲)
+                except httpx.HTTPError as 异常:
+                    self._输出(f"租用失败: {异常}，稍后重试")
+                    await asyncio.sleep(2.0)
+                    continue
+                for 作业 in 作业列表:
+                    执行 = asyncio.create_task(self._执行作业(作业), name=f"worker-job-{作业['task_id']}")
+                    self._执行中.add(执行)
+                    执行.add_done_callback(self._执行中.discard)
+        finally:
+            for 执行 in list(self._执行中):
+                执行.cancel()
+            if self._执行中:
+                _ = await asyncio.gather(*self._执行中, return_exceptions=True)
+            if self._自建客户端:
+                await self._客户端.aclose()
+
+    async def _租用(self, 数量: int) -> List[Dict[str, Any]]:
+        响应 = await self._客户端.post(
+            "/api/workers/lease",
+            json={"worker_id": self.节点ID, "capacity": 数量, "wait": self._长轮询秒数},
+        )
+        响应.raise_for_status()
+        return list(响应.json().get("jobs") or [])
+
+    async def _上报(self, 路径: str, 内容: Dict[str, Any]) -> Dict[str, Any]:
+        响应 = await self._客户端.post(路径, json={"worker_id": self.节点ID, **内容})
+        if 响应.status_code in (404, 409):
+            raise 租约失效(响应.text)
+        响应.raise_for_status()
+        return 响应.json()
+
+    async def _执行作业(self, 作业: Dict[str, Any]):
+        租约ID = 作业["lease_id"]
+        参数 = dict(作业.get("options") or {})
+        线程数 = 参数.pop("thread_count", None)
+        心跳间隔 = min(float(作业.get("lease_seconds") or 30.0) / 3, self._进度间隔)
+        最新进度: Dict[str, Any] = {}
+        日志缓冲: List[str] = []
+
+        def 进度回调(进度: Dict[str, Any]):
+            最新进度.clear()
+            最新进度.update(进度)
+
+        def 日志回调(消息: str):
+            日志缓冲.append(str(消息))
+
+        def 取出日志() -> List[str]:
+            行列表 = 日志缓冲[:]
+            日志缓冲.clear()
+            return 行列表
+
+        self._输出(f"开始 {作业['task_id']}（{作业['name']}，第 {作业.get('attempt', 1)} 次）")
+        try:
+            下载器 = M3U8下载器()
+        except Exception as 异常:
+            # 例如本节点 engine = "external" 却没有 N_m3u8DL-RE；立即报告失败，而不是等租约过期被反复租用
+            self._输出(f"无法创建下载器: {异常}")
+            try:
+                _ = await self._上报(
+                    "/api/workers/complete",
+                    {"lease_id": 租约ID, "success": False, "error": str(异常), "logs": 取出日志()},
+                )
+            except (httpx.HTTPError, 租约失效) as 上报异常:
+                self._输出(f"上报结果失败: {上报异常}")
+            return
+        下载 = asyncio.create_task(
+            下载器.下载(
+                链接=作业["url"],
+                保存名称=作业["name"],
+                线程数=线程数,
+                进度回调=进度回调,
+                日志回调=日志回调,
+                **参数,
+            )
+        )
+        try:
+            while not 下载.done():
+                _ = await asyncio.wait({下载}, timeout=心跳间隔)
+                if 下载.done():
+                    break
+                进度 = dict(最新进度) or None
+                最新进度.clear()
+                try:
+                    回复 = await self._上报(
+                        "/api/workers/heartbeat",
+                        {"lease_id": 租约ID, "progress": 进度, "logs": 取出日志()},
+                    )
+                except httpx.HTTPError as 异常:
+                    # 暂时连不上协调端时继续下载；恢复后若租约已过期会收到 409 再停止
+                    self._输出(f"心跳失败: {异常}")
+                    continue
+                if 回复.get("cancel"):
+                    self._输出(f"协调端取消 {作业['task_id']}")
+                    await self._停止下载(下载器, 下载)
+
+            错误 = None
+            try:
+                成功 = bool(下载.result())
+            except asyncio.CancelledError:
+                成功, 错误 = False, "已取消"
+            except Exception as 异常:
+                成功, 错误 = False, str(异常)
+            try:
+                _ = await self._上报(
+                    "/api/workers/complete",
+                    {"lease_id": 租约ID, "success": 成功, "error": 错误, "logs": 取出日志()},
+                )
+            except (httpx.HTTPError, 租约失效) as 异常:
+                self._输出(f"上报结果失败: {异常}")
+            self._输出(f"结束 {作业['task_id']}（{'成功' if 成功 else '失败'}）")
+        except 租约失效:
+            self._输出(f"租约已失效，停止 {作业['task_id']}")
+            await self._停止下载(下载器, 下载)
+        finally:
+            if not 下载.done():
+                await self._停止下载(下载器, 下载)
+
+    @staticmethod
+    async def _停止下载(下载器: M3U8下载器, 下载: asyncio.Task):
+        try:
+            await asyncio.wait_for(下载器.取消(), timeout=5.0)
+        except Exception:
+            pass
+        _ = await asyncio.wait({下载}, timeout=10.0)
+        if not 下载.done():
+            下载.cancel()
+            _ = await asyncio.gather(下载, return_exceptions=True)
+
+    def _输出(self, 消息: str):
+        print(f"[{self.节点ID}] {消息}", flush=True)
+
+
+def _解析参数(参数列表: Optional[List[str]] = None) -> argparse.Namespace:
+    解析器 = argparse.ArgumentParser(description="M3U8 Agent 远程工作节点")
+    解析器.add_argument("--coordinator", required=True, help="协调服务地址，如 http://192.168.1.10:8000")
+    解析器.add_argument("--id", default=f"{socket.gethostname()}-{os.getpid()}", help="节点 ID（默认 主机名-进程号）")
+    解析器.add_argument("--capacity", type=int, default=1, help="同时执行的作业数")
+    解析器.add_argument(
+        "--token",
+        default=os.environ.get("M3U8_WORKER_TOKEN", ""),
+        help="与协调端 workers.token 一致的令牌（默认读取 M3U8_WORKER_TOKEN）",
+    )
+    解析器.add_argument("--poll", type=float, default=20.0, help="长轮询等待秒数")
+    return 解析器.parse_args(参数列表)
+
+
+def main(参数列表: Optional[List[str]] = None):
+    参数 = _解析参数(参数列表)
+    节点 = 工作节点(参数.coordinator, 参数.id, 容量=参数.capacity, 令牌=参数.token, 长轮询秒数=参数.poll)
+    try:
+        asyncio.run(节点.运行())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
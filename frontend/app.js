@@ -58,6 +58,7 @@ function 渲染任务(任务) {
   const item = document.createElement("div");
   item.className = "task-item";
   item.dataset.taskId = 任务.id;
+  item.dataset.status = 任务.status;
 
   item.innerHTML = `
     <div class="task-top">
@@ -68,6 +69,7 @@ function 渲染任务(任务) {
           <span class="pill">进度 ${percent.toFixed(1)}%</span>
           <span class="pill">速度 ${escapeHtml(speed)}</span>
           <span class="pill">剩余 ${escapeHtml(eta)}</span>
+          ${任务.queue_position ? `<span class="pill pill-queue">排队 #${任务.queue_position}</span>` : ""}
         </div>
       </div>
       <div class="task-actions">
@@ -119,6 +121,7 @@ let _日志内容元素 = null;
 let _日志标题元素 = null;
 let _当前日志任务ID = null;
 let _当前日志任务名 = "";
+let _日志事件源 = null;
 
 let _链接弹窗遮罩 = null;
 let _链接内容元素 = null;
@@ -235,6 +238,28 @@ function 关闭任务日志() {
   _日志弹窗遮罩.classList.remove("is-open");
   _当前日志任务ID = null;
   _当前日志任务名 = "";
+  关闭日志事件源();
+}
+
+function 关闭日志事件源() {
+  if (!_日志事件源) return;
+  try {
+    _日志事件源.close();
+  } catch {}
+  _日志事件源 = null;
+}
+
+function 订阅任务日志(任务ID) {
+  关闭日志事件源();
+  _日志事件源 = new EventSource(apiUrl(`/api/stream/tasks/${encodeURIComponent(任务ID)}?events=task.log`));
+  _日志事件源.addEventListener("task.log", (事件) => {
+    try {
+      const 数据 = JSON.parse(事件.data);
+      if (数据 && dataHasTaskLog(数据) && 数据.task_id === _当前日志任务ID) {
+        追加任务日志行(数据.line);
+      }
+    } catch {}
+  });
 }
 
 async function 打开任务日志(任务) {
@@ -245,6 +270,7 @@ async function 打开任务日志(任务) {
   _日志内容元素.textContent = "加载中…\n";
   _日志弹窗遮罩.classList.add("is-open");
   await 刷新任务日志();
+  订阅任务日志(任务.id);
 }
 
 async function 刷新任务日志() {
@@ -323,6 +349,8 @@ function 更新任务卡片进度(任务ID, percent, speed, eta) {
     pills[2].textContent = `速度 ${speed || "—"}`;
     pills[3].textContent = `剩余 ${eta || "—"}`;
   }
+  // 收到进度说明已获得下载名额
+  卡片.querySelector(".pill-queue")?.remove();
 }
 
 async function 执行动作(任务ID, 动作) {
@@ -340,10 +368,18 @@ async function 执行动作(任务ID, 动作) {
   }
 }
 
+const 列表事件类型 = ["task.created", "task.progress", "task.completed", "task.failed", "task.batch"];
+
 function 启动SSE() {
   const 重连间隔 = (typeof API_CONFIG !== "undefined" && API_CONFIG.reconnectInterval) || 3000;
   let 事件源 = null;
   let 重连定时器 = null;
+  // 手动重建 EventSource 不会自动带 Last-Event-ID，记下最后收到的编号，重连时由服务端补发缺口
+  let 最后事件ID = "";
+
+  function 记录事件ID(事件) {
+    if (事件.lastEventId) 最后事件ID = 事件.lastEventId;
+  }
 
   function 连接() {
     if (事件源) {
@@ -353,28 +389,56 @@ function 启动SSE() {
       事件源 = null;
     }
     设置状态文案("已连接（SSE）");
-    事件源 = new EventSource(apiUrl("/api/stream/tasks"));
+    // 列表页只订阅状态与进度事件，日志由日志弹窗单独按任务订阅
+    const 补发参数 = 最后事件ID ? `&last_event_id=${encodeURIComponent(最后事件ID)}` : "";
+    事件源 = new EventSource(apiUrl(`/api/stream/tasks?events=${列表事件类型.join(",")}${补发参数}`));
 
-    事件源.addEventListener("task.created", () => 安排刷新());
+    事件源.addEventListener("task.created", (事件) => {
+      记录事件ID(事件);
+      安排刷新();
+    });
 
-    事件源.addEventListener("task.completed", () => 安排刷新());
+    事件源.addEventListener("task.completed", (事件) => {
+      记录事件ID(事件);
+      安排刷新();
+    });
 
-    事件源.addEventListener("task.failed", () => 安排刷新());
+    事件源.addEventListener("task.failed", (事件) => {
+      记录事件ID(事件);
+      安排刷新();
+    });
 
-    事件源.addEventListener("task.progress", (事件) => {
+    事件源.addEventListener("task.batch", (事件) => {
+      记录事件ID(事件);
+      安排刷新();
+    });
+
+    // 断线过久、缺口已不在服务端缓冲内时收到快照：进度就地更新，任务集合或状态有变化才重新加载列表
+    事件源.addEventListener("task.snapshot", (事件) => {
+      记录事件ID(事件);
       try {
         const 数据 = JSON.parse(事件.data);
-        更新任务卡片进度(数据.task_id, 数据.percent, 数据.speed, 数据.eta);
+        const 任务列表 = Array.isArray(数据.tasks) ? 数据.tasks : [];
+        const 卡片列表 = document.querySelectorAll(".task-item[data-task-id]");
+        let 需要刷新 = 卡片列表.length !== 任务列表.length;
+        for (const 任务 of 任务列表) {
+          const 卡片 = document.querySelector(`.task-item[data-task-id="${CSS.escape(任务.id)}"]`);
+          if (!卡片 || 卡片.dataset.status !== 任务.status) {
+            需要刷新 = true;
+            continue;
+          }
+          更新任务卡片进度(任务.id, 任务.progress, 任务.speed, 任务.eta);
+        }
+        if (需要刷新) 安排刷新();
       } catch {}
     });
 
-    事件源.addEventListener("task.log", (事件) => {
+    事件源.addEventListener("task.progress", (事件) => {
+      记录事件ID(事件);
       try {
         const 数据 = JSON.parse(事件.data);
-        if (数据 && dataHasTaskLog(数据)) {
-          if (数据.task_id === _当前日志任务ID) {
-            追加任务日志行(数据.line);
-          }
+        for (const 项 of 数据.items || []) {
+          更新任务卡片进度(项.task_id, 项.percent, 项.speed, 项.eta);
         }
       } catch {}
     });